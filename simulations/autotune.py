@@ -1,19 +1,37 @@
 
 import random
+import multiprocessing
 import optuna
 import argparse
 import json
 import os
-from simulations.experiment import main
+from simulations.experiment import SETTINGS, run_autotune_trial
 
 # STEPS:
 # - input JSON with tuning specifications
-# - for each run:
-#   - call main each time with arguments for that run
-#   - main loads configs from provided input_args
-#   - main performs the run and returns final acc?
+# - n_jobs worker processes share the study through its sqlite storage, each one:
+#   - calls run_autotune_trial with arguments for that run
+#   - reports the p99 latency of every training epoch so that bad trials get pruned early
+#   - returns the p99 latency of the whole training run
 # - retrun optimized model
 
+PRUNERS = ['median', 'hyperband', 'none']
+
+
+def create_pruner(name: str, warmup_epochs: int) -> optuna.pruners.BasePruner:
+    if name == 'median':
+        return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=warmup_epochs)
+    elif name == 'hyperband':
+        return optuna.pruners.HyperbandPruner(min_resource=max(warmup_epochs, 1))
+    elif name == 'none':
+        return optuna.pruners.NopPruner()
+    raise Exception(f'Unknown pruner {name}')
+
+
+def create_storage(storage_name: str) -> optuna.storages.RDBStorage:
+    # Workers write to the same sqlite file, wait for locks instead of failing
+    return optuna.storages.RDBStorage(url=storage_name, engine_kwargs={"connect_args": {"timeout": 300}})
+
 
 def objective(trial, json_obj, setting):
     input_args = []
@@ -21,11 +39,11 @@ def objective(trial, json_obj, setting):
         # the arg_obj is either const or tuned
         if arg_obj["key_type"] == "int":
             input_args.append(f"--{arg_obj['key']}")
-            input_args.append(int(arg_obj["value"]))
-        if arg_obj["key_type"] == "const":
-            if arg_obj["key"] == "exp_prefix":
-                input_args.append("--exp_prefix")
-                input_args.append(f"trial_{trial.number}")
+            input_args.append(str(int(arg_obj["value"])))
+        elif arg_obj["key_type"] == "const":
+            if arg_obj["key"] == "exp_name":
+                input_args.append("--exp_name")
+                input_args.append(f"{arg_obj['value']}_trial_{trial.number}")
             else:
                 input_args.append("--" + arg_obj["key"])
                 # the second requirement is because progress_bar is a boolean argument
@@ -46,16 +64,39 @@ def objective(trial, json_obj, setting):
             else:
                 raise RuntimeError("No value_type for argument")
     print(input_args)
-    # the output is the value that you want to maximize with your hyperparameter choice
-    return main(input_args=input_args, setting=setting)
+
+    def report_epoch(epoch: int, value: float) -> None:
+        trial.report(value, step=epoch)
+        if trial.should_prune():
+            raise optuna.TrialPruned()
+
+    # the output is the value that you want to maximize with your hyperparameter choice (negated p99 latency)
+    return run_autotune_trial(input_args=input_args, setting=setting, epoch_callback=report_epoch)
 
 
 def save_best(study: optuna.study.Study, trial: optuna.trial.FrozenTrial) -> None:
-    with open(f"./autotune/best_params/best_params_{study.study_name}.json", "w") as json_file:
-        best_params = study.best_params
-        best_params['trial_number'] = study.best_trial.number
-        print(f"Saving best trial to: best_params_{study.study_name}.json")
+    # Pruned and failed trials never change the best parameters
+    if trial.state != optuna.trial.TrialState.COMPLETE or study.best_trial.number != trial.number:
+        return
+    out_file = f"./autotune/best_params/best_params_{study.study_name}.json"
+    best_params = study.best_params
+    best_params['trial_number'] = study.best_trial.number
+    print(f"Saving best trial to: best_params_{study.study_name}.json")
+    # Other workers may save at the same time, replace the file atomically
+    tmp_file = f"{out_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as json_file:
         json.dump(best_params, json_file)
+    os.replace(tmp_file, out_file)
+
+
+def run_worker(study_name, storage_name, json_obj, setting, pruner_name, warmup_epochs, n_trials, n_threads):
+    if n_threads is not None:
+        import torch
+        # Parallel workers would otherwise all use every core for torch
+        torch.set_num_threads(n_threads)
+    study = optuna.load_study(study_name=study_name, storage=create_storage(storage_name),
+                              pruner=create_pruner(pruner_name, warmup_epochs))
+    study.optimize(lambda trial: objective(trial, json_obj, setting), n_trials=n_trials, callbacks=[save_best])
 
 
 def run_best(config, json_obj, iteration, setting):
@@ -67,24 +108,24 @@ def run_best(config, json_obj, iteration, setting):
             # - seed: we want random seeds for these runs
             if arg_obj["key"] == "seed":
                 continue
-            if arg_obj["key"] == "exp_prefix":
-                input_args.append("--exp_prefix")
-                input_args.append(f"run_{iteration}")
+            if arg_obj["key"] == "exp_name":
+                input_args.append("--exp_name")
+                input_args.append(f"{arg_obj['value']}_run_{iteration}")
             else:
                 input_args.append("--" + arg_obj["key"])
                 if not (isinstance(arg_obj["value"], str) and arg_obj["value"] == ""):
                     input_args.append(str(arg_obj["value"]))
     input_args.append("--seed")
     input_args.append(f"{random.randint(0, 100_000)}")
-    for arg_obj in config:
-        if arg_obj["key"] == "trial_number":
+    for key, value in config.items():
+        if key == "trial_number":
             continue
-        input_args.append("--" + arg_obj["key"])
-        if not (isinstance(arg_obj["value"], str) and arg_obj["value"] == ""):
-            input_args.append(str(arg_obj["value"]))
+        input_args.append("--" + key)
+        if not (isinstance(value, str) and value == ""):
+            input_args.append(str(value))
     print(input_args)
     # run it
-    main(input_args=input_args, setting=setting)
+    print(f"Run {iteration}: objective {run_autotune_trial(input_args=input_args, setting=setting)}")
 
 
 if __name__ == "__main__":
@@ -93,9 +134,13 @@ if __name__ == "__main__":
     parser.add_argument("--in_path", help="input JSON for tuning located in ./autotune/", type=str)
     # how many "more" trials you want to run
     parser.add_argument("--n", default=100, help="number of trials to run (not including previous ones)", type=int)
+    parser.add_argument("--n_jobs", default=1, help="number of worker processes running trials in parallel", type=int)
+    parser.add_argument("--pruner", default="median", choices=PRUNERS,
+                        help="pruner that stops trials with bad intermediate p99 latencies", type=str)
+    parser.add_argument("--pruner_warmup_epochs", default=10,
+                        help="training epochs every trial runs before it can be pruned", type=int)
     parser.add_argument("--evaluate", action="store_true", help="whether or not to run best")
-    parser.add_argument("--setting", default="sim",
-                        choices=["sim", "slow", "uneven"], help="simulation setting", type=str)
+    parser.add_argument("--setting", default="base", choices=SETTINGS, help="simulation setting", type=str)
     args = parser.parse_args()
 
     # load json
@@ -113,12 +158,32 @@ if __name__ == "__main__":
     if not os.path.exists("./autotune/best_params"):
         os.makedirs("./autotune/best_params")
     # this will continue your study from where you left off
-    study = optuna.create_study(direction="maximize", study_name=study_name, storage=storage_name, load_if_exists=True)
+    study = optuna.create_study(direction="maximize", study_name=study_name, storage=create_storage(storage_name),
+                                load_if_exists=True)
     print(f"Completed {len(study.trials)} / {len(study.trials)+args.n} trials")
     # this will do the autotuning and will save the best hyperparameters after each trial
-    study.optimize(lambda trial: objective(trial, json_obj, args.setting), n_trials=args.n, callbacks=[save_best])
+    if args.n_jobs <= 1:
+        run_worker(study_name, storage_name, json_obj, args.setting, args.pruner, args.pruner_warmup_epochs,
+                   n_trials=args.n, n_threads=None)
+    else:
+        # Trials are split over the workers, the sampler sees the trials of all workers through the storage
+        n_threads = max(1, (os.cpu_count() or 1) // args.n_jobs)
+        context = multiprocessing.get_context("spawn")
+        workers = []
+        for i in range(args.n_jobs):
+            n_trials = args.n // args.n_jobs + (1 if i < args.n % args.n_jobs else 0)
+            if n_trials == 0:
+                continue
+            worker = context.Process(target=run_worker, args=(study_name, storage_name, json_obj, args.setting,
+                                                              args.pruner, args.pruner_warmup_epochs, n_trials,
+                                                              n_threads))
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+        study = optuna.load_study(study_name=study_name, storage=create_storage(storage_name))
 
-    # this will run the model with the best hyperparameters 5 times and save run information to WandB
+    # this will run the model with the best hyperparameters 5 times
     if args.evaluate:
         print(f"Evaluating for best parameters")
         for i in range(5):
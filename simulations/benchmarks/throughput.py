@@ -0,0 +1,227 @@
+import argparse
+import json
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+SIMULATIONS_FOLDER = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(SIMULATIONS_FOLDER.parent), str(SIMULATIONS_FOLDER)]
+
+from simulations.scripts.import_time_benchmark import subprocess_env  # noqa: E402
+
+# Requests per second of ExperimentRunner.run_experiment and peak memory of the process, for every policy and a
+# range of simulation sizes. Every case runs in a fresh process. Results are saved per commit in results/ and two
+# result files can be compared to find regressions:
+#   python benchmarks/throughput.py --grid quick
+#   python benchmarks/throughput.py --compare results/<old commit>.json results/<new commit>.json
+
+RESULTS_FOLDER = Path(__file__).resolve().parent / 'results'
+
+# Benchmark policy -> (selection strategy, trainer in eval mode, duplication rate)
+POLICIES = {
+    'random': ('random', True, 0.0),
+    'ARS': ('ARS', True, 0.0),
+    'DQN': ('DQN', True, 0.0),
+    'DQN_TRAIN': ('DQN', False, 0.0),
+    'DQN_DUPL_10': ('DQN_DUPL_10', True, 0.1),
+}
+
+# Every axis is varied on its own around the base case, a full product of the axes would be too large. The
+# feature width grows combinatorially with poly_feat_degree, so it is its own axis.
+GRIDS = {
+    'quick': {
+        'base': {'num_servers': 5, 'num_clients': 1, 'utilization': 0.45, 'num_requests': 2000, 'poly_feat_degree': 2},
+        'axes': {'num_servers': [5, 20]},
+    },
+    'full': {
+        'base': {'num_servers': 5, 'num_clients': 1, 'utilization': 0.45, 'num_requests': 10000, 'poly_feat_degree': 2},
+        'axes': {
+            'num_servers': [5, 10, 20, 50, 100],
+            'num_clients': [1, 5, 10, 100],
+            'utilization': [0.3, 0.45, 0.7, 0.9],
+            'num_requests': [2000, 10000, 50000],
+            'poly_feat_degree': [1, 2, 3],
+        },
+    },
+    # Fixed replication factor on growing clusters, the per request cost should not depend on the cluster size. DQN
+    # picks from all servers and needs the replication factor to be the cluster size.
+    'cluster_size': {
+        'base': {'num_servers': 5, 'replication_factor': 3, 'num_clients': 1, 'utilization': 0.45,
+                 'num_requests': 10000, 'poly_feat_degree': 2},
+        'axes': {'num_servers': [5, 50, 500]},
+        'policies': ['random', 'ARS'],
+    },
+}
+
+
+def expand_cases(grid: Dict[str, Any], policies: List[str]) -> List[Dict[str, Any]]:
+    policies = [policy for policy in policies if policy in grid.get('policies', POLICIES)]
+    points = [grid['base']]
+    for axis, values in grid['axes'].items():
+        points += [grid['base'] | {axis: value} for value in values if value != grid['base'][axis]]
+    return [{'policy': policy} | point for policy in policies for point in points]
+
+
+def case_key(case: Dict[str, Any]) -> str:
+    return ','.join(f'{key}={case[key]}' for key in sorted(case))
+
+
+def run_case(case: Dict[str, Any], torch_threads: int) -> Dict[str, Any]:
+    # Runs in the child process
+    import torch
+    from simulations.experiment_runner import ExperimentRunner
+    from simulations.simulation_args import BaseArgs
+    from simulations.state import StateParser
+    from simulations.training.model_trainer import Trainer
+    from simulations.workload.workload import BaseWorkload
+
+    torch.set_num_threads(torch_threads)
+    selection_strategy, eval_mode, duplication_rate = POLICIES[case['policy']]
+    num_servers = case['num_servers']
+    replication_factor = case.get('replication_factor', num_servers)
+    args = BaseArgs(input_args=['--num_servers', str(num_servers), '--replication_factor', str(replication_factor),
+                                '--num_clients', str(case['num_clients']), '--selection_strategy', selection_strategy,
+                                '--poly_feat_degree', str(case['poly_feat_degree']), '--seed', '1']).args
+    state_parser = StateParser(num_servers=num_servers, num_request_rates=len(args.rate_intervals),
+                               poly_feat_degree=args.poly_feat_degree)
+    if selection_strategy.startswith('DQN'):
+        trainer = Trainer(state_parser=state_parser, model_structure=args.model_structure, n_actions=num_servers,
+                          summary_stats_max_size=args.summary_stats_max_size,
+                          replay_always_use_newest=args.replay_always_use_newest,
+                          replay_memory_size=args.replay_memory_size, batch_size=args.batch_size)
+        trainer.eval_mode = eval_mode
+        if eval_mode:
+            trainer.EPS_START = 0
+            trainer.EPS_END = 0
+    else:
+        # The other policies only check whether the trainer is in eval mode, a model over all servers of large
+        # clusters would not fit in memory
+        trainer = SimpleNamespace(eval_mode=True)
+    workload = BaseWorkload(id_=1, utilization=case['utilization'], arrival_model='poisson',
+                            num_requests=case['num_requests'], long_tasks_fraction=0.2)
+    runner = ExperimentRunner(state_parser=state_parser, trainer=trainer)
+
+    start = time.perf_counter()
+    runner.run_experiment(args, workload=workload, service_time_model=args.service_time_model,
+                          training_data_collector=None, duplication_rate=duplication_rate)
+    seconds = time.perf_counter() - start
+    return {
+        'seconds': seconds,
+        'requests_per_second': case['num_requests'] / seconds,
+        # Kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def run_case_in_subprocess(case: Dict[str, Any], torch_threads: int) -> Dict[str, Any]:
+    output = subprocess.run([sys.executable, __file__, '--run_case', json.dumps(case),
+                             '--torch_threads', str(torch_threads)],
+                            env=subprocess_env(), cwd=SIMULATIONS_FOLDER, check=True, capture_output=True, text=True)
+    # The simulator prints a lot, the measurement is the last line
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def git_commit() -> str:
+    def git(*args: str) -> subprocess.CompletedProcess:
+        return subprocess.run(['git', *args], cwd=SIMULATIONS_FOLDER, capture_output=True, text=True)
+
+    commit = git('rev-parse', '--short', 'HEAD').stdout.strip() or 'unknown'
+    # Uncommitted changes to tracked files
+    if git('diff', '--quiet', 'HEAD').returncode != 0:
+        commit += '-dirty'
+    return commit
+
+
+def run_benchmarks(cases: List[Dict[str, Any]], repeats: int, torch_threads: int) -> List[Dict[str, Any]]:
+    results = []
+    for i, case in enumerate(cases):
+        runs = [run_case_in_subprocess(case, torch_threads=torch_threads) for _ in range(repeats)]
+        result = {
+            'case': case,
+            'requests_per_second': statistics.median(run['requests_per_second'] for run in runs),
+            'requests_per_second_runs': [run['requests_per_second'] for run in runs],
+            'peak_rss_mb': max(run['peak_rss_mb'] for run in runs),
+        }
+        print(f'[{i + 1}/{len(cases)}] {case_key(case)}: {result["requests_per_second"]:.0f} requests/s, '
+              f'{result["peak_rss_mb"]:.0f} MB', flush=True)
+        results.append(result)
+    return results
+
+
+def save_results(results: List[Dict[str, Any]], grid_name: str, repeats: int, torch_threads: int,
+                 results_folder: Path) -> Path:
+    commit = git_commit()
+    results_folder.mkdir(parents=True, exist_ok=True)
+    out_file = results_folder / f'{commit}.json'
+    with open(out_file, 'w') as file:
+        json.dump({
+            'commit': commit,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'grid': grid_name,
+            'repeats': repeats,
+            'torch_threads': torch_threads,
+            'python': platform.python_version(),
+            'machine': platform.platform(),
+            'processor': platform.processor(),
+            'results': results,
+        }, file, indent=4)
+    return out_file
+
+
+def compare_results(base: Dict[str, Any], new: Dict[str, Any], threshold: float) -> List[str]:
+    # Returns the keys of the cases that got slower by more than threshold
+    base_results = {case_key(result['case']): result for result in base['results']}
+    regressions = []
+    print(f'{"case":100} {base["commit"]:>12} {new["commit"]:>12} {"change":>8} {"rss change":>10}')
+    for result in new['results']:
+        key = case_key(result['case'])
+        if key not in base_results:
+            continue
+        base_result = base_results[key]
+        change = result['requests_per_second'] / base_result['requests_per_second'] - 1
+        rss_change = result['peak_rss_mb'] / base_result['peak_rss_mb'] - 1
+        flag = ''
+        if change < -threshold:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print(f'{key:100} {base_result["requests_per_second"]:12.0f} {result["requests_per_second"]:12.0f} '
+              f'{change:+8.1%} {rss_change:+10.1%}{flag}')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the simulator throughput (requests per second)')
+    parser.add_argument('--grid', nargs='?', type=str, default='quick', choices=list(GRIDS), help='Cases to run')
+    parser.add_argument('--policies', nargs='+', type=str, default=list(POLICIES), choices=list(POLICIES),
+                        help='Policies to benchmark')
+    parser.add_argument('--repeats', nargs='?', type=int, default=3,
+                        help='Runs per case, each in a fresh process, the median is reported')
+    parser.add_argument('--torch_threads', nargs='?', type=int, default=1,
+                        help='Torch threads of the benchmark processes, fixed to keep results comparable')
+    parser.add_argument('--results_folder', nargs='?', type=Path, default=RESULTS_FOLDER,
+                        help='Folder the results are saved in, one file per commit')
+    parser.add_argument('--compare', nargs=2, type=Path, default=None, metavar=('BASE', 'NEW'),
+                        help='Compare two result files instead of running the benchmarks')
+    parser.add_argument('--threshold', nargs='?', type=float, default=0.1,
+                        help='Relative throughput loss reported as regression by --compare')
+    parser.add_argument('--run_case', nargs='?', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case is not None:
+        print(json.dumps(run_case(json.loads(args.run_case), torch_threads=args.torch_threads)))
+    elif args.compare is not None:
+        with open(args.compare[0]) as base_file, open(args.compare[1]) as new_file:
+            regressions = compare_results(json.load(base_file), json.load(new_file), threshold=args.threshold)
+        print(f'{len(regressions)} regressions')
+        sys.exit(1 if len(regressions) > 0 else 0)
+    else:
+        cases = expand_cases(GRIDS[args.grid], policies=args.policies)
+        results = run_benchmarks(cases, repeats=args.repeats, torch_threads=args.torch_threads)
+        print(f'Saved results to {save_results(results, args.grid, args.repeats, args.torch_threads, args.results_folder)}')
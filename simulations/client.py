@@ -1,31 +1,34 @@
-from typing import List
-
-import torch
+from bisect import bisect_left
+from typing import TYPE_CHECKING, List
 
 from monitor import Monitor
 import constants
-from simulations.training.model_trainer import Trainer
-from simulations.training.training_data_collector import TrainingDataCollector
 from task import Task
 import math
 import threading
 import constants as const
-from yunomi.stats.exp_decay_sample import ExponentiallyDecayingSample
 
 from simulations.server import Server
 from simulations.state import NodeState, State, StateParser
+from simulations.workload.access_pattern import AccessPattern, create_access_pattern
 from collections import defaultdict, namedtuple
 
+if TYPE_CHECKING:
+    # Trainers pull in torch and matplotlib, the collector pandas. They are only needed for type hints here.
+    from simulations.training.model_trainer import Trainer
+    from simulations.training.training_data_collector import TrainingDataCollector
+
 DataPoint = namedtuple('DataPoint', ('state', 'task_time_sent', 'q_values', 'latency',
-                       'replica_id', 'is_duplicate', 'is_faster_response', 'utilization', 'long_tasks_fraction'))
+                       'replica_id', 'is_duplicate', 'is_faster_response', 'utilization', 'long_tasks_fraction',
+                       'request_index'), defaults=(-1,))
 
 
 class Client:
     def __init__(self, id_, server_list: List[Server], data_point_monitor: Monitor, state_parser: StateParser, replica_selection_strategy,
-                 access_pattern, replication_factor, backpressure,
+                 access_pattern: 'str | AccessPattern', replication_factor, backpressure,
                  shadow_read_ratio, rate_interval,
                  cubic_c, cubic_smax, cubic_beta, hysterisis_factor,
-                 demand_weight, simulation, collect_train_data: bool, training_data_collector: TrainingDataCollector, duplication_rate: float = 0.0, rate_intervals=None, trainer: Trainer = None):
+                 demand_weight, simulation, collect_train_data: bool, training_data_collector: 'TrainingDataCollector', duplication_rate: float = 0.0, rate_intervals=None, trainer: 'Trainer' = None):
         self.lock = threading.Lock()
 
         if rate_intervals is None:
@@ -34,7 +37,9 @@ class Client:
         self.state_parser = state_parser
         self.data_point_monitor = data_point_monitor
         self.server_list = server_list
-        self.accessPattern = access_pattern
+        if isinstance(access_pattern, str):
+            access_pattern = create_access_pattern(access_pattern, num_servers=len(server_list))
+        self.accessPattern: AccessPattern = access_pattern
         self.replication_factor = replication_factor
         self.REPLICA_SELECTION_STRATEGY = replica_selection_strategy
         self.pendingRequestsMonitor = Monitor(name="PendingRequests", simulation=simulation)
@@ -65,6 +70,14 @@ class Client:
         # Keep track of which replica round robin serves next
         self.next_RR_replica = 0
 
+        # Replica group of every ring position: the server at that position and its next RF - 1 neighbours, sorted
+        # by id. Groups are shared between requests and must not be modified.
+        num_servers = len(server_list)
+        self.replica_groups = [sorted((server_list[i % num_servers] for i in range(first, first + replication_factor)),
+                                      key=lambda x: x.id)
+                               for first in range(num_servers)]
+        self.servers_by_id = {server.id: server for server in server_list}
+
         # Book-keeping and metrics to be recorded follow...
 
         # Keep track of score that ARS assigns to nodes
@@ -119,6 +132,7 @@ class Client:
 
         # ds-metrics
         if replica_selection_strategy == "ds":
+            from yunomi.stats.exp_decay_sample import ExponentiallyDecayingSample
             self.latencyEdma = {node: ExponentiallyDecayingSample(100, 0.75, self.clock)
                                 for node in server_list}
             self.dsScores = {node: 0 for node in server_list}
@@ -134,28 +148,22 @@ class Client:
         """
         return self.simulation.now / 1000.0
 
-    def schedule(self, task: Task, replica_set: List[Server] = None):
-        first_replica_index = None
-
-        # Pick a random node and it's next RF - 1 number of neighbours
-        if self.accessPattern == "uniform":
-            first_replica_index = self.simulation.random.randint(0, len(self.server_list) - 1)
-        elif self.accessPattern == "zipfian":
-            first_replica_index = self.simulation.np_random.zipf(1.5) % len(self.server_list)
+    def schedule(self, task: Task, replica_set: List[Server] = None, first_replica_index: int | None = None):
+        # Pick a random node and it's next RF - 1 number of neighbours, workloads hand in pregenerated indices
+        if first_replica_index is None:
+            first_replica_index = int(self.accessPattern.sample(self.simulation.np_random, size=1)[0])
 
         if replica_set is None:
-            replica_set = [self.server_list[i % len(self.server_list)]
-                           for i in range(first_replica_index,
-                                          first_replica_index +
-                                          self.replication_factor)]
+            replica_set = self.replica_groups[first_replica_index]
+        else:
+            # make sure replicas are sorted by replica id
+            replica_set.sort(key=lambda x: x.id)
         start_time = self.simulation.now
         self.request_rate_monitor.add_request(start_time=start_time)
         self.time_since_last_req = start_time - self.last_req_start_time
         self.last_req_start_time = start_time
         self.taskArrivalTimeTracker[task] = start_time
 
-        # make sure replicas are sorted by replica id
-        replica_set.sort(key=lambda x: x.id)
         if self.backpressure is False:
             replica_to_serve = self.sort_replicas(task, replica_set)
             self.send_request(task, replica_to_serve)
@@ -167,7 +175,7 @@ class Client:
             self.backpressureSchedulers[replica_set[0]].enqueue(task, replica_set)
 
     def send_request(self, task: Task, replica_to_serve: Server):
-        nw_delay = replica_to_serve.get_server_nw_latency()
+        nw_delay = replica_to_serve.get_server_nw_latency(network_draw=task.network_draw)
         self.handled_requests += 1
 
         # Immediately send out request
@@ -177,6 +185,7 @@ class Client:
                                                              replica_to_serve))
         response_handler = ResponseHandler(self.simulation)
         self.simulation.process(response_handler.run(self, task, replica_to_serve))
+        self.simulation.request_sent()
 
         # Book-keeping for metrics
         self.pendingRequestsMap[replica_to_serve] += 1
@@ -212,16 +221,15 @@ class Client:
             # Pick a random node for the request.
             # Represents SimpleSnitch + uniform request access.
             # Ignore scores and everything else.
-            replica_id = random_relica_id
             # self.simulation.random.shuffle(replica_set)
-            replica = next(server for server in replica_set if server.get_server_id() == replica_id)
+            replica = replica_set[random_relica_id]
 
             # set the first replica to be the "action"
             replica_set[0] = replica
         elif self.REPLICA_SELECTION_STRATEGY == "round_robin":
             replica_set[0] = replica_set[self.next_RR_replica]
             # Increase round robin counter
-            self.next_RR_replica = (self.next_RR_replica + 1) % len(self.server_list)
+            self.next_RR_replica = (self.next_RR_replica + 1) % len(replica_set)
         elif self.REPLICA_SELECTION_STRATEGY == "pending":
             # Sort by number of pending requests
             replica_set.sort(key=self.pendingRequestsMap.get)
@@ -272,8 +280,7 @@ class Client:
             if self.simulation.random_exploration.random() > explr_fraction:
                 replica_set = ars_replica_ranking
             else:
-                replica_id = random_relica_id
-                replica = next(server for server in replica_set if server.get_server_id() == replica_id)
+                replica = replica_set[random_relica_id]
 
                 # set the first replica to be the "action"
                 replica_set[0] = replica
@@ -297,7 +304,8 @@ class Client:
                 self.trainer.record_state_and_action(task=task, action=action)
 
             # Map action back to server id
-            replica = next(server for server in replica_set if server.get_server_id() == action)
+            replica = self.servers_by_id[int(action)]
+            assert replica in original_replica_set
 
             if ars_replica_ranking[0] == replica:
                 self.dqn_decision_equal_to_ars += 1
@@ -307,7 +315,8 @@ class Client:
             action = self.training_data_collector.offline_trainer.select_action(
                 state=state, simulation=self.simulation, random_decision=random_relica_id, task=task)
             # Map action back to server id
-            replica = next(server for server in replica_set if server.get_server_id() == action)
+            replica = self.servers_by_id[int(action)]
+            assert replica in original_replica_set
 
             # if ars_replica_ranking[0] == replica:
             #     self.dqn_decision_equal_to_ars += 1
@@ -382,13 +391,12 @@ class Client:
 
     def maybe_send_duplicate_request(self, task: Task, replica_to_serve: Server, replica_set: List[Server]):
         # Potentially send duplicate request
-        if self.simulation.random.random() < self.duplication_rate:
+        if self.simulation.random_duplication.random() < self.duplication_rate:
             # Send duplicate request to other replica than exploit request
-            replica_set_duplicate_req = [
-                replica for replica in replica_set if replica.get_server_id() != replica_to_serve.get_server_id()]
+            replica_set_duplicate_req = [replica for replica in replica_set if replica is not replica_to_serve]
             # self.simulation.random.shuffle(replica_set_duplicate_req)
 
-            replica_idx = self.simulation.random.randint(0, len(replica_set_duplicate_req) - 1)
+            replica_idx = self.simulation.random_duplication.randint(0, len(replica_set_duplicate_req) - 1)
             # self.simulation.random.shuffle(replica_set)
             duplicate_replica: Server = replica_set_duplicate_req[replica_idx]
             # next(
@@ -501,7 +509,7 @@ class ResponseHandler:
         yield self.simulation.timeout(0)
         yield task.completion_event
 
-        nw_delay = replica_that_served.get_server_nw_latency()
+        nw_delay = replica_that_served.get_server_nw_latency(network_draw=task.response_network_draw)
 
         yield self.simulation.timeout(nw_delay)
 
@@ -576,7 +584,10 @@ class ResponseHandler:
                                                         replica_id=replica_id, is_duplicate=task.is_duplicate,
                                                         is_faster_response=is_faster_response,
                                                         utilization=task.utilization,
-                                                        long_tasks_fraction=task.long_tasks_fraction))
+                                                        long_tasks_fraction=task.long_tasks_fraction,
+                                                        request_index=task.request_index))
+
+        self.simulation.response_handled()
 
 
 class RequestRateMonitor:
@@ -585,29 +596,22 @@ class RequestRateMonitor:
         self.simulation = simulation
         self.rate_intervals = rate_intervals
         self.request_times = []
+        # Requests before this index are not part of any interval anymore
+        self.first_index = 0
 
     def add_request(self, start_time: int) -> None:
         self.request_times.append(start_time)
 
     def get_rates(self) -> List[int]:
         now = self.simulation.now
-        rates = defaultdict(int)
-        last_index = len(self.request_times)
-        max_interval_boundary_reached = False
-        # iterate through requests, new requests are at the back of the list
-
-        for index, start_time in enumerate(reversed(self.request_times)):
-            if max_interval_boundary_reached:
-                break
-            max_interval_boundary_reached = True
-            for interval in self.rate_intervals:
-                if start_time >= (now - interval):
-                    last_index = index
-                    max_interval_boundary_reached = False
-                    rates[interval] += 1
-        # Remove requests that are not part of any interval anymore
-        self.request_times = self.request_times[(len(self.request_times) - last_index - 1):]
-        request_rates = [rates[interval] for interval in self.rate_intervals]
+        # Request times are increasing, the requests within an interval are a suffix of the list
+        request_rates = [len(self.request_times) - bisect_left(self.request_times, now - interval, lo=self.first_index)
+                         for interval in self.rate_intervals]
+        # Remove requests that are not part of any interval anymore, in amortized constant time
+        self.first_index = bisect_left(self.request_times, now - max(self.rate_intervals), lo=self.first_index)
+        if self.first_index > len(self.request_times) // 2:
+            del self.request_times[:self.first_index]
+            self.first_index = 0
         return request_rates
 
 
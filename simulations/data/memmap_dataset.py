@@ -0,0 +1,150 @@
+import os
+from pathlib import Path
+from typing import Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import DataLoader, Dataset, Sampler
+
+FEATURES_FILE_SUFFIX = '.features.npy'
+LABELS_FILE_SUFFIX = '.labels.npy'
+CSV_READ_CHUNK_SIZE = 50000
+
+
+def memmap_file_paths(data_path: Path, target_col: str) -> Tuple[Path, Path]:
+    base_path = data_path.with_suffix('')
+    return (base_path.with_name(f'{base_path.name}.{target_col}{FEATURES_FILE_SUFFIX}'),
+            base_path.with_name(f'{base_path.name}.{target_col}{LABELS_FILE_SUFFIX}'))
+
+
+def count_csv_rows(data_path: Path, target_col: str) -> int:
+    # Rows as parsed by pandas, lines miscount quoted newlines and a missing trailing newline
+    return sum(len(chunk) for chunk in pd.read_csv(data_path, usecols=[target_col], chunksize=CSV_READ_CHUNK_SIZE))
+
+
+def convert_csv_to_memmap(data_path: Path, target_col: str) -> Tuple[Path, Path]:
+    """
+    Converts a CSV file once into a contiguous float32 feature matrix and a label vector stored as .npy files
+    next to it. The CSV is read in chunks, so it never has to fit into memory as a DataFrame: a first pass counts
+    the rows to size the memmaps, a second one fills them. Files that are newer than the CSV are reused.
+    """
+    features_path, labels_path = memmap_file_paths(data_path=data_path, target_col=target_col)
+    csv_mtime = os.path.getmtime(data_path)
+    if all(os.path.exists(path) and os.path.getmtime(path) >= csv_mtime for path in (features_path, labels_path)):
+        return features_path, labels_path
+
+    n_rows = count_csv_rows(data_path, target_col=target_col)
+    features, labels = None, None
+    row = 0
+    for chunk in pd.read_csv(data_path, chunksize=CSV_READ_CHUNK_SIZE):
+        chunk_labels = chunk[target_col].to_numpy()
+        chunk_features = chunk.loc[:, chunk.columns != target_col].to_numpy(dtype=np.float32)
+
+        if features is None:
+            # Integer targets are class labels, everything else is treated as a regression target
+            label_dtype = np.int64 if np.issubdtype(chunk_labels.dtype, np.integer) else np.float32
+            features = np.lib.format.open_memmap(features_path.with_name(features_path.name + '.tmp'), mode='w+',
+                                                 dtype=np.float32, shape=(n_rows, chunk_features.shape[1]))
+            labels = np.lib.format.open_memmap(labels_path.with_name(labels_path.name + '.tmp'), mode='w+',
+                                               dtype=label_dtype, shape=(n_rows,))
+
+        features[row:row + len(chunk)] = chunk_features
+        labels[row:row + len(chunk)] = chunk_labels
+        row += len(chunk)
+
+    assert features is not None, f'No rows found in {data_path}'
+    assert row == n_rows, f'Expected {n_rows} rows in {data_path}, but read {row}'
+    features.flush()
+    labels.flush()
+    del features, labels
+
+    # Only rename after the conversion completed so that a partial conversion is never reused
+    os.replace(features_path.with_name(features_path.name + '.tmp'), features_path)
+    os.replace(labels_path.with_name(labels_path.name + '.tmp'), labels_path)
+    return features_path, labels_path
+
+
+class MemmapDataset(Dataset):
+    """
+    Dataset over a CSV file converted to memory-mapped .npy files (see convert_csv_to_memmap). Items are read by
+    index from the memmap, a list or array of indices returns a whole minibatch with a single gather. The
+    memmaps are opened lazily, so every DataLoader worker opens its own read-only mapping.
+    """
+
+    def __init__(self, mode: str, data_path: Path, target_col: str, seed: int, transform=None, target_transform=None):
+        self.transform = transform
+        self.target_transform = target_transform
+
+        # split the dataset into train - test with the ratio 80 - 20
+        assert mode in ["train", "val", "test"], "wrong mode for dataset given"
+        if mode == "val":
+            raise Exception('Validation not implemented')
+
+        self.features_path, self.labels_path = convert_csv_to_memmap(data_path=data_path, target_col=target_col)
+        self.features = None
+        self.labels = None
+
+        n_rows = len(np.load(self.labels_path, mmap_mode='r'))
+        permutation = np.random.default_rng(seed).permutation(n_rows)
+        split = int(.8 * n_rows)
+        indices = permutation[:split] if mode == "train" else permutation[split:]
+        # Sorted row indices keep reads of a minibatch as sequential as possible
+        self.indices = np.sort(indices)
+
+    def open(self) -> None:
+        self.features = np.load(self.features_path, mmap_mode='r')
+        self.labels = np.load(self.labels_path, mmap_mode='r')
+
+    def __getstate__(self):
+        # Memmaps are not sent to worker processes, each worker opens the files itself
+        state = self.__dict__.copy()
+        state['features'] = None
+        state['labels'] = None
+        return state
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, idx):
+        if self.features is None:
+            self.open()
+
+        rows = self.indices[idx]
+        if not np.isscalar(rows):
+            # Gather in file order, features and labels stay aligned
+            rows = np.sort(rows)
+        features = np.array(self.features[rows])
+        label = np.array(self.labels[rows])
+
+        if self.transform:
+            features = self.transform(features)
+        if self.target_transform:
+            label = self.target_transform(label)
+        return features, label
+
+
+class RandomBatchSampler(Sampler):
+    # Yields arrays of dataset indices, one per minibatch
+    def __init__(self, n_items: int, batch_size: int, shuffle: bool = True, drop_last: bool = False) -> None:
+        self.n_items = n_items
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        order = torch.randperm(self.n_items).numpy() if self.shuffle else np.arange(self.n_items)
+        for batch in range(len(self)):
+            yield order[batch * self.batch_size:(batch + 1) * self.batch_size]
+
+    def __len__(self) -> int:
+        if self.drop_last:
+            return self.n_items // self.batch_size
+        return (self.n_items + self.batch_size - 1) // self.batch_size
+
+
+def batch_loader(dataset: MemmapDataset, batch_size: int, shuffle: bool = True, num_workers: int = 0) -> DataLoader:
+    # The sampler produces whole minibatches, so automatic batching of the DataLoader is disabled
+    return DataLoader(dataset, sampler=RandomBatchSampler(n_items=len(dataset), batch_size=batch_size, shuffle=shuffle),
+                      batch_size=None, num_workers=num_workers, pin_memory=torch.cuda.is_available(),
+                      persistent_workers=num_workers > 0)
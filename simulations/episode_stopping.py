@@ -0,0 +1,75 @@
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+# Latency statistics the confidence intervals are computed for, name -> statistic of the latencies of an episode
+EPISODE_STATISTICS = {
+    'mean': np.mean,
+    'p99': lambda latencies: np.quantile(latencies, 0.99),
+}
+
+
+def confidence_interval(values: List[float], confidence: float) -> Tuple[float, float]:
+    # Student-t interval of the mean of independent per episode values (batch means with one episode per batch)
+    # scipy is slow to import, only load it when an interval is computed
+    from scipy.stats import t
+
+    n = len(values)
+    mean = float(np.mean(values))
+    half_width = t.ppf((1 + confidence) / 2, df=n - 1) * np.std(values, ddof=1) / np.sqrt(n)
+    return mean - half_width, mean + half_width
+
+
+class EpisodeStopping:
+    """
+    Number of test episodes of a policy. Runs exactly min_episodes when max_episodes is not larger, otherwise runs
+    until the confidence intervals of the mean and p99 latency over the episodes are narrower than target_width
+    (relative to the estimate) or max_episodes is reached.
+    """
+
+    def __init__(self, min_episodes: int, max_episodes: int = 0, target_width: float = 0.05,
+                 confidence: float = 0.95) -> None:
+        # An interval needs at least two episodes
+        self.min_episodes = max(min_episodes, 2) if max_episodes > min_episodes else min_episodes
+        self.max_episodes = max(max_episodes, self.min_episodes)
+        self.target_width = target_width
+        self.confidence = confidence
+        self.episode_statistics = {name: [] for name in EPISODE_STATISTICS}
+
+    @property
+    def num_episodes(self) -> int:
+        return len(self.episode_statistics['mean'])
+
+    def add(self, latencies: np.ndarray) -> None:
+        for name, statistic in EPISODE_STATISTICS.items():
+            self.episode_statistics[name].append(float(statistic(latencies)))
+
+    def relative_widths(self) -> Dict[str, float]:
+        widths = {}
+        for name, values in self.episode_statistics.items():
+            low, high = confidence_interval(values, confidence=self.confidence)
+            widths[name] = (high - low) / abs(np.mean(values)) if np.mean(values) != 0 else 0.0
+        return widths
+
+    def should_stop(self) -> bool:
+        if self.num_episodes >= self.max_episodes:
+            return True
+        if self.num_episodes < self.min_episodes:
+            return False
+        return all(width <= self.target_width for width in self.relative_widths().values())
+
+    def episodes(self) -> Iterator[int]:
+        # add() has to be called for every episode before the next one is requested
+        while not self.should_stop():
+            i_episode = self.num_episodes
+            yield i_episode
+            assert self.num_episodes == i_episode + 1, 'Latencies of the episode were not added'
+
+    def summary(self) -> str:
+        if self.num_episodes < 2:
+            return f'{self.num_episodes} episodes'
+        intervals = []
+        for name, values in self.episode_statistics.items():
+            low, high = confidence_interval(values, confidence=self.confidence)
+            intervals.append(f'{name} {np.mean(values):.2f} [{low:.2f}, {high:.2f}]')
+        return f'{self.num_episodes} episodes, {self.confidence:.0%} CI: ' + ', '.join(intervals)
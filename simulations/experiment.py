@@ -1,6 +1,7 @@
+import argparse
 import json
 import os
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List
 
 import torch
 
@@ -8,10 +9,15 @@ import random
 import numpy as np
 from simulation_args import BaseArgs, HeterogeneousRequestsArgs, SimulationArgs, StaticSlowServerArgs, TimeVaryingServerArgs, log_arguments
 from pathlib import Path
+from simulations.training.checkpoint import CHECKPOINT_FOLDER, CheckpointWriter, load_checkpoint, load_episode_columns, rng_states, set_rng_states
 from simulations.training.model_trainer import Trainer
+from simulations.episode_stopping import EpisodeStopping
 from simulations.feature_data_collector import FeatureDataCollector
 from simulations.monitor import Monitor
-from simulations.plotting import ExperimentPlot
+from simulations.plotting import ExperimentPlot, monitor_columns
+import simulations.profiling as profiling
+from simulations.result_cache import ResultCache
+from simulations.sweep import load_sweep_spec, run_sweep
 from experiment_runner import ExperimentRunner
 from simulations.state import StateParser
 from simulations.training.offline_model_trainer import OfflineTrainer
@@ -25,6 +31,10 @@ DQN_EXPLR_MAPPING = {item for i in range(101)
 DQN_DUPL_MAPPING = {item for i in range(101)
                     for item in [(f'DQN_DUPL_{i}', i / 100.0), (f'DQN_DUPL_{i}_TRAIN', i / 100), (f'OFFLINE_DQN_DUPL_{i}', i / 100.0), (f'OFFLINE_DQN_DUPL_{i}_TRAIN', i / 100)]}
 
+DEFAULT_SWEEP_SPEC = Path('..', 'configs', 'sweeps', 'offline_adaption.yaml')
+
+PROFILE_CSV_FILE = 'profile.csv'
+
 BASE_TEST_SEED = 111111
 BASE_TEST_EXPLR_SEED = 222222
 
@@ -37,25 +47,42 @@ def print_monitor_time_series_to_file(file_desc, prefix, monitor) -> None:
 def create_experiment_folders(simulation_args: SimulationArgs, state_parser: StateParser) -> Path:
     # Start the models and etc.
     # Adapted from https://pytorch.org/tutorials/intermediate/reinforcement_q_learning.html
-    experiment_num = 0
     if simulation_args.args.exp_name != "":
-        out_path = Path('..', simulation_args.args.output_folder, simulation_args.args.exp_name, str(experiment_num))
-        while os.path.isdir(out_path):
-            experiment_num += 1
-            out_path = Path('..', simulation_args.args.output_folder,
-                            simulation_args.args.exp_name, str(experiment_num))
+        base_path = Path('..', simulation_args.args.output_folder, simulation_args.args.exp_name)
     else:
-        out_path = Path('..', simulation_args.args.output_folder, str(experiment_num))
-        while os.path.isdir(out_path):
+        base_path = Path('..', simulation_args.args.output_folder)
+    os.makedirs(base_path, exist_ok=True)
+
+    # Creating the folder claims the experiment number, parallel runs (e.g. autotune workers) never share a folder
+    experiment_num = 0
+    while True:
+        out_path = base_path / str(experiment_num)
+        try:
+            os.makedirs(out_path)
+            return out_path
+        except FileExistsError:
             experiment_num += 1
-            out_path = Path('..', simulation_args.args.output_folder, str(experiment_num))
 
-    os.makedirs(out_path, exist_ok=True)
 
-    return out_path
+def rl_experiment_wrapper(simulation_args: SimulationArgs, train_workloads: List[BaseWorkload], test_workloads: List[BaseWorkload],
+                          epoch_callback: Callable[[int, float], None] | None = None, run_tests: bool = True,
+                          out_path: Path | None = None) -> float:
+    if not simulation_args.args.profile and simulation_args.args.profile_trace == '':
+        return run_rl_experiment(simulation_args, train_workloads=train_workloads, test_workloads=test_workloads,
+                                 epoch_callback=epoch_callback, run_tests=run_tests, out_path=out_path)
+
+    trace_file = Path(simulation_args.args.profile_trace) if simulation_args.args.profile_trace != '' else None
+    profiling.start(trace_file=trace_file)
+    try:
+        return run_rl_experiment(simulation_args, train_workloads=train_workloads, test_workloads=test_workloads,
+                                 epoch_callback=epoch_callback, run_tests=run_tests, out_path=out_path)
+    finally:
+        profiling.stop()
 
 
-def rl_experiment_wrapper(simulation_args: SimulationArgs, train_workloads: List[BaseWorkload], test_workloads: List[BaseWorkload]) -> float:
+def run_rl_experiment(simulation_args: SimulationArgs, train_workloads: List[BaseWorkload], test_workloads: List[BaseWorkload],
+                      epoch_callback: Callable[[int, float], None] | None = None, run_tests: bool = True,
+                      out_path: Path | None = None) -> float:
     state_parser = StateParser(num_servers=simulation_args.args.num_servers,
                                num_request_rates=len(simulation_args.args.rate_intervals),
                                poly_feat_degree=simulation_args.args.poly_feat_degree)
@@ -90,18 +117,36 @@ def rl_experiment_wrapper(simulation_args: SimulationArgs, train_workloads: List
                                      lr=simulation_args.args.lr,
                                      batch_size=simulation_args.args.batch_size, )
 
-    out_path = create_experiment_folders(simulation_args=simulation_args, state_parser=state_parser)
+    if out_path is None and simulation_args.args.resume != '':
+        # Interrupted training continues in its own folder
+        out_path = Path(simulation_args.args.resume)
+        if not os.path.exists(out_path):
+            raise Exception(f'Experiment folder {out_path} to resume does not exist')
+    if out_path is None:
+        out_path = create_experiment_folders(simulation_args=simulation_args, state_parser=state_parser)
+    else:
+        # Fixed folder, e.g. of a sweep node that later runs read the model from
+        os.makedirs(out_path, exist_ok=True)
+
+    profiling.set_csv_file(out_path / PROFILE_CSV_FILE)
 
     training_data_folder = out_path / 'collected_training_data'
 
     training_data_collector = TrainingDataCollector(
-        state_parser=state_parser, n_actions=simulation_args.args.num_servers, summary_stats_max_size=simulation_args.args.summary_stats_max_size, offline_trainer=offline_trainer, offline_train_batch_size=simulation_args.args.offline_train_batch_size, data_folder=training_data_folder)
+        state_parser=state_parser, n_actions=simulation_args.args.num_servers, summary_stats_max_size=simulation_args.args.summary_stats_max_size, offline_trainer=offline_trainer, offline_train_batch_size=simulation_args.args.offline_train_batch_size, data_folder=training_data_folder,
+        chunk_size=simulation_args.args.train_data_chunk_size, append=simulation_args.args.append_train_data)
 
     assert simulation_args.args.offline_train_data == '' or simulation_args.args.offline_model == ''
 
+    train_objective = 0
     if len(const.TRAIN_POLICIES_TO_RUN) > 0:
-        run_rl_training(simulation_args=simulation_args, workloads=train_workloads, offline_trainer=offline_trainer,
-                        trainer=trainer, state_parser=state_parser, out_folder=out_path, training_data_collector=training_data_collector)
+        train_objective = run_rl_training(simulation_args=simulation_args, workloads=train_workloads, offline_trainer=offline_trainer,
+                                          trainer=trainer, state_parser=state_parser, out_folder=out_path, training_data_collector=training_data_collector,
+                                          epoch_callback=epoch_callback)
+
+    if not run_tests:
+        # Autotuning only evaluates the training run
+        return train_objective
 
     if simulation_args.args.model_folder == '':
         model_folder = out_path / 'train' / simulation_args.args.data_folder
@@ -121,9 +166,11 @@ def rl_experiment_wrapper(simulation_args: SimulationArgs, train_workloads: List
         os.makedirs(offline_plot_folder, exist_ok=True)
 
         # Offline training data given, load data and train model on it
-        transitions, norm_stats = training_data_collector.read_training_data_from_csv(
+        transitions, norm_stats = training_data_collector.read_training_data_tensors(
             train_data_folder=offline_train_data_folder)
-        offline_trainer.run_offline_training_epoch(transitions=transitions, norm_stats=norm_stats)
+        offline_trainer.run_offline_training(transitions=transitions, norm_stats=norm_stats,
+                                             epochs=simulation_args.args.offline_train_epochs,
+                                             target_update_interval=simulation_args.args.offline_target_update_interval)
         offline_trainer.save_models_and_stats(offline_train_out_folder)
         offline_trainer.plot_grads_and_losses(plot_path=offline_plot_folder, file_prefix='offline_train')
         offline_model_folder = offline_train_out_folder
@@ -139,10 +186,11 @@ def rl_experiment_wrapper(simulation_args: SimulationArgs, train_workloads: List
     return 0
 
 
-def run_rl_training(simulation_args: SimulationArgs, workloads: List[BaseWorkload], trainer: Trainer, offline_trainer: OfflineTrainer, state_parser: StateParser, training_data_collector: TrainingDataCollector, out_folder: Path):
+def run_rl_training(simulation_args: SimulationArgs, workloads: List[BaseWorkload], trainer: Trainer, offline_trainer: OfflineTrainer, state_parser: StateParser, training_data_collector: TrainingDataCollector, out_folder: Path,
+                    epoch_callback: Callable[[int, float], None] | None = None) -> float:
 
     if len(workloads) == 0:
-        return
+        return 0
     NUM_EPSIODES = simulation_args.args.epochs
     LAST_EPOCH = NUM_EPSIODES - 1
 
@@ -170,10 +218,37 @@ def run_rl_training(simulation_args: SimulationArgs, workloads: List[BaseWorkloa
 
     duplication_rate = 0.0
 
+    checkpoint_folder = experiment_folder / CHECKPOINT_FOLDER
+    checkpoint_writer = None
+    if simulation_args.args.checkpoint_interval > 0:
+        checkpoint_writer = CheckpointWriter(checkpoint_folder=checkpoint_folder)
+    # Monitor columns of the finished episodes that are part of the next checkpoint
+    episode_files = []
+    # (policy index, episode) the training starts at
+    start = (0, 0)
+    if simulation_args.args.resume != '':
+        # Collected training data is written in chunks during the run, it cannot be rolled back to a checkpoint
+        assert not simulation_args.args.collect_train_data, 'Resuming runs that collect training data is not supported'
+        checkpoint = load_checkpoint(checkpoint_folder=checkpoint_folder)
+        if checkpoint is None:
+            print(f'No checkpoint in {checkpoint_folder}, training starts from the beginning')
+        else:
+            assert checkpoint['policies'] == const.TRAIN_POLICIES_TO_RUN, 'Checkpoint was taken with other policies'
+            trainer.load_checkpoint_state(checkpoint['trainer'])
+            set_rng_states(checkpoint['rng_states'])
+            episode_files = checkpoint['episode_files']
+            for policy, epoch_num, file_name in episode_files:
+                train_plotter.add_columns(load_episode_columns(checkpoint_folder, file_name),
+                                          policy=policy, epoch_num=epoch_num)
+            start = tuple(checkpoint['next'])
+            print(f'Resuming training at policy {start[0]}, episode {start[1]}')
+
     print('Starting experiments')
-    for policy in const.TRAIN_POLICIES_TO_RUN:
+    for policy_index, policy in enumerate(const.TRAIN_POLICIES_TO_RUN):
+        if policy_index < start[0]:
+            continue
         simulation_args.set_policy(policy)
-        for i_episode in range(NUM_EPSIODES):
+        for i_episode in range(start[1] if policy_index == start[0] else 0, NUM_EPSIODES):
             print(i_episode)
             random.seed(i_episode)
             np.random.seed(i_episode)
@@ -185,7 +260,14 @@ def run_rl_training(simulation_args: SimulationArgs, workloads: List[BaseWorkloa
 
             data_point_monitor = experiment_runner.run_experiment(
                 simulation_args.args, service_time_model=simulation_args.args.service_time_model, workload=workload, duplication_rate=duplication_rate, training_data_collector=training_data_collector)
-            train_plotter.add_data(data_point_monitor, policy, i_episode)
+            columns = monitor_columns(data_point_monitor)
+            train_plotter.add_columns(columns, policy=policy, epoch_num=i_episode)
+            if checkpoint_writer is not None:
+                episode_files.append((policy, i_episode, checkpoint_writer.write_episode(policy, i_episode, columns)))
+
+            if epoch_callback is not None and policy == 'DQN':
+                # Reports the epoch's objective, the callback may stop the run early (e.g. a pruned autotune trial)
+                epoch_callback(i_episode, train_plotter.get_autotuner_objective(epoch=i_episode))
 
             if simulation_args.args.collect_train_data:
                 training_data_collector.end_train_episode()
@@ -200,6 +282,19 @@ def run_rl_training(simulation_args: SimulationArgs, workloads: List[BaseWorkloa
                 trainer.reset_episode_counters()
                 # trainer.print_weights()
 
+            if checkpoint_writer is not None and ((i_episode + 1) % simulation_args.args.checkpoint_interval == 0
+                                                  or i_episode == LAST_EPOCH):
+                next_episode = (policy_index, i_episode + 1) if i_episode < LAST_EPOCH else (policy_index + 1, 0)
+                checkpoint_writer.write_checkpoint({
+                    'policies': list(const.TRAIN_POLICIES_TO_RUN),
+                    'next': next_episode,
+                    'episode_files': list(episode_files),
+                    'trainer': trainer.checkpoint_state(),
+                    'rng_states': rng_states(),
+                })
+
+    if checkpoint_writer is not None:
+        checkpoint_writer.close()
     print('Finished')
     # train_data_analyzer.run_latency_lin_reg(epoch=LAST_EPOCH)
     trainer.save_models_and_stats(model_folder=data_folder)
@@ -212,12 +307,25 @@ def run_rl_training(simulation_args: SimulationArgs, workloads: List[BaseWorkloa
 
     trainer.plot_grads_and_losses(plot_path=plot_path, file_prefix='train')
 
-    plot_collected_data(plotter=train_plotter, epoch_to_plot=LAST_EPOCH, policies_to_plot=const.TRAIN_POLICIES_TO_RUN)
+    plot_collected_data(plotter=train_plotter, epoch_to_plot=LAST_EPOCH, policies_to_plot=const.TRAIN_POLICIES_TO_RUN,
+                        skip_plots=simulation_args.args.skip_plots, n_workers=simulation_args.args.plot_workers)
+
+    return train_plotter.get_autotuner_objective()
+
+
+def create_episode_stopping(simulation_args: SimulationArgs) -> EpisodeStopping:
+    return EpisodeStopping(min_episodes=const.NUM_TEST_EPSIODES, max_episodes=simulation_args.args.max_test_epochs,
+                           target_width=simulation_args.args.test_ci_width,
+                           confidence=simulation_args.args.test_ci_confidence)
 
 
 def run_rl_tests(simulation_args: SimulationArgs, workloads: List[BaseWorkload], out_folder: Path, trainer: Trainer, offline_trainer: OfflineTrainer, state_parser: StateParser, training_data_collector: TrainingDataCollector) -> None:
     const.NUM_TEST_EPSIODES = simulation_args.args.test_epochs
 
+    result_cache = None
+    if simulation_args.args.result_cache_folder != '':
+        result_cache = ResultCache(cache_folder=Path(simulation_args.args.result_cache_folder))
+
     for test_workload in workloads:
         # Start the models and etc.
         # Adapted from https://pytorch.org/tutorials/intermediate/reinforcement_q_learning.html
@@ -246,7 +354,17 @@ def run_rl_tests(simulation_args: SimulationArgs, workloads: List[BaseWorkload],
         log_arguments(experiment_folder, simulation_args)
         test_workload.to_json_file(out_folder=experiment_folder)
 
+        forked_policies = []
+        if simulation_args.args.fork_time > 0:
+            forked_policies = [policy for policy in const.EVAL_POLICIES_TO_RUN
+                               if not policy.startswith(('OFFLINE_', 'DQN')) and policy != 'ds']
+            run_forked_tests(simulation_args=simulation_args, workload=test_workload, policies=forked_policies,
+                             experiment_runner=experiment_runner, training_data_collector=training_data_collector,
+                             test_plotter=test_plotter)
+
         for policy in const.EVAL_POLICIES_TO_RUN:
+            if policy in forked_policies:
+                continue
             simulation_args.set_policy(policy)
             print(f'Starting Test Sequence for {policy}')
 
@@ -258,7 +376,8 @@ def run_rl_tests(simulation_args: SimulationArgs, workloads: List[BaseWorkload],
                                 plot_folder=plot_path, data_folder=data_folder, trainer=trainer, experiment_runner=experiment_runner, training_data_collector=training_data_collector, test_plotter=test_plotter)
             else:
                 duplication_rate = 0
-                for i_episode in range(const.NUM_TEST_EPSIODES):
+                episode_stopping = create_episode_stopping(simulation_args)
+                for i_episode in episode_stopping.episodes():
                     seed = BASE_TEST_SEED + i_episode
 
                     random.seed(seed)
@@ -266,17 +385,35 @@ def run_rl_tests(simulation_args: SimulationArgs, workloads: List[BaseWorkload],
                     torch.manual_seed(seed)
                     simulation_args.set_seed(seed)
 
+                    cache_key = None
+                    # Runs that collect training data need the actual simulation
+                    if result_cache is not None and not simulation_args.args.collect_train_data:
+                        cache_key = result_cache.key(simulation_args.args, workload=test_workload, policy=policy, seed=seed,
+                                                     service_time_model=simulation_args.args.test_service_time_model,
+                                                     duplication_rate=duplication_rate)
+                        columns = result_cache.get(cache_key)
+                        if columns is not None:
+                            print(f'{i_episode}, {policy} (cached)')
+                            test_plotter.add_columns(columns, policy=policy, epoch_num=i_episode)
+                            episode_stopping.add(columns['latency'][columns['is_faster_response']])
+                            continue
+
                     test_data_point_monitor = experiment_runner.run_experiment(
                         simulation_args.args, service_time_model=simulation_args.args.test_service_time_model, workload=test_workload, duplication_rate=duplication_rate, training_data_collector=training_data_collector)
                     print(f'{i_episode}, {policy}')
                     test_plotter.add_data(test_data_point_monitor, policy=policy, epoch_num=i_episode)
+                    episode_stopping.add(test_data_point_monitor.get_faster_response_latencies())
+                    if cache_key is not None:
+                        result_cache.put(cache_key, test_data_point_monitor.get_columns())
+                print(f'{policy}: {episode_stopping.summary()}')
 
         # Export data
         test_plotter.export_data()
 
         # TOOD: Remove hacky solution
         plot_collected_data(plotter=test_plotter, epoch_to_plot=LAST_EPOCH,
-                            policies_to_plot=test_plotter.df['Policy'].unique())
+                            policies_to_plot=test_plotter.df['Policy'].unique(),
+                            skip_plots=simulation_args.args.skip_plots, n_workers=simulation_args.args.plot_workers)
 
         if simulation_args.args.collect_train_data:
             training_data_collector.save_training_data()
@@ -284,6 +421,47 @@ def run_rl_tests(simulation_args: SimulationArgs, workloads: List[BaseWorkload],
         print('Finished workload')
 
 
+def run_forked_tests(simulation_args: SimulationArgs, workload: BaseWorkload, policies: List[str],
+                     experiment_runner: ExperimentRunner, training_data_collector: TrainingDataCollector,
+                     test_plotter: ExperimentPlot) -> None:
+    """
+    Test episodes of the given policies that share the run up to --fork_time: per episode the prefix is simulated
+    once with the first policy and every policy continues from it, only requests sent after the fork are recorded.
+    """
+    if len(policies) == 0:
+        return
+    # Training data collected in the forked branches would not reach this process
+    assert not simulation_args.args.collect_train_data, 'Forked tests do not collect training data'
+    fork_time = simulation_args.args.fork_time
+    episode_stoppings = {policy: create_episode_stopping(simulation_args) for policy in policies}
+    print(f'Starting Forked Test Sequence for {", ".join(policies)} at time {fork_time}')
+
+    i_episode = 0
+    while not all(episode_stopping.should_stop() for episode_stopping in episode_stoppings.values()):
+        seed = BASE_TEST_SEED + i_episode
+
+        random.seed(seed)
+        np.random.seed(seed)
+        torch.manual_seed(seed)
+        simulation_args.set_seed(seed)
+        simulation_args.set_policy(policies[0])
+
+        branches = {policy: lambda runner, policy=policy: runner.set_selection_strategy(policy)
+                    for policy, episode_stopping in episode_stoppings.items() if not episode_stopping.should_stop()}
+        results = experiment_runner.fork_experiment(
+            simulation_args.args, workload=workload, service_time_model=simulation_args.args.test_service_time_model,
+            branches=branches, fork_time=fork_time, training_data_collector=training_data_collector)
+        for policy, columns in results.items():
+            assert len(columns['latency']) > 0, f'No requests of {policy} were sent after the fork time {fork_time}'
+            print(f'{i_episode}, {policy} (forked)')
+            test_plotter.add_columns(columns, policy=policy, epoch_num=i_episode)
+            episode_stoppings[policy].add(columns['latency'][columns['is_faster_response']])
+        i_episode += 1
+
+    for policy, episode_stopping in episode_stoppings.items():
+        print(f'{policy}: {episode_stopping.summary()}')
+
+
 def run_rl_offline_test(simulation_args: SimulationArgs, workload: BaseWorkload, plot_folder: Path, data_folder: Path, policy: str, offline_trainer: OfflineTrainer, experiment_runner: ExperimentRunner, training_data_collector: TrainingDataCollector, test_plotter: ExperimentPlot) -> float:
     # Start the models and etc.
     # Adapted from https://pytorch.org/tutorials/intermediate/reinforcement_q_learning.html
@@ -313,7 +491,8 @@ def run_rl_offline_test(simulation_args: SimulationArgs, workload: BaseWorkload,
     else:
         raise Exception(f'Invalid policy for offline RL adapting: {policy}')
 
-    for i_episode in range(const.NUM_TEST_EPSIODES):
+    episode_stopping = create_episode_stopping(simulation_args)
+    for i_episode in episode_stopping.episodes():
         seed = BASE_TEST_SEED + i_episode
 
         random.seed(seed)
@@ -338,12 +517,14 @@ def run_rl_offline_test(simulation_args: SimulationArgs, workload: BaseWorkload,
 
         print(f'Adding offline data: {policy}')
         test_plotter.add_data(test_data_point_monitor, policy=policy, epoch_num=i_episode)
+        episode_stopping.add(test_data_point_monitor.get_faster_response_latencies())
 
         # Print number of DQN decisions that matched ARS
         experiment_runner.print_dqn_decision_equal_to_ars_ratio()
         print(f'Exlore actions this episode: {offline_trainer.explore_actions_episode}')
         print(f'Exploit actions this episode: {offline_trainer.exploit_actions_episode}')
         offline_trainer.reset_episode_counters()
+    print(f'{policy}: {episode_stopping.summary()}')
 
 
 def run_rl_dqn_test(simulation_args: SimulationArgs, workload: BaseWorkload, policy: str, plot_folder: Path,
@@ -372,7 +553,8 @@ def run_rl_dqn_test(simulation_args: SimulationArgs, workload: BaseWorkload, pol
     else:
         raise Exception(f'Invalid policy for adapting: {policy}')
 
-    for i_episode in range(const.NUM_TEST_EPSIODES):
+    episode_stopping = create_episode_stopping(simulation_args)
+    for i_episode in episode_stopping.episodes():
         seed = BASE_TEST_SEED + i_episode
 
         random.seed(seed)
@@ -400,12 +582,14 @@ def run_rl_dqn_test(simulation_args: SimulationArgs, workload: BaseWorkload, pol
             trainer.plot_grads_and_losses(plot_path=plot_folder, file_prefix=file_prefix)
 
         test_plotter.add_data(test_data_point_monitor, policy=policy_str, epoch_num=i_episode)
+        episode_stopping.add(test_data_point_monitor.get_faster_response_latencies())
 
         # Print number of DQN decisions that matched ARS
         experiment_runner.print_dqn_decision_equal_to_ars_ratio()
         print(f'Exlore actions this episode: {trainer.explore_actions_episode}')
         print(f'Exploit actions this episode: {trainer.exploit_actions_episode}')
         trainer.reset_episode_counters()
+    print(f'{policy}: {episode_stopping.summary()}')
 
     # Reset hyperparameters
     trainer.EPS_START = simulation_args.args.eps_start
@@ -413,326 +597,73 @@ def run_rl_dqn_test(simulation_args: SimulationArgs, workload: BaseWorkload, pol
     trainer.eval_mode = False
 
 
-def plot_collected_data(plotter: ExperimentPlot, epoch_to_plot: int, policies_to_plot: List[str]) -> None:
-    plotter.generate_plots()
+def plot_collected_data(plotter: ExperimentPlot, epoch_to_plot: int, policies_to_plot: List[str], skip_plots: bool = False, n_workers: int = 1) -> None:
+    if skip_plots:
+        # Figures can be rendered later from the exported data.csv with render_plots.py
+        plotter.keep_faster_responses()
+    else:
+        plotter.generate_plots(epoch_to_plot=epoch_to_plot, policies_to_plot=policies_to_plot, n_workers=n_workers)
     plotter.save_stats_to_file()
 
-    plotter.plot_episode(epoch=epoch_to_plot)
-    for policy in policies_to_plot:
-        plotter.plot_policy_episode(epoch=epoch_to_plot, policy=policy)
-
 
 # TODO: Make scenarios enum and find better way to select args for them
-def main(input_args=None, setting="base") -> None:
+SETTINGS = ['base', 'heterogenous_requests_scenario', 'heterogenous_static_service_time_scenario',
+            'time_varying_service_time_servers']
+
+
+def create_simulation_args(input_args=None, setting="base") -> SimulationArgs:
     if setting == "base":
-        args = BaseArgs(input_args=input_args)
+        return BaseArgs(input_args=input_args)
     elif setting == "heterogenous_requests_scenario":
-        args = HeterogeneousRequestsArgs(input_args=input_args)
+        return HeterogeneousRequestsArgs(input_args=input_args)
     elif setting == "heterogenous_static_service_time_scenario":
-        args = StaticSlowServerArgs(input_args=input_args)
+        return StaticSlowServerArgs(input_args=input_args)
     elif setting == "time_varying_service_time_servers":
-        args = TimeVaryingServerArgs(input_args=input_args)
-    else:
-        raise Exception(f'Unknown setting {setting}')
-
-    SEED = args.args.seed
-
-    config_folder = Path('..', 'configs')
-    workload_builder = WorkloadBuilder(config_folder=config_folder)
-
-    args.set_policy('ARS')
-
-    last = 0.0
-
-    # EXPERIMENT_NAME = 'training_data_test'
-
-    # const.EVAL_POLICIES_TO_RUN = []
-    # const.TRAIN_POLICIES_TO_RUN = ['ARS_20']
-
-    # args = HeterogeneousRequestsArgs(input_args=input_args)
-    # args.args.exp_name = EXPERIMENT_NAME
-    # args.args.epochs = 5
-    # args.args.model_folder = ''
-    # args.args.collect_train_data = True
-
-    # for service_time_model in ['random.expovariate']:  # 'pareto'
-    #     for test_service_time_model in ['random.expovariate']:  # 'random.expovariate',
-    #         for dqn_explr_lr in [1e-5]:
-    #             args.args.seed = SEED
-    #             args.args.test_service_time_model = test_service_time_model
-    #             args.args.service_time_model = service_time_model
-    #             args.args.dqn_explr_lr = dqn_explr_lr
-    #             last = rl_experiment_wrapper(args,
-    #                                          train_workloads=train_workloads, test_workloads=test_workloads)
-    # return
-
-    # EXPERIMENT_NAME = 'replay_mem_size_experiment'
-
-    # train_workloads = workload_builder.create_train_base_workloads(
-    #     long_tasks_fractions=[0.3, 0.35, 0.4], utilizations=[0.45], num_requests=8000)
-
-    # test_workloads = workload_builder.create_test_var_long_tasks_workloads(
-    #     num_requests=128000)
-
-    # const.EVAL_POLICIES_TO_RUN = [
-    #     'round_robin',
-    #     'ARS',
-    #     'DQN',
-    #     'random',
-    #     # 'DQN_EXPLR',
-    #     # 'DQN_DUPL'
-    # ] + ['DQN_DUPL_10', 'DQN_DUPL_25', 'DQN_DUPL_40', 'DQN_DUPL_45'] + ['DQN_EXPLR_0', 'DQN_EXPLR_10', 'DQN_EXPLR_20', 'DQN_EXPLR_25']
-
-    # args = HeterogeneousRequestsArgs(input_args=input_args)
-    # args.args.exp_name = EXPERIMENT_NAME
-    # args.args.epochs = 100
-    # args.args.eps_decay = 180000
-    # args.args.lr_scheduler_step_size = 30
-    # args.args.model_folder = ''
-    # args.args.offline_model = '/home/jonas/projects/absim/outputs/offline_parameter_search/9/train/data'
-    # args.args.collect_train_data = False
-
-    # i = 12
-    # for buffer_size in [1000, 100]:
-    #     for use_newest in [True, False]:
-    #         for dqn_explr_lr in [1e-5, 1e-6]:
-    #             args.args.seed = SEED
-    #             args.args.replay_always_use_newest = use_newest
-    #             args.args.replay_memory_size = buffer_size
-    #             args.args.dqn_explr_lr = dqn_explr_lr
-    #             last = rl_experiment_wrapper(args,
-    #                                          train_workloads=train_workloads, test_workloads=test_workloads)
-    #             if dqn_explr_lr == 1e-5:
-    #                 args.args.model_folder = f'/home/jonas/projects/absim/outputs/replay_mem_size_experiment/{i}/train/data'
-    #             else:
-    #                 args.args.model_folder = ''
-    #             i += 1
-
-    # EXPERIMENT_NAME = 'offline_parameter_search'
-
-    # train_workloads = workload_builder.create_train_base_workloads(
-    #     long_tasks_fractions=[0.3, 0.35, 0.4], utilizations=[0.45], num_requests=48000)
-
-    # test_workloads = workload_builder.create_test_base_workloads(utilizations=[0.45], long_tasks_fractions=[
-    #                                                              0.3, 0.35, 0.4], num_requests=8000)  # workload_builder.create_test_var_long_tasks_workloads(num_requests=128000)
-
-    # const.EVAL_POLICIES_TO_RUN = ['ARS', 'DQN', 'OFFLINE_DQN', 'random']
-    # args = HeterogeneousRequestsArgs(input_args=input_args)
-    # args.args.exp_name = EXPERIMENT_NAME
-    # args.args.eps_decay = 180000
-    # args.args.lr_scheduler_step_size = 30
-    # args.args.replay_always_use_newest = False
-    # args.args.model_folder = '/home/jonas/projects/absim/outputs/fixed_memory_not_use_latest/0/train/data'
-    # args.args.offline_model = ''  # '/home/jonas/projects/absim/outputs/fixed_memory_not_use_latest/0/train/data'
-
-    # # '/home/jonas/projects/absim/outputs/collect_offline_data/0/collected_training_data'
-
-    # for train_policy in ['random']:
-    #     for epochs in [10, 20]:
-    #         for num_requests in [48000, 96000]:
-    #             args.args.collect_train_data = True
-
-    #             const.TRAIN_POLICIES_TO_RUN = [train_policy]
-    #             train_workloads = workload_builder.create_train_base_workloads(
-    #                 long_tasks_fractions=[0.3, 0.35, 0.4], utilizations=[0.45], num_requests=num_requests)
-
-    #             test_workloads = workload_builder.create_test_base_workloads(utilizations=[0.45], long_tasks_fractions=[
-    #                 0.0, 0.1, 0.3, 0.35, 0.4, 0.6, 0.7], num_requests=8000)  # workload_builder.create_test_var_long_tasks_workloads(num_requests=128000)
-    #             args.args.epochs = epochs
-
-    #             args.args.seed = SEED
-    #             last = rl_experiment_wrapper(args,
-    #                                          train_workloads=train_workloads, test_workloads=test_workloads)
-
-    EXPERIMENT_NAME = 'offline_adaption'
-
-    train_workloads = []
-
-    test_workloads = workload_builder.create_test_var_long_tasks_workloads(num_requests=128000)
-
-    const.EVAL_POLICIES_TO_RUN = ['ARS', 'OFFLINE_DQN', 'OFFLINE_DQN_EXPLR_10_TRAIN', 'OFFLINE_DQN_EXPLR_20_TRAIN',
-                                  'OFFLINE_DQN_EXPLR_30_TRAIN', 'OFFLINE_DQN_DUPL_10_TRAIN', 'OFFLINE_DQN_DUPL_20_TRAIN', 'OFFLINE_DQN_DUPL_30_TRAIN']
-    args = HeterogeneousRequestsArgs(input_args=input_args)
-    args.args.exp_name = EXPERIMENT_NAME
-    args.args.eps_decay = 180000
-    args.args.lr_scheduler_step_size = 30
-    args.args.replay_always_use_newest = False
-    args.args.collect_train_data = False
-    args.args.model_folder = '/home/jonas/projects/absim/outputs/fixed_memory_not_use_latest/0/train/data'
-    args.args.offline_model = ''  # '/home/jonas/projects/absim/outputs/fixed_memory_not_use_latest/0/train/data'
-
-    # '/home/jonas/projects/absim/outputs/collect_offline_data/0/collected_training_data'
-
-    for offline_model in ['/home/jonas/projects/absim/outputs/offline_parameter_search/9/offline_train/data', '/home/jonas/projects/absim/outputs/offline_parameter_search/0/offline_train/data']:
-        for offline_train_batch_size in [2000, 4000, 8000]:
-            args.args.collect_train_data = False
-            args.args.offline_model = offline_model
-            args.args.offline_train_batch_size = offline_train_batch_size
-
-            args.args.seed = SEED
-            last = rl_experiment_wrapper(args,
-                                         train_workloads=train_workloads, test_workloads=test_workloads)
-
-    return
-    EXPERIMENT_NAME = 'fixed_memory_not_use_latest'
-
-    train_workloads = workload_builder.create_train_base_workloads(
-        long_tasks_fractions=[0.3, 0.35, 0.4], utilizations=[0.45], num_requests=8000)
-
-    test_workloads = workload_builder.create_test_var_long_tasks_workloads(
-        num_requests=128000)
-
-    const.EVAL_POLICIES_TO_RUN = [
-        'round_robin',
-        'ARS',
-        'DQN',
-        'random',
-        # 'DQN_EXPLR',
-        # 'DQN_DUPL'
-    ] + ['DQN_DUPL_10', 'DQN_DUPL_25', 'DQN_DUPL_40', 'DQN_DUPL_45'] + ['DQN_EXPLR_0', 'DQN_EXPLR_10', 'DQN_EXPLR_20', 'DQN_EXPLR_25']
-
-    args = HeterogeneousRequestsArgs(input_args=input_args)
-    args.args.exp_name = EXPERIMENT_NAME
-    args.args.epochs = 100
-    args.args.eps_decay = 180000
-    args.args.lr_scheduler_step_size = 30
-    args.args.model_folder = ''
-    args.args.replay_always_use_newest = False
-    args.args.offline_model = 'dummy'
-
-    for service_time_model in ['random.expovariate']:  # 'pareto'
-        for test_service_time_model in ['random.expovariate', 'pareto']:  # 'random.expovariate',
-            for dqn_explr_lr in [1e-5, 1e-6]:
-                args.args.seed = SEED
-                args.args.test_service_time_model = test_service_time_model
-                args.args.service_time_model = service_time_model
-                args.args.dqn_explr_lr = dqn_explr_lr
-                last = rl_experiment_wrapper(args,
-                                             train_workloads=train_workloads, test_workloads=test_workloads)
-                if (test_service_time_model == 'random.expovariate' and dqn_explr_lr == 1e-5):
-                    args.args.model_folder = '/home/jonas/projects/absim/outputs/fixed_memory_not_use_latest/0/train/data'
-
-    EXPERIMENT_NAME = 'fixed_memory_train_not_test_use_latest'
-
-    train_workloads = workload_builder.create_train_base_workloads(
-        long_tasks_fractions=[0.3, 0.35, 0.4], utilizations=[0.45], num_requests=8000)
-
-    test_workloads = workload_builder.create_test_var_long_tasks_workloads(
-        num_requests=128000)
-
-    const.EVAL_POLICIES_TO_RUN = [
-        'round_robin',
-        'ARS',
-        'DQN',
-        'random',
-        # 'DQN_EXPLR',
-        # 'DQN_DUPL'
-    ] + ['DQN_DUPL_10', 'DQN_DUPL_25', 'DQN_DUPL_40', 'DQN_DUPL_45'] + ['DQN_EXPLR_0', 'DQN_EXPLR_10', 'DQN_EXPLR_20', 'DQN_EXPLR_25']
-
-    args = HeterogeneousRequestsArgs(input_args=input_args)
-    args.args.exp_name = EXPERIMENT_NAME
-    args.args.epochs = 100
-    args.args.eps_decay = 180000
-    args.args.lr_scheduler_step_size = 30
-    args.args.model_folder = ''
-    args.args.replay_always_use_newest = True
-    args.args.offline_model = 'dummy'
-    args.args.model_folder = '/home/jonas/projects/absim/outputs/fixed_memory_not_use_latest/0/train/data'
-
-    for service_time_model in ['random.expovariate']:  # 'pareto'
-        for test_service_time_model in ['random.expovariate', 'pareto']:  # 'random.expovariate',
-            for dqn_explr_lr in [1e-5, 1e-6]:
-                args.args.seed = SEED
-                args.args.test_service_time_model = test_service_time_model
-                args.args.service_time_model = service_time_model
-                args.args.dqn_explr_lr = dqn_explr_lr
-                last = rl_experiment_wrapper(args,
-                                             train_workloads=train_workloads, test_workloads=test_workloads)
-
-    EXPERIMENT_NAME = 'replay_mem_size_experiment'
-
-    train_workloads = workload_builder.create_train_base_workloads(
-        long_tasks_fractions=[0.3, 0.35, 0.4], utilizations=[0.45], num_requests=8000)
-
-    test_workloads = workload_builder.create_test_var_long_tasks_workloads(
-        num_requests=128000)
-
-    const.EVAL_POLICIES_TO_RUN = [
-        'round_robin',
-        'ARS',
-        'DQN',
-        'random',
-        # 'DQN_EXPLR',
-        # 'DQN_DUPL'
-    ] + ['DQN_DUPL_10', 'DQN_DUPL_25', 'DQN_DUPL_40', 'DQN_DUPL_45'] + ['DQN_EXPLR_0', 'DQN_EXPLR_10', 'DQN_EXPLR_20', 'DQN_EXPLR_25']
-
-    args = HeterogeneousRequestsArgs(input_args=input_args)
-    args.args.exp_name = EXPERIMENT_NAME
-    args.args.epochs = 100
-    args.args.eps_decay = 180000
-    args.args.lr_scheduler_step_size = 30
-    args.args.model_folder = ''
-    args.args.offline_model = 'dummy'
-
-    i = 0
-    for buffer_size in [25000, 5000, 100000]:  # 'pareto'
-        for use_newest in [True, False]:  # 'random.expovariate',
-            for dqn_explr_lr in [1e-5, 1e-6]:
-                args.args.seed = SEED
-                args.args.replay_always_use_newest = use_newest
-                args.args.replay_memory_size = buffer_size
-                args.args.service_time_model = service_time_model
-                args.args.dqn_explr_lr = dqn_explr_lr
-                last = rl_experiment_wrapper(args,
-                                             train_workloads=train_workloads, test_workloads=test_workloads)
-                if dqn_explr_lr == 1e-5:
-                    args.args.model_folder = f'/home/jonas/projects/absim/outputs/replay_mem_size_experiment/{i}/train/data'
-                else:
-                    args.args.model_folder = ''
-                i += 1
-
-    return
-    EXPERIMENT_NAME = 'larger_replay_memory'
-
-    train_workloads = workload_builder.create_train_base_workloads(
-        long_tasks_fractions=[0.3, 0.35, 0.4], utilizations=[0.45], num_requests=8000)
-
-    test_workloads = workload_builder.create_test_var_long_tasks_workloads(
-        num_requests=128000)
-
-    const.EVAL_POLICIES_TO_RUN = [
-        'round_robin',
-        'ARS',
-        'DQN',
-        'random',
-        # 'DQN_EXPLR',
-        # 'DQN_DUPL'
-    ] + ['DQN_DUPL_10', 'DQN_DUPL_25', 'DQN_DUPL_40', 'DQN_DUPL_45'] + ['DQN_EXPLR_0', 'DQN_EXPLR_10', 'DQN_EXPLR_20', 'DQN_EXPLR_25']
-
-    args = HeterogeneousRequestsArgs(input_args=input_args)
-    args.args.exp_name = EXPERIMENT_NAME
-    args.args.epochs = 100
-    args.args.eps_decay = 180000
-    args.args.lr_scheduler_step_size = 30
-    args.args.model_folder = ''
-    args.args.replay_always_use_newest = True
-    args.args.replay_memory_size = 50000
-    args.args.model_folder = '/home/jonas/projects/absim/outputs/fixed_memory_not_use_latest/0/train/data'
-
-    args.args.offline_model = 'dummy'
-
-    for service_time_model in ['random.expovariate']:  # 'pareto'
-        for test_service_time_model in ['random.expovariate', 'pareto']:  # 'random.expovariate',
-            for dqn_explr_lr in [1e-5, 1e-6]:
-                args.args.seed = SEED
-                args.args.test_service_time_model = test_service_time_model
-                args.args.service_time_model = service_time_model
-                args.args.dqn_explr_lr = dqn_explr_lr
-                last = rl_experiment_wrapper(args,
-                                             train_workloads=train_workloads, test_workloads=test_workloads)
-
-    return
+        return TimeVaryingServerArgs(input_args=input_args)
+    raise Exception(f'Unknown setting {setting}')
+
+
+def run_autotune_trial(input_args: List[str], setting: str, epoch_callback: Callable[[int, float], None] | None = None) -> float:
+    # Trains DQN on the default train workloads and returns the negated p99 latency, no evaluation sweeps are run
+    args = create_simulation_args(input_args=input_args, setting=setting)
+    workload_builder = WorkloadBuilder(config_folder=Path('..', 'configs'))
+    train_workloads = workload_builder.create_train_base_workloads()
+
+    train_policies = const.TRAIN_POLICIES_TO_RUN
+    const.TRAIN_POLICIES_TO_RUN = ['DQN']
+    try:
+        return rl_experiment_wrapper(args, train_workloads=train_workloads, test_workloads=[],
+                                     epoch_callback=epoch_callback, run_tests=False)
+    finally:
+        const.TRAIN_POLICIES_TO_RUN = train_policies
+
+
+def main(input_args: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description='Run an experiment sweep (see sweep.py) or, given simulation arguments (see simulation_args.py), '
+                    'a single experiment on the default train and test workloads')
+    parser.add_argument('--sweep_spec', nargs='?', type=Path, default=None,
+                        help=f'Sweep spec to run, {DEFAULT_SWEEP_SPEC} if neither a setting nor simulation arguments '
+                             f'are given')
+    parser.add_argument('--workers', nargs='?', type=int, default=1, help='Number of sweep nodes run in parallel')
+    parser.add_argument('--setting', nargs='?', type=str, choices=SETTINGS, default=None,
+                        help='Scenario of a single experiment (default: base)')
+    args, simulation_input_args = parser.parse_known_args(args=input_args)
+
+    if args.sweep_spec is not None or (args.setting is None and len(simulation_input_args) == 0):
+        # The nodes of a sweep get their arguments from the spec
+        if len(simulation_input_args) > 0 or args.setting is not None:
+            parser.error(f'Arguments of sweeps are set in the spec, got {" ".join(simulation_input_args)}')
+        sweep_spec = args.sweep_spec if args.sweep_spec is not None else DEFAULT_SWEEP_SPEC
+        run_sweep(load_sweep_spec(sweep_spec), workers=args.workers)
+        return
+
+    # Unknown arguments fail in SimulationArgs
+    simulation_args = create_simulation_args(input_args=simulation_input_args, setting=args.setting or 'base')
+    workload_builder = WorkloadBuilder(config_folder=Path('..', 'configs'))
+    rl_experiment_wrapper(simulation_args, train_workloads=workload_builder.create_train_base_workloads(),
+                          test_workloads=workload_builder.create_test_base_workloads())
 
 
 if __name__ == '__main__':
-    main(setting="base")
+    main()
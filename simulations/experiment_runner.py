@@ -1,27 +1,41 @@
-from typing import Any, Dict, List
+import multiprocessing
+import os
+import traceback
+from typing import TYPE_CHECKING, Any, Callable, Dict, List
+
+import numpy as np
 import server
 import client
 from simulations.state import StateParser
-from simulations.training.offline_model_trainer import OfflineTrainer
-from simulations.training.training_data_collector import TrainingDataCollector
+from simulations.workload.access_pattern import create_access_pattern
 from simulations.workload.workload import BaseWorkload, VariableLongTaskFractionWorkload
 from simulator import Simulation
 import constants
 import sys
 import simulations.workload.mu_updater as mu_updater
-from simulations.monitor import Monitor
+from simulations.monitor import DataPointMonitor, Monitor
+import simulations.profiling as profiling
+from simulations.warmup import warmup_end_time
 from pathlib import Path
-from simulations.training.model_trainer import Trainer
+
+if TYPE_CHECKING:
+    from simulations.training.model_trainer import Trainer
+    from simulations.training.offline_model_trainer import OfflineTrainer
+    from simulations.training.training_data_collector import TrainingDataCollector
 
 
 class ExperimentRunner:
-    def __init__(self, state_parser: StateParser, trainer: Trainer = None, offline_trainer: OfflineTrainer = None) -> None:
+    def __init__(self, state_parser: StateParser, trainer: 'Trainer' = None, offline_trainer: 'OfflineTrainer' = None) -> None:
         self.servers: List[server.Server] = []
         self.clients: List[client.Client] = []
         self.workload_gens: List[BaseWorkload] = []
         self.state_parser = state_parser
         self.trainer = trainer
         self.offline_trainer = offline_trainer
+        # State of the current run, see start_experiment
+        self.simulation: Simulation | None = None
+        self.data_point_monitor: DataPointMonitor | None = None
+        self.workload_process = None
 
     def reset_stats(self) -> None:
         self.servers = []
@@ -33,12 +47,68 @@ class ExperimentRunner:
         ratio = self.clients[client_index].dqn_decision_equal_to_ars / self.clients[client_index].requests_handled
         print(f'DQN matched ARS for {ratio * 100}% of decisions')
 
-    def run_experiment(self, args, workload: BaseWorkload, service_time_model: str, training_data_collector: TrainingDataCollector, duplication_rate: float = 0.0) -> Monitor:
+    def run_experiment(self, args, workload: BaseWorkload, service_time_model: str, training_data_collector: 'TrainingDataCollector', duplication_rate: float = 0.0) -> DataPointMonitor:
+        self.start_experiment(args, workload=workload, service_time_model=service_time_model,
+                              training_data_collector=training_data_collector, duplication_rate=duplication_rate)
+        return self.finish_experiment(args, workload=workload)
+
+    def fork_experiment(self, args, workload: BaseWorkload, service_time_model: str,
+                        branches: Dict[str, Callable[['ExperimentRunner'], None]], fork_time: float,
+                        training_data_collector: 'TrainingDataCollector', duplication_rate: float = 0.0) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        Simulates the shared prefix up to fork_time once, then continues each branch from a copy-on-write snapshot in a
+        forked child. A branch changes the runner (e.g. with set_selection_strategy) before the run continues. Returns
+        the data point columns of every branch, requests sent before fork_time are not included.
+        """
+        self.start_experiment(args, workload=workload, service_time_model=service_time_model,
+                              training_data_collector=training_data_collector, duplication_rate=duplication_rate)
+        self.simulation.run(until=fork_time)
+
+        results = {}
+        for name, branch in branches.items():
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            # Output buffered before the fork would be printed by every child as well
+            sys.stdout.flush()
+            pid = os.fork()
+            if pid == 0:
+                receiver.close()
+                exit_code = 0
+                try:
+                    branch(self)
+                    data_point_monitor = self.finish_experiment(args, workload=workload)
+                    data_point_monitor.drop_sent_before(fork_time)
+                    sender.send(data_point_monitor.get_columns())
+                except BaseException:
+                    sender.send(traceback.format_exc())
+                    exit_code = 1
+                finally:
+                    sys.stdout.flush()
+                    os._exit(exit_code)
+            sender.close()
+            result = receiver.recv()
+            os.waitpid(pid, 0)
+            if isinstance(result, str):
+                raise Exception(f'Branch {name} failed:\n{result}')
+            results[name] = result
+        # The parent stopped the workload at the fork, later runs start it from the beginning
+        workload.reset_workload()
+        return results
+
+    def set_selection_strategy(self, selection_strategy: str, duplication_rate: float | None = None) -> None:
+        # ds keeps per client state that is only created at the start of a run
+        assert selection_strategy != 'ds', 'Cannot switch to ds during a run'
+        for c in self.clients:
+            c.REPLICA_SELECTION_STRATEGY = selection_strategy
+            if duplication_rate is not None:
+                c.duplication_rate = duplication_rate
+
+    def start_experiment(self, args, workload: BaseWorkload, service_time_model: str, training_data_collector: 'TrainingDataCollector', duplication_rate: float = 0.0) -> None:
         self.reset_stats()
+        profiling.next_episode(label=f'{args.selection_strategy} seed {args.seed}')
 
         # Set the random seed
         simulation = Simulation()
-        simulation.set_seed(args.seed)
+        simulation.set_seed(args.seed, common_random_numbers=args.common_random_numbers)
 
         constants.NW_LATENCY_BASE = args.nw_latency_base
         constants.NW_LATENCY_MU = args.nw_latency_mu
@@ -46,6 +116,8 @@ class ExperimentRunner:
         constants.NUMBER_OF_CLIENTS = args.num_clients
 
         assert args.exp_scenario != ""
+        # Checked before simulating, the warmup is dropped once the run finished
+        assert args.warmup_requests < workload.num_requests, 'Warmup is longer than the workload'
 
         service_rate_per_server = []
         if args.exp_scenario == "base" or args.exp_scenario == 'heterogenous_requests_scenario':
@@ -99,7 +171,7 @@ class ExperimentRunner:
             else:
                 service_rate_per_server = [1 / float(args.service_time)] * args.num_servers
 
-            simulation.random.shuffle(server_slow_assignment)
+            simulation.random_server.shuffle(server_slow_assignment)
             # print(sum(serviceRatePerServer), (1/float(baseServiceTime)) * args.num_servers)
 
             # We dont scale the rate to the average rate
@@ -196,7 +268,12 @@ class ExperimentRunner:
         assert sum(client_weights) <= args.num_clients
 
         # Start workload generators (analogous to YCSB)
-        data_point_monitor = Monitor(name="Latency", simulation=simulation)
+        data_point_monitor = DataPointMonitor(name="Latency", simulation=simulation)
+
+        # Built once and shared by all clients and the workload
+        access_pattern = create_access_pattern(args.access_pattern, num_servers=args.num_servers,
+                                               zipf_exponent=args.zipf_exponent,
+                                               key_popularity_file=args.key_popularity_file)
 
         # Start the clients
         for i in range(args.num_clients):
@@ -205,7 +282,7 @@ class ExperimentRunner:
                               data_point_monitor=data_point_monitor,
                               state_parser=self.state_parser,
                               replica_selection_strategy=args.selection_strategy,
-                              access_pattern=args.access_pattern,
+                              access_pattern=access_pattern,
                               replication_factor=args.replication_factor,
                               backpressure=args.backpressure,
                               shadow_read_ratio=args.shadow_read_ratio,
@@ -227,12 +304,28 @@ class ExperimentRunner:
         # More than 1 workload currently not supported
         assert args.num_workload == 1
         print(f'Running with seed {args.seed}')
-        simulation.process(workload.run(servers=self.servers, clients=self.clients,
-                           seed=args.seed, simulation=simulation))
+        self.workload_process = simulation.process(workload.run(servers=self.servers, clients=self.clients,
+                                                                seed=args.seed, simulation=simulation))
         self.workload_gens.append(workload)
-
-        # Begin simulation
-        simulation.run(until=args.simulation_duration)
+        self.simulation = simulation
+        self.data_point_monitor = data_point_monitor
+
+    def finish_experiment(self, args, workload: BaseWorkload) -> DataPointMonitor:
+        simulation = self.simulation
+        data_point_monitor = self.data_point_monitor
+
+        # Begin simulation, it ends once all requests completed. Periodic processes (MuUpdater, DynamicSnitch) never
+        # finish on their own and are not run past that point, simulation_duration only bounds runs that stall.
+        simulation.run(until=simulation.any_of([simulation.drained(self.workload_process),
+                                                simulation.timeout(args.simulation_duration - simulation.now)]))
+
+        # Warmup requests are simulated (and trained on) but not recorded
+        warmup_end = warmup_end_time(data_point_monitor, warmup_time=args.warmup_time, warmup_mser=args.warmup_mser)
+        dropped = 0
+        if warmup_end > 0 or args.warmup_requests > 0:
+            dropped = data_point_monitor.drop_sent_before(warmup_end, request_index=args.warmup_requests)
+            print(f'Dropped {dropped} warmup data points of the first {args.warmup_requests} requests or sent '
+                  f'before {warmup_end:.1f}')
 
         if args.print:
             for serv in self.servers:
@@ -249,6 +342,6 @@ class ExperimentRunner:
 
             # print_monitor_time_series_to_file(latency_fd, "0",
             #                                   data_point_monitor)
-            assert workload.num_requests == len(data_point_monitor)
+            assert warmup_end > 0 or workload.num_requests == len(data_point_monitor) + dropped
 
         return data_point_monitor
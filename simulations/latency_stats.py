@@ -0,0 +1,177 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+REQUEST_CLASSES = ['all', 'long', 'short']
+
+
+class SortedGroups:
+    """
+    Values sorted once within each group, group g occupies values[starts[g]:starts[g] + counts[g]]. Quantiles
+    use linear interpolation like pandas and numpy.
+    """
+
+    def __init__(self, group_ids: np.ndarray, values: np.ndarray, n_groups: int,
+                 value_order: np.ndarray | None = None) -> None:
+        # value_order are indices that sort values (or a subset of them), several groupings can share one sort
+        if value_order is None:
+            value_order = np.argsort(values, kind='stable')
+        sorted_group_ids = group_ids[value_order].astype(np.int16 if n_groups < 2 ** 15 else np.int64)
+        # A stable sort of small integers keeps the values sorted within each group (radix sort for int16)
+        order = value_order[np.argsort(sorted_group_ids, kind='stable')]
+        self.values = values[order]
+        self.counts = np.bincount(sorted_group_ids, minlength=n_groups)
+        self.starts = np.concatenate(([0], np.cumsum(self.counts)[:-1]))
+
+    def group(self, group_id: int) -> np.ndarray:
+        return self.values[self.starts[group_id]:self.starts[group_id] + self.counts[group_id]]
+
+    def quantile(self, q: float) -> np.ndarray:
+        # NaN for empty groups
+        result = np.full(len(self.counts), np.nan)
+        non_empty = self.counts > 0
+        position = q * (self.counts[non_empty] - 1)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, self.counts[non_empty] - 1)
+        lower_values = self.values[self.starts[non_empty] + lower]
+        upper_values = self.values[self.starts[non_empty] + upper]
+        result[non_empty] = lower_values + (upper_values - lower_values) * (position - lower)
+        return result
+
+    def mean(self) -> np.ndarray:
+        result = np.full(len(self.counts), np.nan)
+        non_empty = self.counts > 0
+        result[non_empty] = np.add.reduceat(self.values, self.starts[non_empty]) / self.counts[non_empty]
+        return result
+
+
+class LatencyStats:
+    """
+    Latency statistics of an ExperimentPlot frame grouped by policy (and epoch) for all, long and short requests.
+    Latencies of every group are sorted once, all quantiles, means and CDFs are computed from the sorted arrays
+    and cached.
+    """
+
+    def __init__(self, df: pd.DataFrame) -> None:
+        policies = df['Policy']
+        if isinstance(policies.dtype, pd.CategoricalDtype):
+            self.policy_categories = list(policies.cat.categories)
+            self.policy_codes = policies.cat.codes.to_numpy().astype(np.int64)
+        else:
+            self.policy_categories, self.policy_codes = self.factorize(policies)
+        self.epochs, self.epoch_codes = self.factorize(df['Epoch'])
+        self.latencies = df['Latency'].to_numpy(dtype=np.float64)
+        self.is_long_request = df['Is_long_request'].to_numpy(dtype=bool)
+
+        self._latency_order: np.ndarray | None = None
+        self.groups: Dict[Tuple[str, bool], SortedGroups] = {}
+        self.cache: Dict[tuple, pd.DataFrame] = {}
+
+    @staticmethod
+    def factorize(column: pd.Series) -> Tuple[List, np.ndarray]:
+        categories, codes = np.unique(column.to_numpy(), return_inverse=True)
+        return list(categories), codes.astype(np.int64)
+
+    def request_class_mask(self, request_class: str) -> np.ndarray | None:
+        assert request_class in REQUEST_CLASSES, f'Unknown request class {request_class}'
+        if request_class == 'long':
+            return self.is_long_request
+        if request_class == 'short':
+            return ~self.is_long_request
+        return None
+
+    def latency_order(self, request_class: str) -> np.ndarray:
+        # All latencies are sorted only once, filtering the sorted indices keeps them sorted
+        if self._latency_order is None:
+            self._latency_order = np.argsort(self.latencies, kind='stable')
+        mask = self.request_class_mask(request_class)
+        if mask is None:
+            return self._latency_order
+        return self._latency_order[mask[self._latency_order]]
+
+    def sorted_groups(self, request_class: str, by_epoch: bool) -> SortedGroups:
+        key = (request_class, by_epoch)
+        if key not in self.groups:
+            group_ids = self.policy_codes * len(self.epochs) + self.epoch_codes if by_epoch else self.policy_codes
+            n_groups = len(self.policy_categories) * (len(self.epochs) if by_epoch else 1)
+            self.groups[key] = SortedGroups(group_ids=group_ids, values=self.latencies, n_groups=n_groups,
+                                            value_order=self.latency_order(request_class))
+        return self.groups[key]
+
+    def prepare(self) -> None:
+        # Sorts all groupings up front, e.g. before forking processes that share the statistics
+        for request_class in REQUEST_CLASSES:
+            for by_epoch in [True, False]:
+                self.sorted_groups(request_class=request_class, by_epoch=by_epoch)
+
+    def group_frame(self, values: np.ndarray, request_class: str, by_epoch: bool) -> pd.DataFrame:
+        # Frame of the non-empty groups like a groupby with observed=True
+        group_ids = np.flatnonzero(self.sorted_groups(request_class=request_class, by_epoch=by_epoch).counts)
+        n_epochs = len(self.epochs) if by_epoch else 1
+        data = {'Policy': pd.Categorical.from_codes(group_ids // n_epochs, categories=self.policy_categories)}
+        if by_epoch:
+            data['Epoch'] = np.asarray(self.epochs)[group_ids % n_epochs]
+        data['Latency'] = values[group_ids]
+        return pd.DataFrame(data)
+
+    def quantile(self, q: float, request_class: str = 'all', by_epoch: bool = True) -> pd.DataFrame:
+        key = ('quantile', q, request_class, by_epoch)
+        if key not in self.cache:
+            groups = self.sorted_groups(request_class=request_class, by_epoch=by_epoch)
+            self.cache[key] = self.group_frame(values=groups.quantile(q), request_class=request_class,
+                                               by_epoch=by_epoch)
+        return self.cache[key]
+
+    def mean(self, request_class: str = 'all', by_epoch: bool = False) -> pd.DataFrame:
+        key = ('mean', request_class, by_epoch)
+        if key not in self.cache:
+            groups = self.sorted_groups(request_class=request_class, by_epoch=by_epoch)
+            self.cache[key] = self.group_frame(values=groups.mean(), request_class=request_class, by_epoch=by_epoch)
+        return self.cache[key]
+
+    def mean_epoch_quantile(self, q: float, request_class: str = 'all') -> pd.DataFrame:
+        # Quantile of every epoch averaged over all epochs of a policy
+        quantiles = self.quantile(q, request_class=request_class, by_epoch=True)
+        return quantiles.groupby('Policy', observed=True)['Latency'].mean().reset_index()
+
+    def tail_cdf(self, q: float, request_class: str = 'all') -> pd.DataFrame:
+        # CDF per policy of all latencies above the q quantile of their epoch
+        key = ('tail_cdf', q, request_class)
+        if key not in self.cache:
+            groups = self.sorted_groups(request_class=request_class, by_epoch=True)
+            thresholds = groups.quantile(q)
+            n_epochs = len(self.epochs)
+
+            policy_frames = []
+            for policy_code in range(len(self.policy_categories)):
+                tails = []
+                for group_id in range(policy_code * n_epochs, (policy_code + 1) * n_epochs):
+                    values = groups.group(group_id)
+                    # Values are sorted, the tail is the suffix above the threshold
+                    tails.append(values[np.searchsorted(values, thresholds[group_id], side='right'):])
+                latencies = np.sort(np.concatenate(tails))
+                if len(latencies) == 0:
+                    continue
+                policy_frames.append(pd.DataFrame({
+                    'Policy': pd.Categorical.from_codes(np.full(len(latencies), policy_code),
+                                                        categories=self.policy_categories),
+                    'Latency': latencies,
+                    'CDF': np.arange(1, len(latencies) + 1) / len(latencies)}))
+
+            if len(policy_frames) == 0:
+                self.cache[key] = pd.DataFrame({'Policy': pd.Categorical([], categories=self.policy_categories),
+                                                'Latency': np.array([], dtype=np.float64),
+                                                'CDF': np.array([], dtype=np.float64)})
+            else:
+                self.cache[key] = pd.concat(policy_frames, ignore_index=True)
+        return self.cache[key]
+
+
+def select_policies(df: pd.DataFrame, policies: List[str] | None) -> pd.DataFrame:
+    # Restricts a statistics frame to the given policies, unused policies are dropped from the categories
+    if policies is None:
+        return df
+    df = df[df['Policy'].isin(policies)].copy()
+    df['Policy'] = df['Policy'].cat.remove_unused_categories()
+    return df
@@ -30,3 +30,83 @@ class Monitor:
 
     def __len__(self):
         return len(self.data)
+
+
+class DataPointMonitor(Monitor):
+    """
+    Monitor for the DataPoints of completed requests. Only the plotted fields are stored, as columns that results
+    are turned into arrays from. The observed points are rebuilt from the columns on demand, without their state
+    and q values.
+    """
+
+    COLUMNS = ['time', 'latency', 'replica_id', 'is_long_request', 'is_faster_response', 'is_duplicate',
+               'task_time_sent', 'utilization', 'long_tasks_fraction', 'request_index']
+
+    def __init__(self, simulation, name=""):
+        self.simulation = simulation
+        self.name = name
+        self.columns = {column: [] for column in self.COLUMNS}
+
+    def observe(self, y, t=None):
+        self.columns['time'].append(self.simulation.now if t is None else t)
+        self.columns['latency'].append(y.latency)
+        self.columns['replica_id'].append(y.replica_id)
+        self.columns['is_long_request'].append(y.state.is_long_request)
+        self.columns['is_faster_response'].append(y.is_faster_response)
+        self.columns['is_duplicate'].append(y.is_duplicate)
+        self.columns['task_time_sent'].append(y.task_time_sent)
+        self.columns['utilization'].append(y.utilization)
+        self.columns['long_tasks_fraction'].append(y.long_tasks_fraction)
+        self.columns['request_index'].append(y.request_index)
+
+    @property
+    def data(self):
+        return self.get_data()
+
+    def get_data(self):
+        # Imported here, the client imports this module
+        from simulations.client import DataPoint
+
+        return [(DataPoint(state=None, q_values=None, task_time_sent=task_time_sent, latency=latency,
+                           replica_id=replica_id, is_duplicate=is_duplicate, is_faster_response=is_faster_response,
+                           utilization=utilization, long_tasks_fraction=long_tasks_fraction,
+                           request_index=request_index), time)
+                for (time, latency, replica_id, _, is_faster_response, is_duplicate, task_time_sent, utilization,
+                     long_tasks_fraction, request_index) in zip(*(self.columns[column] for column in self.COLUMNS))]
+
+    def __iter__(self):
+        return iter(self.get_data())
+
+    def __len__(self):
+        return len(self.columns['latency'])
+
+    def get_columns(self):
+        return {
+            'time': np.asarray(self.columns['time'], dtype=np.float64),
+            'latency': np.asarray(self.columns['latency'], dtype=np.float64),
+            'replica_id': np.asarray(self.columns['replica_id'], dtype=np.int32),
+            'is_long_request': np.asarray(self.columns['is_long_request'], dtype=bool),
+            'is_faster_response': np.asarray(self.columns['is_faster_response'], dtype=bool),
+            'is_duplicate': np.asarray(self.columns['is_duplicate'], dtype=bool),
+            'task_time_sent': np.asarray(self.columns['task_time_sent'], dtype=np.float64),
+            'utilization': np.asarray(self.columns['utilization'], dtype=np.float32),
+            'long_tasks_fraction': np.asarray(self.columns['long_tasks_fraction'], dtype=np.float32),
+            'request_index': np.asarray(self.columns['request_index'], dtype=np.int64),
+        }
+
+    def get_primary_data(self):
+        return self.columns['latency']
+
+    def get_faster_response_latencies(self) -> np.ndarray:
+        # Latencies of the responses that arrived first, the ones the reported statistics use
+        return np.asarray(self.columns['latency'], dtype=np.float64)[
+            np.asarray(self.columns['is_faster_response'], dtype=bool)]
+
+    def drop_sent_before(self, time: float, request_index: int = 0) -> int:
+        # Drops the points of requests sent before time or before the request_index-th request of the workload,
+        # returns how many were dropped
+        keep = [task_time_sent >= time and (request_index == 0 or index >= request_index)
+                for task_time_sent, index in zip(self.columns['task_time_sent'], self.columns['request_index'])]
+        for column in self.COLUMNS:
+            self.columns[column] = [value for value, kept in zip(self.columns[column], keep) if kept]
+        return len(keep) - len(self)
@@ -1,23 +1,78 @@
 import json
+import multiprocessing
 import os
+from collections import namedtuple
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 import simulations.constants as const
 from simulations.monitor import Monitor
 from simulations.client import DataPoint
+from simulations.latency_stats import LatencyStats, SortedGroups, select_policies
 import numpy as np
 from matplotlib.patches import Patch
 
 
 FONT_SIZE = 10
+# Scatter plots of single requests keep at most this many points
+MAX_SCATTER_POINTS = 20000
+
+# Call of an ExperimentPlot method producing one figure
+PlotJob = namedtuple('PlotJob', ['method', 'kwargs'])
+
+# DataPointMonitor column -> DataFrame column
+MONITOR_COLUMNS = {
+    'time': 'Time',
+    'latency': 'Latency',
+    'replica_id': 'Replica',
+    'is_long_request': 'Is_long_request',
+    'is_faster_response': 'Is_faster_response',
+    'is_duplicate': 'Is_duplicate',
+    'task_time_sent': 'Task_time_sent',
+    'utilization': 'Utilization',
+    'long_tasks_fraction': 'Long_tasks_fraction',
+}
+
+
+def monitor_columns(monitor: Monitor) -> Dict[str, np.ndarray]:
+    if hasattr(monitor, 'get_columns'):
+        return monitor.get_columns()
+
+    # Generic monitors only hold (DataPoint, time) tuples
+    data_point_time_tuples: List[Tuple[DataPoint, float]] = monitor.get_data()
+    return {
+        'time': np.array([time for (_, time) in data_point_time_tuples], dtype=np.float64),
+        'latency': np.array([data_point.latency for (data_point, _) in data_point_time_tuples], dtype=np.float64),
+        'replica_id': np.array([data_point.replica_id for (data_point, _) in data_point_time_tuples], dtype=np.int32),
+        'is_long_request': np.array([data_point.state.is_long_request for (data_point, _) in data_point_time_tuples], dtype=bool),
+        'is_faster_response': np.array([data_point.is_faster_response for (data_point, _) in data_point_time_tuples], dtype=bool),
+        'is_duplicate': np.array([data_point.is_duplicate for (data_point, _) in data_point_time_tuples], dtype=bool),
+        'task_time_sent': np.array([data_point.task_time_sent for (data_point, _) in data_point_time_tuples], dtype=np.float64),
+        'utilization': np.array([data_point.utilization for (data_point, _) in data_point_time_tuples], dtype=np.float32),
+        'long_tasks_fraction': np.array([data_point.long_tasks_fraction for (data_point, _) in data_point_time_tuples], dtype=np.float32),
+        'request_index': np.array([data_point.request_index for (data_point, _) in data_point_time_tuples], dtype=np.int64),
+    }
+
+
+def downsample_scatter(df: pd.DataFrame, max_points: int = MAX_SCATTER_POINTS) -> pd.DataFrame:
+    # Keeps the slowest 1% of requests (the interesting outliers) and a random sample of the others
+    if len(df) <= max_points:
+        return df
+    is_tail = (df['Latency'] > df['Latency'].quantile(0.99)).to_numpy()
+    n_sampled = max(max_points - int(is_tail.sum()), 0)
+    sampled = np.random.default_rng(0).choice(np.flatnonzero(~is_tail), size=n_sampled, replace=False)
+    return df.iloc[np.sort(np.concatenate((np.flatnonzero(is_tail), sampled)))]
 
 
 class ExperimentPlot:
     def __init__(self, plot_folder: Path, data_folder: Path, long_tasks_fraction: float = None, utilization: float | None = None, use_log_scale: bool = False) -> None:
-        self.df = None
+        # Episodes are collected as column arrays and only turned into a DataFrame when df is accessed
+        self._df: pd.DataFrame | None = None
+        self._stats: LatencyStats | None = None
+        self.episode_columns: List[Tuple[str, int, Dict[str, np.ndarray]]] = []
+        self.policies: List[str] = []
         self.plot_folder: Path = plot_folder
         self.data_folder: Path = data_folder
         self.use_log_scale: bool = use_log_scale
@@ -31,13 +86,87 @@ class ExperimentPlot:
         os.makedirs(plot_folder / 'episode', exist_ok=True)
         os.makedirs(plot_folder / 'pdfs/episode', exist_ok=True)
 
+    @property
+    def df(self) -> pd.DataFrame | None:
+        if len(self.episode_columns) > 0:
+            df = self.episode_columns_to_df()
+            self.episode_columns = []
+            if self._df is None:
+                self._df = df
+            else:
+                self._df = pd.concat((self.with_policy_categories(self._df), df), axis=0, ignore_index=True)
+            self._stats = None
+        return self._df
+
+    @df.setter
+    def df(self, df: pd.DataFrame | None) -> None:
+        self._df = df
+        self._stats = None
+        self.episode_columns = []
+
+    @property
+    def stats(self) -> LatencyStats:
+        # Computed once per frame and shared by all statistics and plots
+        df = self.df
+        if self._stats is None:
+            self._stats = LatencyStats(df)
+        return self._stats
+
+    def add_policies(self, policies: List[str]) -> None:
+        for policy in policies:
+            if policy not in self.policies:
+                self.policies.append(policy)
+        self.policy_order = [policy for policy in const.POLICY_ORDER if policy in self.policies]
+
+    def policy_categories(self) -> List[str]:
+        # Known policies in the usual plot order, followed by unknown ones in the order they were added
+        return self.policy_order + [policy for policy in self.policies if policy not in self.policy_order]
+
+    def with_policy_categories(self, df: pd.DataFrame) -> pd.DataFrame:
+        df = df.copy()
+        df['Policy'] = pd.Categorical(df['Policy'], categories=self.policy_categories())
+        return df
+
+    def episode_columns_to_df(self) -> pd.DataFrame:
+        lengths = [len(columns['latency']) for (_, _, columns) in self.episode_columns]
+        categories = self.policy_categories()
+
+        data = {frame_column: np.concatenate([columns[column] for (_, _, columns) in self.episode_columns])
+                for column, frame_column in MONITOR_COLUMNS.items()}
+        data['Epoch'] = np.repeat(np.array([epoch for (_, epoch, _) in self.episode_columns], dtype=np.int32), lengths)
+        data['Policy'] = pd.Categorical.from_codes(
+            np.repeat(np.array([categories.index(policy) for (policy, _, _) in self.episode_columns], dtype=np.int16),
+                      lengths),
+            categories=categories)
+
+        # Same column order as the exported data.csv
+        return pd.DataFrame(data)[['Time', 'Latency', 'Replica', 'Is_long_request', 'Is_faster_response',
+                                   'Is_duplicate', 'Task_time_sent', 'Epoch', 'Policy', 'Utilization',
+                                   'Long_tasks_fraction']]
+
+    def filter_df(self, policies: List[str] | None = None, is_long_request: bool | None = None) -> pd.DataFrame:
+        # Policies that are filtered out are dropped from the categories so that they do not show up in legends
+        mask = np.ones(len(self.df), dtype=bool)
+        if policies is not None:
+            mask &= self.df['Policy'].isin(policies).to_numpy()
+        if is_long_request is not None:
+            mask &= (self.df['Is_long_request'] == is_long_request).to_numpy()
+        df = self.df[mask]
+        with pd.option_context('mode.chained_assignment', None):
+            df['Policy'] = df['Policy'].cat.remove_unused_categories()
+        return df
+
     def from_csv(self) -> None:
-        self.df = pd.read_csv(self.data_folder / f'data.csv')
-        self.policy_order = [policy for policy in const.POLICY_ORDER if policy in self.df['Policy'].unique()]
+        df = pd.read_csv(self.data_folder / f'data.csv')
+        self.add_policies(list(df['Policy'].unique()))
+        self.df = self.with_policy_categories(df)
 
         # Get the value for utilization
         base_folder = self.data_folder.parent
         args_file = base_folder / 'workload_config.json'
+        if not os.path.exists(args_file):
+            # Training runs store one config per workload, the first one is used for the titles
+            args_file = base_folder / '0_workload_config.json'
         with open(args_file, 'r') as file:
             args_data = json.load(file)
 
@@ -45,40 +174,38 @@ class ExperimentPlot:
         self.long_tasks_fraction = args_data['long_tasks_fraction']
 
     def add_data_from_df(self, additional_data: pd.DataFrame) -> None:
-        self.df = pd.concat((self.df, additional_data), axis=0)
-        self.policy_order = [policy for policy in const.POLICY_ORDER if policy in self.df['Policy'].unique()]
-
-    def add_data(self, monitor: Monitor, policy: str, epoch_num: int):
-        data_point_time_tuples: List[Tuple[DataPoint, float]] = monitor.get_data()
-        df_entries = [{
-            "Time": time,
-            "Latency": data_point.latency,
-            "Replica": data_point.replica_id,
-            "Is_long_request": data_point.state.is_long_request,
-            "Is_faster_response": data_point.is_faster_response,
-            "Is_duplicate": data_point.is_duplicate,
-            "Task_time_sent": data_point.task_time_sent,
-            "Epoch": epoch_num,
-            "Policy": policy,
-            'Utilization': data_point.utilization,
-            'Long_tasks_fraction': data_point.long_tasks_fraction
-        } for (data_point, time) in data_point_time_tuples]
-
-        df = pd.DataFrame(df_entries)
-
-        if self.df is None:
-            self.df = df.reset_index(drop=True)
-            self.policy_order = [policy for policy in const.POLICY_ORDER if policy in self.df['Policy'].unique()]
+        self.add_policies(list(additional_data['Policy'].unique()))
+        df = self.df
+        if df is None:
+            self.df = self.with_policy_categories(additional_data)
         else:
-            df = df.reset_index(drop=True)  # Reset the index of the new dataframe before concatenation
-            self.df = pd.concat((self.df, df), axis=0).reset_index(drop=True)
-            self.policy_order = [policy for policy in const.POLICY_ORDER if policy in self.df['Policy'].unique()]
+            self.df = pd.concat((self.with_policy_categories(df), self.with_policy_categories(additional_data)), axis=0)
 
-    def get_autotuner_objective(self):
-        if len(self.df) == 0:
+    def add_data(self, monitor: Monitor, policy: str, epoch_num: int):
+        self.add_columns(monitor_columns(monitor), policy=policy, epoch_num=epoch_num)
+
+    def add_columns(self, columns: Dict[str, np.ndarray], policy: str, epoch_num: int):
+        # Columns as returned by monitor_columns, e.g. of a cached run
+        self.add_policies([policy])
+        self.episode_columns.append((policy, epoch_num, columns))
+
+    def get_autotuner_objective(self, epoch: int | None = None):
+        if epoch is not None:
+            # Episodes that were not turned into the frame yet are evaluated from their columns
+            latencies = [columns['latency'][columns['is_faster_response']]
+                         for (policy, episode, columns) in self.episode_columns if policy == 'DQN' and episode == epoch]
+            if len(latencies) > 0:
+                return - np.quantile(np.concatenate(latencies), 0.99)
+
+        df = self.df
+        if df is None or len(df) == 0:
             print('Empty DF, no result for autotuner')
             return 0
-        return - self.df[self.df['Policy'] == 'DQN']['Latency'].quantile(0.99)
+        # Same metric as the final statistics, which only use the response that arrived first
+        mask = (df['Policy'] == 'DQN') & df['Is_faster_response']
+        if epoch is not None:
+            mask &= df['Epoch'] == epoch
+        return - df[mask]['Latency'].quantile(0.99)
 
     def export_data(self) -> None:
         out_path = self.data_folder / 'data.csv'
@@ -89,27 +216,25 @@ class ExperimentPlot:
         plt.savefig(self.plot_folder / f'{file_name}.jpg')
         plt.close()
 
-    def write_df_stats(self, df, file) -> None:
+    def write_stats(self, request_class: str, file) -> None:
         file.write('Mean and median latency\n')
 
         # Mean latency
-        mean_latency = df.groupby(['Policy'])['Latency'].mean()
+        mean_latency = self.stats.mean(request_class=request_class).set_index('Policy')['Latency']
         file.write('Mean latency:\n')
         file.write(mean_latency.to_string() + '\n\n')
 
         # Median latency
-        median_latency = df.groupby(['Policy'])['Latency'].median()
+        median_latency = self.stats.quantile(0.5, request_class=request_class, by_epoch=False).set_index('Policy')['Latency']
         file.write('Median latency:\n')
         file.write(median_latency.to_string() + '\n\n')
 
         # Quantiles
         for quantile in [0.9, 0.95, 0.99, 0.999]:
             file.write(f'Quantile: {quantile}\n')
-            # Calculate the quantile latency for each policy and epoch
-            quantile_latency = df.groupby(['Policy', 'Epoch'])['Latency'].quantile(quantile).reset_index()
-
-            # Calculate the mean of the quantile latency over all epochs for each policy
-            mean_quantile_latency = quantile_latency.groupby('Policy')['Latency'].mean()
+            # Mean of the quantile latency over all epochs for each policy
+            mean_quantile_latency = self.stats.mean_epoch_quantile(
+                quantile, request_class=request_class).set_index('Policy')['Latency']
             file.write(mean_quantile_latency.to_string() + '\n\n')
 
     def save_stats_to_file(self) -> None:
@@ -117,13 +242,13 @@ class ExperimentPlot:
 
         with open(out_file, 'w') as file:
             file.write('Overall stats\n')
-            self.write_df_stats(df=self.df, file=file)
+            self.write_stats(request_class='all', file=file)
 
             file.write('Long requests stats\n')
-            self.write_df_stats(df=self.df[self.df['Is_long_request']], file=file)
+            self.write_stats(request_class='long', file=file)
 
             file.write('Short requests stats\n')
-            self.write_df_stats(df=self.df[self.df['Is_long_request'] == False], file=file)
+            self.write_stats(request_class='short', file=file)
 
     # TODO: Write decorator for before and after plotting settings
     def plot_latency(self):
@@ -164,8 +289,8 @@ class ExperimentPlot:
 
         fig, axes = plt.subplots(figsize=(8, 4), dpi=200, nrows=1, ncols=1, sharex='all')
 
-        sns.scatterplot(self.df[self.df['Epoch'] == epoch], x="Time", y="Latency",
-                        hue="Policy", ax=axes, palette=const.POLICY_COLORS)
+        sns.scatterplot(downsample_scatter(self.df[self.df['Epoch'] == epoch]), x="Time", y="Latency",
+                        hue="Policy", ax=axes, palette=const.POLICY_COLORS, rasterized=True)
 
         axes.get_legend().remove()
         fig.legend(loc='lower center', ncols=3)
@@ -177,8 +302,8 @@ class ExperimentPlot:
         plt.rcParams.update({'font.size': FONT_SIZE})
 
         fig, axes = plt.subplots(figsize=(8, 4), dpi=200, nrows=1, ncols=1, sharex='all')
-        sns.scatterplot(self.df[(self.df['Epoch'] == epoch) & (self.df['Policy'] == policy)], x="Time", y="Latency",
-                        hue="Replica", ax=axes)
+        sns.scatterplot(downsample_scatter(self.df[(self.df['Epoch'] == epoch) & (self.df['Policy'] == policy)]),
+                        x="Time", y="Latency", hue="Replica", ax=axes, rasterized=True)
         axes.get_legend().remove()
 
         fig.legend(loc='lower center', ncols=3)
@@ -188,7 +313,7 @@ class ExperimentPlot:
         plt.rcParams.update({'font.size': FONT_SIZE})
 
         fig, axes = plt.subplots(figsize=(16, 8), dpi=200, nrows=1, ncols=1, sharex='all')
-        quantiles = self.df.groupby(['Policy', 'Epoch'])['Latency'].quantile(quantile).reset_index()
+        quantiles = self.stats.quantile(quantile)
 
         sns.lineplot(data=quantiles, x="Epoch", y=f'Latency', hue="Policy", ax=axes, palette=const.POLICY_COLORS)
         plt.title(f'{quantile}th quantile')
@@ -203,30 +328,26 @@ class ExperimentPlot:
         self.export_plots(file_name=f'p_{int(quantile * 100)}')
 
     def plot_average_quantile_bar_short_long_requests(self, quantile: float, policies: List[str]) -> None:
-        df = self.df[self.df['Policy'].isin(policies) & self.df['Is_long_request']]
-        self.plot_average_quantile_bar_generic(
-            df, quantile=quantile, title_request_types='long requests', file_prefix=f'long_req_', order=policies)
+        self.plot_average_quantile_bar_generic(quantile=quantile, title_request_types='long requests', file_prefix=f'long_req_',
+                                               order=policies, request_class='long', policies=policies)
 
-        df = self.df[self.df['Policy'].isin(policies) & (self.df['Is_long_request'] == False)]
-        self.plot_average_quantile_bar_generic(
-            df, quantile=quantile, title_request_types='short requests', file_prefix=f'short_req_', order=policies)
+        self.plot_average_quantile_bar_generic(quantile=quantile, title_request_types='short requests', file_prefix=f'short_req_',
+                                               order=policies, request_class='short', policies=policies)
 
     def plot_average_quantile_bar(self, quantile: float) -> None:
-        self.plot_average_quantile_bar_generic(
-            self.df, quantile=quantile, title_request_types='all requests', file_prefix='all_')
+        self.plot_average_quantile_bar_generic(quantile=quantile, title_request_types='all requests', file_prefix='all_')
 
-    def plot_average_quantile_bar_generic(self, df: pd.DataFrame, quantile: float, title_request_types: str, file_prefix: str = '', order: List[str] | None = None) -> None:
+    def plot_average_quantile_bar_generic(self, quantile: float, title_request_types: str, file_prefix: str = '', order: List[str] | None = None,
+                                          request_class: str = 'all', policies: List[str] | None = None) -> None:
         if order is None:
             order = self.policy_order
 
         plt.rcParams.update({'font.size': FONT_SIZE})
         fig, axes = plt.subplots(figsize=(10, 6), dpi=200)
 
-        # Calculate the quantile latency for each policy and epoch
-        quantile_latency = df.groupby(['Policy', 'Epoch'])['Latency'].quantile(quantile).reset_index()
-
-        # Calculate the mean of the quantile latency over all epochs for each policy
-        mean_quantile_latency = quantile_latency.groupby('Policy')['Latency'].mean().reset_index()
+        # Mean of the quantile latency over all epochs for each policy
+        mean_quantile_latency = select_policies(self.stats.mean_epoch_quantile(quantile, request_class=request_class),
+                                                policies=policies)
 
         # Create bar plot
         sns.barplot(data=mean_quantile_latency, x='Policy', hue='Policy', y='Latency',
@@ -239,8 +360,12 @@ class ExperimentPlot:
 
         self.export_plots(file_name=f'{file_prefix}bar_p_{int(quantile * 1000)}')
 
-    def plot_cdf_quantile(self, df: pd.DataFrame, quantile: float, title_request_types: str, file_prefix: str = ''):
-        if len(df) == 0:
+    def plot_cdf_quantile(self, quantile: float, title_request_types: str, file_prefix: str = '', request_class: str = 'all',
+                          policies: List[str] | None = None):
+        # CDF of the latencies above the quantile of their policy and epoch
+        cdf_df = select_policies(self.stats.tail_cdf(quantile, request_class=request_class), policies=policies)
+
+        if len(cdf_df) == 0:
             print(f'Empty df, not continuing in plot_cdf_quantile()')
             return
 
@@ -248,24 +373,6 @@ class ExperimentPlot:
 
         fig, axes = plt.subplots(figsize=(16, 8), dpi=200, nrows=1, ncols=1, sharex='all')
 
-        # Filter the DataFrame to only include latencies within the specified quantile
-        # quantiles = df.groupby(['Policy', 'Epoch'])['Latency'].quantile(quantile).reset_index()
-        filtered_df = df[df.groupby(['Policy', 'Epoch'])[
-            'Latency'].transform(lambda x: x > x.quantile(quantile))]
-
-        if len(filtered_df) == 0:
-            print(f'Empty df, not continuing in plot_cdf_quantile()')
-            return
-
-        # Calculate the CDF for each policy
-        cdfs = []
-        for policy in filtered_df['Policy'].unique():
-            policy_data = filtered_df[filtered_df['Policy'] == policy].sort_values(by='Latency')
-            policy_data['CDF'] = policy_data['Latency'].rank(method='first') / len(policy_data)
-            cdfs.append(policy_data)
-
-        cdf_df = pd.concat(cdfs)
-
         # Plot the CDFs
         sns.lineplot(data=cdf_df, x='Latency', y='CDF', hue='Policy', ax=axes)
         plt.title(
@@ -282,29 +389,28 @@ class ExperimentPlot:
         self.export_plots(file_name=f'cdf/{file_prefix}p_{int(quantile * 100)}')
 
     def plot_average_latency_bar_short_long_request(self, policies: List[str]) -> None:
-        df = self.df[self.df['Policy'].isin(policies) & self.df['Is_long_request']]
-        self.plot_average_latency_bar_generic(df, title_request_types='long requests',
-                                              file_prefix=f'long_req_', order=policies)
+        self.plot_average_latency_bar_generic(title_request_types='long requests', file_prefix=f'long_req_',
+                                              order=policies, request_class='long', policies=policies)
 
-        df = self.df[self.df['Policy'].isin(policies) & (self.df['Is_long_request'] == False)]
-        self.plot_average_latency_bar_generic(df, title_request_types='short requests',
-                                              file_prefix=f'short_req_', order=policies)
+        self.plot_average_latency_bar_generic(title_request_types='short requests', file_prefix=f'short_req_',
+                                              order=policies, request_class='short', policies=policies)
 
     def plot_average_latency_bar(self):
-        self.plot_average_latency_bar_generic(df=self.df, title_request_types='all requests', file_prefix='all_')
+        self.plot_average_latency_bar_generic(title_request_types='all requests', file_prefix='all_')
 
-    def plot_average_latency_bar_generic(self, df: pd.DataFrame, title_request_types: str, file_prefix: str = '', order: List[str] | None = None) -> None:
+    def plot_average_latency_bar_generic(self, title_request_types: str, file_prefix: str = '', order: List[str] | None = None,
+                                         request_class: str = 'all', policies: List[str] | None = None) -> None:
         if order is None:
             order = self.policy_order
 
         plt.rcParams.update({'font.size': FONT_SIZE})
         fig, axes = plt.subplots(figsize=(10, 6), dpi=200)
 
-        # Calculate the mean of the quantile latency over all epochs for each policy
-        mean_quantile_latency = df.groupby('Policy')['Latency'].mean().reset_index()
+        # Mean latency over all epochs for each policy
+        mean_latency = select_policies(self.stats.mean(request_class=request_class), policies=policies)
 
         # Create bar plot
-        sns.barplot(data=mean_quantile_latency, x='Policy', hue='Policy', y='Latency',
+        sns.barplot(data=mean_latency, x='Policy', hue='Policy', y='Latency',
                     palette=const.POLICY_COLORS, ax=axes, order=order)
         axes.set_title(
             f'Average Latency {title_request_types} at {self.utilization * 100}% utilization with {self.long_tasks_fraction * 100}% long tasks')
@@ -315,11 +421,11 @@ class ExperimentPlot:
         self.export_plots(file_name=f'{file_prefix}bar_mean')
 
     def plot_latency_over_time_short_long_request(self, policies: List[str]) -> None:
-        df = self.df[self.df['Policy'].isin(policies) & self.df['Is_long_request']]
+        df = self.filter_df(policies=policies, is_long_request=True)
         self.plot_latency_over_time(df, title_request_types='long requests',
                                     file_prefix=f'long_req_', order=policies)
 
-        df = self.df[self.df['Policy'].isin(policies) & (self.df['Is_long_request'] == False)]
+        df = self.filter_df(policies=policies, is_long_request=False)
         self.plot_latency_over_time(df, title_request_types='short requests',
                                     file_prefix=f'short_req_', order=policies)
 
@@ -334,12 +440,12 @@ class ExperimentPlot:
             fig, axes = plt.subplots(figsize=(14, 8), dpi=200)
 
             epoch_df = epoch_df.sort_values(by=['Policy', 'Task_time_sent']).reset_index(drop=True)
-            epoch_df['Num_request'] = epoch_df.groupby('Policy').cumcount()
+            epoch_df['Num_request'] = epoch_df.groupby('Policy', observed=True).cumcount()
             epoch_df['Aggregated_num_requests'] = (epoch_df['Num_request'] // AGGREGATION_FACTOR) * AGGREGATION_FACTOR
             epoch_df['Aggregated_num_requests'] += AGGREGATION_FACTOR
 
             # Adjust the last group to reflect the actual number of requests
-            max_num_request = epoch_df.groupby('Policy')['Num_request'].transform('max')
+            max_num_request = epoch_df.groupby('Policy', observed=True)['Num_request'].transform('max')
             epoch_df.loc[epoch_df['Aggregated_num_requests'] == (AGGREGATION_FACTOR + (
                 max_num_request // AGGREGATION_FACTOR) * AGGREGATION_FACTOR), 'Aggregated_num_requests'] = max_num_request
 
@@ -347,7 +453,7 @@ class ExperimentPlot:
             epoch_df['Workload_key'] = list(zip(epoch_df['Utilization'], epoch_df['Long_tasks_fraction']))
 
             # Collect the workload changes
-            workload_change_df = epoch_df.groupby(['Policy', 'Workload_key']).agg(
+            workload_change_df = epoch_df.groupby(['Policy', 'Workload_key'], observed=True).agg(
                 Start_req=('Num_request', 'min'),
                 End_req=('Num_request', 'max')
             ).reset_index()
@@ -356,11 +462,15 @@ class ExperimentPlot:
                                     workload_change_df['Start_req'], workload_change_df['End_req']))
 
             # Aggregate latency over groups of data points per policy
-            aggregated = epoch_df.groupby(['Policy', 'Aggregated_num_requests']).agg(
+            grouped = epoch_df.groupby(['Policy', 'Aggregated_num_requests'], observed=True)
+            aggregated = grouped.agg(
                 Start_Time=('Task_time_sent', 'min'),
                 End_Time=('Task_time_sent', 'max'),
-                Latency=('Latency', lambda x: np.percentile(x, percentile)),
             ).reset_index()
+            # Percentile of every group from a single sort instead of one np.percentile call per group
+            aggregated['Latency'] = SortedGroups(group_ids=grouped.ngroup().to_numpy(),
+                                                 values=epoch_df['Latency'].to_numpy(dtype=np.float64),
+                                                 n_groups=grouped.ngroups).quantile(quantile)
 
             # Plot latency over time for each policy
             sns.lineplot(data=aggregated, x='Aggregated_num_requests', y='Latency',
@@ -414,45 +524,40 @@ class ExperimentPlot:
 
             self.export_plots(file_name=f'{epoch}_{file_prefix}latency_over_time')
 
-    def generate_plots(self) -> None:
-        # reduced_policies = ['ARS', 'DQN', 'DQN_DUPL'] + ['DQN_EXPLR_0',
-        #                                                 'DQN_EXPLR_10', 'DQN_EXPLR_15', 'DQN_EXPLR_20', 'DQN_EXPLR_25']
-        reduced_policies = [policy for policy in self.policy_order if policy not in ['random', 'DQN_DUPL']]
-        print(reduced_policies)
-
+    def keep_faster_responses(self) -> None:
+        # Only the response that arrived first is used for the plots and statistics
         print('Before')
         print(len(self.df))
         self.df = self.df[self.df['Is_faster_response']]
         print('After')
         print(len(self.df))
 
-        self.plot_latency()
-        self.boxplot_latency()
-        self.plot_average_latency_bar()
-        self.plot_average_latency_bar_short_long_request(policies=reduced_policies)
-
-        self.plot_quantile(0.90)
-        self.plot_quantile(0.95)
-        self.plot_quantile(0.99)
-        self.plot_average_quantile_bar(0.90)
-        self.plot_average_quantile_bar(0.95)
-        self.plot_average_quantile_bar(0.99)
-        self.plot_average_quantile_bar(0.999)
-        self.plot_average_quantile_bar_short_long_requests(quantile=0.9, policies=reduced_policies)
-        self.plot_average_quantile_bar_short_long_requests(quantile=0.95, policies=reduced_policies)
-        self.plot_average_quantile_bar_short_long_requests(quantile=0.99, policies=reduced_policies)
-        self.plot_average_quantile_bar_short_long_requests(quantile=0.999, policies=reduced_policies)
-
-        cdf_policies = ['ARS', 'DQN', 'DQN_EXPLR_10_TRAIN']
-        df = self.df[self.df['Policy'].isin(cdf_policies)]
-        self.plot_cdf_quantile(df=df, quantile=0.99, title_request_types='all requests', file_prefix=f'all_req_')
+    def plot_jobs(self, epoch_to_plot: int | None = None, policies_to_plot: List[str] | None = None) -> List[PlotJob]:
+        # reduced_policies = ['ARS', 'DQN', 'DQN_DUPL'] + ['DQN_EXPLR_0',
+        #                                                 'DQN_EXPLR_10', 'DQN_EXPLR_15', 'DQN_EXPLR_20', 'DQN_EXPLR_25']
+        reduced_policies = [policy for policy in self.policy_order if policy not in ['random', 'DQN_DUPL']]
+        print(reduced_policies)
 
-        df = self.df[self.df['Policy'].isin(cdf_policies) & self.df['Is_long_request']]
-        self.plot_cdf_quantile(df=df, quantile=0.99, title_request_types='long requests', file_prefix=f'long_req_')
+        jobs = [
+            PlotJob('plot_latency', {}),
+            PlotJob('boxplot_latency', {}),
+            PlotJob('plot_average_latency_bar', {}),
+            PlotJob('plot_average_latency_bar_short_long_request', {'policies': reduced_policies}),
+        ]
+        jobs += [PlotJob('plot_quantile', {'quantile': quantile}) for quantile in [0.90, 0.95, 0.99]]
+        jobs += [PlotJob('plot_average_quantile_bar', {'quantile': quantile}) for quantile in [0.90, 0.95, 0.99, 0.999]]
+        jobs += [PlotJob('plot_average_quantile_bar_short_long_requests', {'quantile': quantile, 'policies': reduced_policies})
+                 for quantile in [0.9, 0.95, 0.99, 0.999]]
 
-        df = self.df[self.df['Policy'].isin(cdf_policies) & (self.df['Is_long_request'] == False)]
-        self.plot_cdf_quantile(df=df, quantile=0.99, title_request_types='short requests',
-                               file_prefix=f'short_req_')
+        cdf_policies = ['ARS', 'DQN', 'DQN_EXPLR_10_TRAIN']
+        jobs += [
+            PlotJob('plot_cdf_quantile', {'quantile': 0.99, 'title_request_types': 'all requests', 'file_prefix': f'all_req_',
+                                          'policies': cdf_policies}),
+            PlotJob('plot_cdf_quantile', {'quantile': 0.99, 'title_request_types': 'long requests', 'file_prefix': f'long_req_',
+                                          'request_class': 'long', 'policies': cdf_policies}),
+            PlotJob('plot_cdf_quantile', {'quantile': 0.99, 'title_request_types': 'short requests', 'file_prefix': f'short_req_',
+                                          'request_class': 'short', 'policies': cdf_policies}),
+        ]
 
         # cdf_policies = ['ARS', 'DQN', 'DQN_DUPL', 'DQN_EXPLR_10_TRAIN']
         # df = self.df[self.df['Policy'].isin(cdf_policies)]
@@ -467,13 +572,51 @@ class ExperimentPlot:
         #                        file_prefix=f'dupl_short_req_')
 
         cdf_policies = reduced_policies
-        df = self.df[self.df['Policy'].isin(cdf_policies)]
-        self.plot_cdf_quantile(df=df, quantile=0.99, title_request_types='all requests', file_prefix=f'explr_all_req_')
-
-        df = self.df[self.df['Policy'].isin(cdf_policies) & self.df['Is_long_request']]
-        self.plot_cdf_quantile(df=df, quantile=0.99, title_request_types='long requests',
-                               file_prefix=f'explr_long_req_')
-
-        df = self.df[self.df['Policy'].isin(cdf_policies) & (self.df['Is_long_request'] == False)]
-        self.plot_cdf_quantile(df=df, quantile=0.99, title_request_types='short requests',
-                               file_prefix=f'explr_short_req_')
+        jobs += [
+            PlotJob('plot_cdf_quantile', {'quantile': 0.99, 'title_request_types': 'all requests', 'file_prefix': f'explr_all_req_',
+                                          'policies': cdf_policies}),
+            PlotJob('plot_cdf_quantile', {'quantile': 0.99, 'title_request_types': 'long requests', 'file_prefix': f'explr_long_req_',
+                                          'request_class': 'long', 'policies': cdf_policies}),
+            PlotJob('plot_cdf_quantile', {'quantile': 0.99, 'title_request_types': 'short requests', 'file_prefix': f'explr_short_req_',
+                                          'request_class': 'short', 'policies': cdf_policies}),
+        ]
+
+        if epoch_to_plot is not None:
+            jobs.append(PlotJob('plot_episode', {'epoch': epoch_to_plot}))
+            for policy in (policies_to_plot if policies_to_plot is not None else []):
+                jobs.append(PlotJob('plot_policy_episode', {'epoch': epoch_to_plot, 'policy': policy}))
+        return jobs
+
+    def generate_plots(self, epoch_to_plot: int | None = None, policies_to_plot: List[str] | None = None,
+                       n_workers: int = 1) -> None:
+        self.keep_faster_responses()
+        render_plot_jobs(plotter=self, jobs=self.plot_jobs(epoch_to_plot=epoch_to_plot, policies_to_plot=policies_to_plot),
+                         n_workers=n_workers)
+
+
+# Plotter shared with the rendering processes, they are forked and inherit it without pickling the frame
+_render_plotter: ExperimentPlot | None = None
+
+
+def render_plot_job(job: PlotJob) -> None:
+    getattr(_render_plotter, job.method)(**job.kwargs)
+
+
+def render_plot_jobs(plotter: ExperimentPlot, jobs: List[PlotJob], n_workers: int = 1) -> None:
+    global _render_plotter
+
+    # Statistics are computed once before forking so that the workers share them
+    plotter.stats.prepare()
+
+    if n_workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        for job in jobs:
+            getattr(plotter, job.method)(**job.kwargs)
+        return
+
+    _render_plotter = plotter
+    try:
+        with multiprocessing.get_context('fork').Pool(processes=min(n_workers, len(jobs))) as pool:
+            for _ in pool.imap_unordered(render_plot_job, jobs):
+                pass
+    finally:
+        _render_plotter = None
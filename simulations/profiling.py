@@ -0,0 +1,215 @@
+import csv
+import functools
+import importlib
+import inspect
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+# Opt-in instrumentation of the hot paths of the simulator (--profile, --profile_trace). Timers are installed by
+# replacing the methods below with timed wrappers while a profiler is active, nothing is wrapped otherwise.
+#
+# An episode lasts from the start of one simulation to the start of the next one, so it also contains the
+# plotting and training work that follows its simulation.
+
+# (module, class, method) of the instrumented call sites, modules are given without the simulations package
+INSTRUMENTED_METHODS = [
+    ('client', 'Client', 'schedule'),
+    ('client', 'Client', 'sort_replicas'),
+    ('client', 'ResponseHandler', 'run'),
+    ('server', 'Server', 'get_service_time'),
+    ('state', 'StateParser', 'state_to_tensor'),
+    ('training.model_trainer', 'Trainer', 'select_action'),
+    ('training.model_trainer', 'Trainer', 'optimize_model'),
+    ('monitor', 'DataPointMonitor', 'observe'),
+    ('plotting', 'ExperimentPlot', 'add_columns'),
+    # Self time of a step is the simpy scheduling overhead plus all code that is not instrumented
+    ('simulator', 'Simulation', 'step'),
+]
+
+DEFAULT_MAX_TRACE_EVENTS = 2_000_000
+
+_active_profiler: 'Profiler | None' = None
+
+
+def loaded_modules(module: str) -> List[Any]:
+    # The simulator mixes top level (import client) and package (import simulations.client) imports, these are
+    # different module objects with different classes. Both get instrumented if they are in use.
+    modules = [sys.modules[name] for name in [module, f'simulations.{module}'] if name in sys.modules]
+    if len(modules) == 0:
+        modules = [importlib.import_module(f'simulations.{module}')]
+    return modules
+
+
+class Profiler:
+    """
+    Call counts, total and self time of the instrumented methods per episode, optionally recorded as Chrome
+    trace events (chrome://tracing, https://ui.perfetto.dev, https://www.speedscope.app).
+    """
+
+    def __init__(self, trace_file: Path | None = None, max_trace_events: int = DEFAULT_MAX_TRACE_EVENTS) -> None:
+        self.trace_file = trace_file
+        self.csv_file: Path | None = None
+        self.max_trace_events = max_trace_events
+        self.start_time = time.perf_counter()
+        self.trace_events: List[Dict[str, Any]] = []
+        # name -> [calls, total seconds, self seconds]
+        self.stats: Dict[str, List[float]] = {}
+        self.episodes: List[Tuple[str, float, Dict[str, List[float]]]] = []
+        self.episode_label: str | None = None
+        self.episode_start = self.start_time
+        # Time spent in instrumented children of every running instrumented call
+        self._child_times: List[float] = []
+        self._patched: List[Tuple[type, str, Any]] = []
+
+    def _finish(self, name: str, start: float, end: float) -> None:
+        duration = end - start
+        child_time = self._child_times.pop()
+        if len(self._child_times) > 0:
+            self._child_times[-1] += duration
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += duration
+        stats[2] += duration - child_time
+        if self.trace_file is not None and len(self.trace_events) < self.max_trace_events:
+            self.trace_events.append({'name': name, 'ph': 'X', 'ts': (start - self.start_time) * 1e6,
+                                      'dur': duration * 1e6, 'pid': 0, 'tid': 0})
+
+    def timed(self, name: str, func: Callable) -> Callable:
+        if inspect.isgeneratorfunction(func):
+            return self.timed_generator(name, func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self._child_times.append(0.0)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._finish(name, start, time.perf_counter())
+        return wrapper
+
+    def timed_generator(self, name: str, func: Callable) -> Callable:
+        # Simpy processes: every resume of the generator is timed on its own
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            generator = func(*args, **kwargs)
+            resume, value = generator.send, None
+            while True:
+                self._child_times.append(0.0)
+                start = time.perf_counter()
+                try:
+                    event = resume(value)
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    self._finish(name, start, time.perf_counter())
+                try:
+                    value = yield event
+                    resume = generator.send
+                except BaseException as exception:
+                    # E.g. interrupts that simpy throws into the process
+                    value = exception
+                    resume = generator.throw
+        return wrapper
+
+    def instrument(self) -> None:
+        for module_name, class_name, method_name in INSTRUMENTED_METHODS:
+            for module in loaded_modules(module_name):
+                cls = getattr(module, class_name)
+                # Inherited methods (Simulation.step) are removed again instead of being set on the subclass
+                self._patched.append((cls, method_name, cls.__dict__.get(method_name)))
+                setattr(cls, method_name, self.timed(f'{class_name}.{method_name}', getattr(cls, method_name)))
+
+    def uninstrument(self) -> None:
+        for cls, method_name, original in reversed(self._patched):
+            if original is None:
+                delattr(cls, method_name)
+            else:
+                setattr(cls, method_name, original)
+        self._patched = []
+
+    def next_episode(self, label: str) -> None:
+        now = time.perf_counter()
+        if self.episode_label is not None:
+            self.episodes.append((self.episode_label, now - self.episode_start, self.stats))
+            print(format_table(self.episode_label, now - self.episode_start, self.stats))
+            if self.trace_file is not None and len(self.trace_events) < self.max_trace_events:
+                self.trace_events.append({'name': self.episode_label, 'ph': 'X', 'pid': 0, 'tid': 1,
+                                          'ts': (self.episode_start - self.start_time) * 1e6,
+                                          'dur': (now - self.episode_start) * 1e6})
+        self.stats = {}
+        self.episode_label = label
+        self.episode_start = now
+
+    def total_stats(self) -> Dict[str, List[float]]:
+        totals = {}
+        for _, _, stats in self.episodes:
+            for name, values in stats.items():
+                totals[name] = [a + b for a, b in zip(totals.get(name, [0, 0.0, 0.0]), values)]
+        return totals
+
+    def write_csv(self, csv_file: Path) -> None:
+        with open(csv_file, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['episode', 'label', 'episode_seconds', 'name', 'calls', 'total_seconds', 'self_seconds'])
+            for i, (label, episode_time, stats) in enumerate(self.episodes):
+                for name, (calls, total, self_time) in stats.items():
+                    writer.writerow([i, label, episode_time, name, calls, total, self_time])
+
+    def write_trace(self) -> None:
+        if len(self.trace_events) >= self.max_trace_events:
+            print(f'Profile trace was cut off after {self.max_trace_events} events')
+        with open(self.trace_file, 'w') as file:
+            json.dump({'traceEvents': self.trace_events, 'displayTimeUnit': 'ms'}, file)
+
+
+def format_table(label: str, episode_time: float, stats: Dict[str, List[float]]) -> str:
+    lines = [f'Profile of {label}: {episode_time:.3f}s',
+             f'  {"":32} {"calls":>10} {"total s":>10} {"self s":>10} {"self %":>7} {"us/call":>9}']
+    for name, (calls, total, self_time) in sorted(stats.items(), key=lambda item: -item[1][2]):
+        lines.append(f'  {name:32} {calls:10d} {total:10.3f} {self_time:10.3f} '
+                     f'{100 * self_time / max(episode_time, 1e-12):6.1f}% {1e6 * total / calls:9.1f}')
+    return '\n'.join(lines)
+
+
+def start(trace_file: Path | None = None) -> Profiler:
+    global _active_profiler
+    assert _active_profiler is None, 'A profiler is already running'
+    _active_profiler = Profiler(trace_file=trace_file)
+    _active_profiler.instrument()
+    return _active_profiler
+
+
+def stop() -> Profiler | None:
+    global _active_profiler
+    profiler = _active_profiler
+    if profiler is None:
+        return None
+    _active_profiler = None
+    profiler.uninstrument()
+    # Closes the last episode
+    profiler.next_episode(label='')
+    print(format_table('all episodes', sum(episode_time for _, episode_time, _ in profiler.episodes),
+                       profiler.total_stats()))
+    if profiler.csv_file is not None:
+        profiler.write_csv(profiler.csv_file)
+    if profiler.trace_file is not None:
+        profiler.write_trace()
+    return profiler
+
+
+def set_csv_file(csv_file: Path) -> None:
+    # Per episode breakdown written by stop
+    if _active_profiler is not None:
+        _active_profiler.csv_file = csv_file
+
+
+def next_episode(label: str) -> None:
+    # Called for every simulation, a no-op unless profiling
+    if _active_profiler is not None:
+        _active_profiler.next_episode(label)
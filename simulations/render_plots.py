@@ -0,0 +1,40 @@
+import argparse
+import os
+from pathlib import Path
+
+import matplotlib
+# No display needed when rendering to files
+matplotlib.use('Agg')
+
+from simulations.plotting import ExperimentPlot
+
+# Renders the plots of finished experiments from their exported data.csv, e.g. of runs started with --skip_plots.
+# Every given folder is an experiment folder containing the data and plot folders (like outputs/<exp>/<i>/<workload>)
+
+
+def render_experiment_plots(experiment_folder: Path, data_folder_name: str, plot_folder_name: str, n_workers: int) -> None:
+    data_folder = experiment_folder / data_folder_name
+    plot_folder = experiment_folder / plot_folder_name
+    os.makedirs(plot_folder / 'pdfs', exist_ok=True)
+
+    plotter = ExperimentPlot(plot_folder=plot_folder, data_folder=data_folder)
+    plotter.from_csv()
+
+    last_epoch = int(plotter.df['Epoch'].max())
+    plotter.generate_plots(epoch_to_plot=last_epoch, policies_to_plot=list(plotter.policies), n_workers=n_workers)
+    plotter.save_stats_to_file()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render plots of experiments from their exported data')
+    parser.add_argument('experiment_folders', nargs='+', type=Path, help='Experiment folders to render plots for')
+    parser.add_argument('--data_folder', nargs='?', type=str, default='data', help='Name of the data folder')
+    parser.add_argument('--plot_folder', nargs='?', type=str, default='plots', help='Name of the plot folder')
+    parser.add_argument('--workers', nargs='?', type=int, default=os.cpu_count(),
+                        help='Number of processes used to render the plots of one experiment')
+    args = parser.parse_args()
+
+    for experiment_folder in args.experiment_folders:
+        print(f'Rendering plots of {experiment_folder}')
+        render_experiment_plots(experiment_folder=experiment_folder, data_folder_name=args.data_folder,
+                                plot_folder_name=args.plot_folder, n_workers=args.workers)
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+
+from simulations.workload.trace_workload import TraceWorkload
+
+# Simulation results of policies that do not learn (ARS, random, round_robin, ...) only depend on the arguments,
+# the workload, the seed and the simulator code. They are stored on disk under a hash of all of them and reused
+# instead of simulating the same episode again.
+
+CACHE_FORMAT_VERSION = 1
+
+# Arguments that cannot change the result of a simulation with a fixed (non learning) policy
+IGNORED_ARGS = {
+    'exp_name', 'data_folder', 'plot_folder', 'output_folder', 'model_folder', 'result_cache_folder',
+    'selection_strategy', 'seed', 'epochs', 'test_epochs', 'dqn_explr', 'dqn_explr_lr', 'model_structure', 'gamma',
+    'lr', 'tau', 'eps_decay', 'batch_size', 'tau_decay', 'eps_start', 'eps_end', 'lr_scheduler_step_size',
+    'lr_scheduler_gamma', 'summary_stats_max_size', 'offline_train_batch_size', 'offline_train_data',
+    'offline_model', 'offline_train_epochs', 'offline_target_update_interval', 'replay_memory_size',
+    'replay_always_use_newest', 'train_data_chunk_size', 'append_train_data', 'skip_plots', 'plot_workers',
+    'checkpoint_interval', 'resume', 'profile', 'profile_trace', 'max_test_epochs', 'test_ci_width',
+    'test_ci_confidence',
+}
+
+SIMULATIONS_FOLDER = Path(__file__).resolve().parent
+# Source files that determine the simulated latencies
+SIMULATOR_SOURCES = ['simulator.py', 'server.py', 'client.py', 'task.py', 'monitor.py', 'state.py', 'constants.py',
+                     'experiment_runner.py', 'workload/*.py']
+
+_code_version: str | None = None
+
+
+def code_version() -> str:
+    # Hash of the simulator sources, results of older code versions are never reused
+    global _code_version
+    if _code_version is None:
+        sha = hashlib.sha256()
+        for pattern in SIMULATOR_SOURCES:
+            for path in sorted(SIMULATIONS_FOLDER.glob(pattern)):
+                sha.update(path.relative_to(SIMULATIONS_FOLDER).as_posix().encode())
+                sha.update(path.read_bytes())
+        _code_version = sha.hexdigest()
+    return _code_version
+
+
+def canonical_args(args) -> Dict[str, Any]:
+    return {key: value for key, value in sorted(vars(args).items()) if key not in IGNORED_ARGS}
+
+
+def arrival_trace_hash(trace) -> str:
+    sha = hashlib.sha256()
+    for array in [trace.inter_arrival_times, trace.is_long, trace.client_indices, trace.first_replica_indices,
+                  trace.service_time_scales]:
+        sha.update(np.ascontiguousarray(array).tobytes())
+    return sha.hexdigest()
+
+
+class ResultCache:
+    """
+    Content addressed store of the monitor columns of single simulation runs, one npz file per run.
+    """
+
+    def __init__(self, cache_folder: Path) -> None:
+        self.cache_folder = Path(cache_folder)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, args, workload, policy: str, seed: int, service_time_model: str, duplication_rate: float) -> str:
+        config = {
+            'format': CACHE_FORMAT_VERSION,
+            'code_version': code_version(),
+            'args': canonical_args(args),
+            'workload_class': type(workload).__name__,
+            'workload': json.loads(workload.to_json()),
+            'policy': policy,
+            'seed': seed,
+            'service_time_model': service_time_model,
+            'duplication_rate': duplication_rate,
+        }
+        if workload.fixed_arrival_trace is not None:
+            config['arrival_trace'] = arrival_trace_hash(workload.fixed_arrival_trace)
+        if isinstance(workload, TraceWorkload):
+            config['trace'] = workload.trace_hash()
+        if args.key_popularity_file != '':
+            config['key_popularity'] = hashlib.sha256(Path(args.key_popularity_file).read_bytes()).hexdigest()
+        return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()
+
+    def path(self, key: str) -> Path:
+        # Two level layout keeps folders small for large sweeps
+        return self.cache_folder / key[:2] / f'{key}.npz'
+
+    def get(self, key: str) -> Dict[str, np.ndarray] | None:
+        path = self.path(key)
+        if not path.exists():
+            self.misses += 1
+            return None
+        with np.load(path) as data:
+            columns = {column: data[column] for column in data.files}
+        self.hits += 1
+        return columns
+
+    def put(self, key: str, columns: Dict[str, np.ndarray]) -> None:
+        path = self.path(key)
+        os.makedirs(path.parent, exist_ok=True)
+        # Written to a temporary file first, parallel runs never see partial entries
+        tmp_path = path.parent / f'{key}.{os.getpid()}.tmp.npz'
+        np.savez(tmp_path, **columns)
+        os.replace(tmp_path, path)
@@ -0,0 +1,84 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+# Measures how long a fresh interpreter needs to import the simulator modules and which heavy dependencies they
+# pull in. Every measurement runs in a new process, like an experiment worker or an autotune trial would.
+
+SIMULATIONS_FOLDER = Path(__file__).resolve().parents[1]
+REPO_FOLDER = SIMULATIONS_FOLDER.parent
+
+CORE_MODULES = ['simulator', 'server', 'client', 'task', 'simulations.workload.workload', 'experiment_runner']
+HEAVY_MODULES = ['torch', 'pandas', 'scipy', 'sklearn', 'matplotlib', 'seaborn', 'yunomi']
+DEFAULT_MODULES = CORE_MODULES + ['simulations.training.model_trainer', 'simulations.plotting']
+
+
+def subprocess_env() -> Dict[str, str]:
+    # The simulator mixes top level (import client) and package (import simulations.client) imports
+    env = dict(os.environ)
+    paths = [str(REPO_FOLDER), str(SIMULATIONS_FOLDER)]
+    if env.get('PYTHONPATH'):
+        paths.append(env['PYTHONPATH'])
+    env['PYTHONPATH'] = os.pathsep.join(paths)
+    return env
+
+
+def loaded_heavy_modules(modules: List[str]) -> List[str]:
+    code = (f'import sys\nfor m in {modules!r}:\n    __import__(m)\n'
+            f'print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))')
+    output = subprocess.run([sys.executable, '-c', code], env=subprocess_env(), cwd=SIMULATIONS_FOLDER,
+                            check=True, capture_output=True, text=True).stdout.strip().splitlines()
+    return [m for m in output[-1].split(',') if m] if output else []
+
+
+def import_time(module: str) -> float:
+    # Wall time of the import measured inside the child, interpreter start up is excluded
+    code = f'import time\nstart = time.perf_counter()\nimport {module}\nprint(time.perf_counter() - start)'
+    output = subprocess.run([sys.executable, '-c', code], env=subprocess_env(), cwd=SIMULATIONS_FOLDER,
+                            check=True, capture_output=True, text=True).stdout.strip().splitlines()
+    return float(output[-1])
+
+
+def slowest_imports(module: str, top: int) -> List[str]:
+    # Cumulative times reported by python -X importtime, in microseconds
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], env=subprocess_env(),
+                            cwd=SIMULATIONS_FOLDER, check=True, capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len('import time:'):].split('|')]
+        rows.append((int(cumulative), name))
+    rows.sort(reverse=True)
+    return [f'{cumulative / 1e6:8.3f}s  {name}' for cumulative, name in rows[:top]]
+
+
+def main(modules: List[str], repeats: int, top: int) -> None:
+    print(f'{"module":45} {"median":>8} {"min":>8}  heavy dependencies loaded')
+    for module in modules:
+        times = [import_time(module) for _ in range(repeats)]
+        heavy = loaded_heavy_modules([module])
+        print(f'{module:45} {statistics.median(times):7.3f}s {min(times):7.3f}s  {", ".join(heavy) or "-"}')
+
+    heavy = loaded_heavy_modules(CORE_MODULES)
+    print(f'\nHeavy dependencies loaded by the simulation core: {", ".join(heavy) or "none"}')
+
+    if top > 0:
+        for module in modules:
+            print(f'\nSlowest imports of {module}:')
+            print('\n'.join(slowest_imports(module, top=top)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the import time of the simulator modules')
+    parser.add_argument('modules', nargs='*', type=str, default=DEFAULT_MODULES, help='Modules to import')
+    parser.add_argument('--repeats', nargs='?', type=int, default=5, help='Number of fresh imports per module')
+    parser.add_argument('--top', nargs='?', type=int, default=0,
+                        help='Show the slowest nested imports of every module (python -X importtime)')
+    args = parser.parse_args()
+
+    main(modules=args.modules, repeats=args.repeats, top=args.top)
@@ -3,7 +3,6 @@ import math
 import sys
 from monitor import Monitor
 from simulations import constants
-from scipy.stats import pareto
 
 
 class Server:
@@ -31,7 +30,10 @@ class Server:
         self.wait_monitor = Monitor(simulation)
         self.act_monitor = Monitor(simulation)
 
-    def get_server_nw_latency(self):
+    def get_server_nw_latency(self, network_draw: float | None = None):
+        if network_draw is not None:
+            # Common random numbers, standard normal draw of the task
+            return self.NW_LATENCY_BASE + self.NW_LATENCY_MU + self.NW_LATENCY_SIGMA * network_draw
         return self.NW_LATENCY_BASE + self.simulation.random.normalvariate(self.NW_LATENCY_MU, self.NW_LATENCY_SIGMA)
 
     def get_server_id(self):
@@ -43,20 +45,29 @@ class Server:
         self.simulation.process(executor.run())
         # self.simulation.activate(executor, executor.run(), self.simulation.now)
 
-    def get_service_time(self, is_long_task=False):
+    def get_service_time(self, is_long_task=False, service_draw: float | None = None, service_time_scale: float = 1.0):
+        # service_draw: standard exponential draw of the task with common random numbers
         base_service_time = self.mean_service_time
 
         # Add service time if long task
         if is_long_task:
             base_service_time += self.long_task_added_service_time
 
-        if self.service_time_model == "random.expovariate":
+        if self.service_time_model == "random.expovariate" and service_draw is not None:
+            service_time = service_draw * base_service_time
+        elif self.service_time_model == "random.expovariate":
             service_time = self.simulation.random.expovariate(1.0 / base_service_time)
         elif self.service_time_model == "constant":
             service_time = base_service_time
         elif self.service_time_model == "math.sin":
             service_time = base_service_time + base_service_time * math.sin(1 + self.simulation.now / 100)
+        elif self.service_time_model == "pareto" and service_draw is not None:
+            # Inverse transform of the pareto distribution, scale * exp(E / alpha) for a standard exponential E
+            scale = (base_service_time * (constants.ALPHA - 1)) / constants.ALPHA
+            service_time = min(scale * math.exp(service_draw / constants.ALPHA), 1000)
         elif self.service_time_model == "pareto":
+            # scipy is slow to import, only load it when the pareto model is used
+            from scipy.stats import pareto
             scale = (base_service_time * (constants.ALPHA - 1)) / constants.ALPHA
             service_time = min(pareto.rvs(constants.ALPHA, scale=scale), 1000)
         else:
@@ -67,7 +78,7 @@ class Server:
         #     service_time += self.long_task_added_service_time
 
         # If server is slowed, multiply service time with factor
-        service_time = service_time * self.SERVICE_TIME_FACTOR
+        service_time = service_time * self.SERVICE_TIME_FACTOR * service_time_scale
         return service_time
 
     def get_service_rate(self, long_task_fraction: float) -> float:
@@ -96,7 +107,9 @@ class Executor:
         request = self.server.queue_resource.request()
         yield request
         wait_time = self.simulation.now - start  # W_i
-        service_time = self.server.get_service_time(is_long_task=self.task.is_long_task())  # Mu_i
+        service_time = self.server.get_service_time(is_long_task=self.task.is_long_task(),
+                                                    service_draw=self.task.service_draw,
+                                                    service_time_scale=self.task.service_time_scale)  # Mu_i
 
         yield self.simulation.timeout(service_time)
         self.server.queue_resource.release(request)
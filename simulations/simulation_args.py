@@ -3,6 +3,8 @@ import json
 from pathlib import Path
 from typing import Any, List
 
+from simulations.workload.access_pattern import ACCESS_PATTERNS
+
 
 class SimulationArgs:
     def __init__(self, input_args=None) -> None:
@@ -38,18 +40,29 @@ class SimulationArgs:
         parser.add_argument('--backpressure', action='store_true',
                             default=False, help='Adds backpressure mode which waits once rate limits are reached')
         parser.add_argument('--access_pattern', nargs='?',
-                            type=str, default="uniform",
+                            type=str, default="uniform", choices=ACCESS_PATTERNS,
                             help='Key access pattern of requests, e.g., zipfian will cause '
-                                 'requests to desire a subset of replica sets')
+                                 'requests to desire a subset of replica sets, key_popularity replays the '
+                                 'popularity of the keys in --key_popularity_file')
+        parser.add_argument('--zipf_exponent', nargs='?', type=float, default=1.5,
+                            help='Exponent of the bounded zipfian access pattern')
+        parser.add_argument('--key_popularity_file', nargs='?', type=str, default='',
+                            help='Access count or weight of one key per line for the key_popularity access pattern')
 
         parser.add_argument('--exp_name', nargs='?', type=str, default="Name of a set of experiments")
 
         parser.add_argument('--seed', nargs='?',
                             type=int, default=25072014)
+        parser.add_argument('--warmup_requests', nargs='?', type=int, default=0,
+                            help='Requests at the start of a run that are simulated but not recorded')
+        parser.add_argument('--warmup_time', nargs='?', type=float, default=0.0,
+                            help='Requests sent before this time are simulated but not recorded')
+        parser.add_argument('--warmup_mser', action='store_true',
+                            help='Also end the warmup at the MSER-5 truncation point of the latencies')
         parser.add_argument('--simulation_duration', nargs='?',
-                            type=int, default=10000000, help='Time that experiment takes, '
-                                                           'note that if this is too low and numRequests is too high, '
-                                                           'it will error')
+                            type=int, default=10000000, help='Upper bound of the simulated time, runs end once all '
+                                                           'requests completed. Note that if this is too low and '
+                                                           'numRequests is too high, it will error')
 
         # Folders
         parser.add_argument('--data_folder', nargs='?', type=str, default="data")
@@ -84,7 +97,7 @@ class SimulationArgs:
         parser.add_argument('--print', action='store_true',
                             default=False, help='Prints latency at the end of the experiment')
         parser.add_argument('--poly_feat_degree', nargs='?',
-                            type=float, default=2, help='Degree of created polynomial and interaction features')
+                            type=int, default=2, help='Degree of created polynomial and interaction features')
         parser.add_argument('--server_concurrency', nargs='?',
                             type=int, default=2, help='Amount of resources per server.')
         parser.add_argument('--service_time', nargs='?',
@@ -133,6 +146,19 @@ class SimulationArgs:
         # RL Model evaluation
         parser.add_argument('--test_epochs', nargs='?',
                             type=int, default=3, help='Number of test epochs')
+        parser.add_argument('--max_test_epochs', nargs='?', type=int, default=0,
+                            help='Adaptive evaluation: run between test_epochs and max_test_epochs episodes per policy, '
+                                 'stopping once the confidence intervals of mean and p99 latency are narrow enough. '
+                                 '0 disables it')
+        parser.add_argument('--test_ci_width', nargs='?', type=float, default=0.05,
+                            help='Target width of the confidence intervals relative to the estimate for '
+                                 '--max_test_epochs')
+        parser.add_argument('--test_ci_confidence', nargs='?', type=float, default=0.95,
+                            help='Confidence level of the intervals for --max_test_epochs')
+        parser.add_argument('--fork_time', nargs='?', type=float, default=0.0,
+                            help='Evaluate the fixed policies (all but ds, DQN and OFFLINE) of a test episode from one '
+                                 'shared prefix simulated up to this time, only requests sent after it are recorded. '
+                                 '0 disables it')
         parser.add_argument('--dqn_explr', nargs='?',
                             type=float, default=0.1, help='Exploration used by DQN_EXPLR')
         parser.add_argument('--dqn_explr_lr', nargs='?',
@@ -171,6 +197,11 @@ class SimulationArgs:
                             help='Location of the train data for offline training.')
         parser.add_argument('--offline_model', nargs='?', type=str, default="",
                             help='Location of the offline model.')
+        parser.add_argument('--offline_train_epochs', nargs='?',
+                            type=int, default=1, help='Number of passes over the offline training data')
+        parser.add_argument('--offline_target_update_interval', nargs='?',
+                            type=int, default=0, help='Optimization steps between target network syncs in offline '
+                                                         'training (0 soft updates the target network every step)')
 
         # ReplayMemory parametes
         parser.add_argument('--replay_memory_size', nargs='?',
@@ -179,6 +210,36 @@ class SimulationArgs:
                             default=False, help='if true, always add newest transition to sample (see https://arxiv.org/pdf/1712.01275)')
         parser.add_argument('--collect_train_data', action='store_true',
                             default=False, help='If true, log and save all data collected for offline training later')
+        parser.add_argument('--train_data_chunk_size', nargs='?',
+                            type=int, default=10000, help='Number of collected transitions written to disk per chunk')
+        parser.add_argument('--append_train_data', action='store_true',
+                            default=False, help='If true, append collected training data to the chunks already in the data folder instead of replacing them')
+
+        parser.add_argument('--common_random_numbers', action='store_true', default=False,
+                            help='If true, service times, network delays, duplication decisions and server changes '
+                                 'come from separate random streams, so all policies see the same random input')
+
+        parser.add_argument('--result_cache_folder', nargs='?', type=str, default="",
+                            help='Folder of the result cache, test runs of non learning policies (ARS, random, ...) are '
+                                 'reused from it instead of simulated again. Disabled if empty')
+
+        parser.add_argument('--checkpoint_interval', nargs='?', type=int, default=0,
+                            help='Number of training episodes between checkpoints of the training state. Disabled if 0')
+        parser.add_argument('--resume', nargs='?', type=str, default="",
+                            help='Experiment folder (e.g. ../outputs/exp/0) of an interrupted training run, training '
+                                 'continues from its last checkpoint in the same folder')
+
+        parser.add_argument('--profile', action='store_true', default=False,
+                            help='If true, time the hot paths of the simulator and print a breakdown per episode '
+                                 '(also saved as profile.csv in the experiment folder)')
+        parser.add_argument('--profile_trace', nargs='?', type=str, default="",
+                            help='File the profiled calls are written to as Chrome trace (chrome://tracing, '
+                                 'speedscope), implies --profile')
+
+        parser.add_argument('--skip_plots', action='store_true',
+                            default=False, help='If true, only export data and statistics, plots can be rendered later with render_plots.py')
+        parser.add_argument('--plot_workers', nargs='?',
+                            type=int, default=1, help='Number of processes used to render plots')
 
         parser.add_argument('--duplication_rate', nargs='?',
                             type=float, default=0.1, help='Number of requests to duplicate')
@@ -189,11 +250,17 @@ class SimulationArgs:
         print('After')
         print(self.args)
 
-        assert self.args.replication_factor == self.args.num_servers, ('Replication factor is not equal to number of'
-                                                                       ' servers, i.e., #actions != #servers')
+        self.check_replication_factor()
+
+    def check_replication_factor(self):
+        # DQN actions are server ids, only the other policies can pick from replica groups smaller than the cluster
+        if self.args.selection_strategy.startswith(('DQN', 'OFFLINE')):
+            assert self.args.replication_factor == self.args.num_servers, ('Replication factor is not equal to number '
+                                                                           'of servers, i.e., #actions != #servers')
 
     def set_policy(self, policy):
         self.args.selection_strategy = policy
+        self.check_replication_factor()
 
     def set_print(self, to_print):
         self.args.print = to_print
@@ -2,6 +2,12 @@ import random
 import simpy
 import numpy as np
 
+# Entropy of the common random numbers streams, mixed with the seed
+TASK_STREAM = 1
+DUPLICATE_TASK_STREAM = 2
+DUPLICATION_STREAM = 3
+SERVER_STREAM = 4
+
 
 class Simulation(simpy.Environment):
     def __init__(self):
@@ -10,9 +16,47 @@ class Simulation(simpy.Environment):
         self.random_strategy = random.Random()
         self.random_exploration = random.Random()
         self.np_random = np.random.default_rng()
+        self.common_random_numbers = False
+        self.random_duplication = self.random
+        self.random_server = self.random
+        # Requests sent to a server whose response was not handled yet (see Client.send_request)
+        self.outstanding_requests = 0
+        self.all_responses_handled = None
 
-    def set_seed(self, seed):
+    def set_seed(self, seed, common_random_numbers: bool = False):
         self.random = random.Random(seed)
         self.np_random = np.random.default_rng(seed)
         self.random_strategy = random.Random(seed)
         self.random_exploration = random.Random(seed)
+
+        # With common random numbers every component draws from its own stream, so all policies see the same
+        # service and network times for the same task (drawn when the task is created, see Task) and the same
+        # duplication decisions and server changes, whatever the policy does with the shared stream
+        self.common_random_numbers = common_random_numbers
+        if common_random_numbers:
+            self.task_random = np.random.default_rng([seed, TASK_STREAM])
+            self.duplicate_task_random = np.random.default_rng([seed, DUPLICATE_TASK_STREAM])
+            self.random_duplication = random.Random(f'{seed}_{DUPLICATION_STREAM}')
+            self.random_server = random.Random(f'{seed}_{SERVER_STREAM}')
+        else:
+            self.random_duplication = self.random
+            self.random_server = self.random
+
+    def request_sent(self) -> None:
+        self.outstanding_requests += 1
+
+    def response_handled(self) -> None:
+        self.outstanding_requests -= 1
+        if self.outstanding_requests == 0 and self.all_responses_handled is not None:
+            self.all_responses_handled.succeed()
+            self.all_responses_handled = None
+
+    def drained(self, workload_process: simpy.Process) -> simpy.Process:
+        # Triggers once the workload sent all its requests and all of them (and their duplicates) completed
+        return self.process(self.wait_until_drained(workload_process))
+
+    def wait_until_drained(self, workload_process: simpy.Process):
+        yield workload_process
+        if self.outstanding_requests > 0:
+            self.all_responses_handled = self.event()
+            yield self.all_responses_handled
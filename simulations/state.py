@@ -1,8 +1,9 @@
 from dataclasses import dataclass
-from typing import List
-import torch
+from typing import TYPE_CHECKING, List
 import copy
-from sklearn.preprocessing import PolynomialFeatures
+
+if TYPE_CHECKING:
+    import torch
 
 
 @dataclass
@@ -74,7 +75,9 @@ class StateParser:
         state_length = dummy_state_tensor.size(dim=1)
         return state_length  # 1540
 
-    def node_state_to_tensor(self, node_state: NodeState) -> torch.Tensor:
+    def node_state_to_tensor(self, node_state: NodeState) -> 'torch.Tensor':
+        # torch and sklearn are imported on first use, the simulator itself does not need them
+        import torch
         state_features = [node_state.queue_size, node_state.service_time,
                           node_state.response_time, node_state.outstanding_requests, node_state.outstanding_long_requests, node_state.outstanding_short_requests]  # node_state.ars_score, node_state.wait_time,
         # state_features = [node_state.ars_score]
@@ -82,7 +85,10 @@ class StateParser:
 
         return torch.tensor([state_features], dtype=torch.float32)
 
-    def state_to_tensor(self, state: State) -> torch.Tensor:
+    def state_to_tensor(self, state: State) -> 'torch.Tensor':
+        import torch
+        from sklearn.preprocessing import PolynomialFeatures
+
         node_state_tensor = torch.cat(
             [self.node_state_to_tensor(node_state) for node_state in state.node_states], 1)
 
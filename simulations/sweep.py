@@ -0,0 +1,274 @@
+import argparse
+import concurrent.futures
+import itertools
+import json
+import multiprocessing
+import os
+import traceback
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import yaml
+
+# Runs the experiments of a sweep spec (YAML or JSON, see configs/sweeps). A spec has fixed args and optional train
+# and test sections, each with workloads, policies and a parameter grid:
+# - every point of the train grid is one train node that trains the models
+# - every point of the test grid is one test node per train node, it evaluates the model of its train node
+#   (without a train section the test nodes use the model_folder / offline_model given in the args)
+# Nodes whose dependencies are done run in parallel worker processes. Finished nodes are recorded in
+# sweep_state.json, running the same spec again only runs the nodes that did not finish.
+
+CONFIG_FOLDER = Path(__file__).resolve().parent.parent / 'configs'
+SWEEP_STATE_FILE_NAME = 'sweep_state.json'
+
+# Workload kind in the spec -> WorkloadBuilder method
+WORKLOAD_KINDS = {
+    'train_base': 'create_train_base_workloads',
+    'test_base': 'create_test_base_workloads',
+    'train_var_long_tasks': 'create_train_var_long_tasks_workloads',
+    'test_var_long_tasks': 'create_test_var_long_tasks_workloads',
+    'train_trace': 'create_train_trace_workloads',
+    'test_trace': 'create_test_trace_workloads',
+}
+
+
+@dataclass
+class SweepNode:
+    node_id: str
+    # train | test
+    kind: str
+    setting: str
+    args: Dict[str, Any]
+    policies: List[str]
+    workloads: Dict[str, Any]
+    out_path: str
+    dependencies: List[str] = field(default_factory=list)
+
+
+def load_sweep_spec(spec_file: Path) -> Dict[str, Any]:
+    # JSON is valid YAML
+    with open(spec_file, 'r') as file:
+        return yaml.safe_load(file)
+
+
+def expand_grid(grid: Dict[str, List[Any]] | None) -> List[Dict[str, Any]]:
+    # Cartesian product in the order of the spec, the last parameter changes fastest
+    if not grid:
+        return [{}]
+    keys = list(grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*[grid[key] for key in keys])]
+
+
+def sweep_folder(spec: Dict[str, Any]) -> Path:
+    return Path('..', spec.get('args', {}).get('output_folder', 'outputs'), spec['name'])
+
+
+def build_sweep_nodes(spec: Dict[str, Any]) -> List[SweepNode]:
+    # Nodes are returned in an order in which every node comes after its dependencies
+    setting = spec.get('setting', 'base')
+    base_args = spec.get('args', {})
+    train = spec.get('train')
+    test = spec.get('test')
+    assert train is not None or test is not None, 'Sweep spec needs a train or a test section'
+    folder = sweep_folder(spec)
+
+    nodes = []
+    train_points = expand_grid(train.get('grid')) if train is not None else [{}]
+    for i, train_point in enumerate(train_points):
+        dependencies = []
+        test_args = base_args | train_point
+        if train is not None:
+            train_node = SweepNode(node_id=f'train_{i}', kind='train', setting=setting, args=base_args | train_point,
+                                   policies=train['policies'], workloads=train['workloads'],
+                                   out_path=str(folder / f'train_{i}'))
+            nodes.append(train_node)
+            dependencies = [train_node.node_id]
+            # Test runs load the model the train node saved
+            test_args = test_args | {'model_folder': str(Path(train_node.out_path, 'train',
+                                                              test_args.get('data_folder', 'data')))}
+        if test is None:
+            continue
+
+        for j, test_point in enumerate(expand_grid(test.get('grid'))):
+            node_id = f'test_{i}_{j}' if train is not None else f'test_{j}'
+            nodes.append(SweepNode(node_id=node_id, kind='test', setting=setting, args=test_args | test_point,
+                                   policies=test['policies'], workloads=test['workloads'],
+                                   out_path=str(folder / node_id), dependencies=dependencies))
+    return nodes
+
+
+def args_to_input_args(args: Dict[str, Any]) -> List[str]:
+    # Spec values -> command line arguments of SimulationArgs
+    input_args = []
+    for key, value in args.items():
+        if isinstance(value, bool):
+            # store_true flags
+            if value:
+                input_args.append(f'--{key}')
+        elif isinstance(value, list):
+            input_args += [f'--{key}'] + [str(item) for item in value]
+        else:
+            input_args += [f'--{key}', str(value)]
+    return input_args
+
+
+def check_flag_values(args: Dict[str, Any], simulation_args) -> None:
+    # A false spec value leaves out a store_true flag, that only gives false if the flag is not set by default
+    for key, value in args.items():
+        if value is False and getattr(simulation_args, key) is not False:
+            raise Exception(f'Spec sets {key} to false but it defaults to {getattr(simulation_args, key)}')
+
+
+def create_workloads(workloads: Dict[str, Any]) -> List:
+    from simulations.workload.workload_builder import WorkloadBuilder
+
+    workloads = dict(workloads)
+    kind = workloads.pop('kind')
+    if kind not in WORKLOAD_KINDS:
+        raise Exception(f'Unknown workload kind {kind}')
+    workload_builder = WorkloadBuilder(config_folder=CONFIG_FOLDER)
+    return getattr(workload_builder, WORKLOAD_KINDS[kind])(**workloads)
+
+
+def run_sweep_node(node: SweepNode, n_threads: int | None = None) -> float:
+    # Heavy imports happen here, in the worker process
+    import experiment
+    import constants as const
+
+    if n_threads is not None:
+        import torch
+        torch.set_num_threads(n_threads)
+
+    simulation_args = experiment.create_simulation_args(input_args=args_to_input_args(node.args), setting=node.setting)
+    check_flag_values(node.args, simulation_args.args)
+    workloads = create_workloads(node.workloads)
+    if node.kind == 'train':
+        const.TRAIN_POLICIES_TO_RUN = node.policies
+        return experiment.rl_experiment_wrapper(simulation_args, train_workloads=workloads, test_workloads=[],
+                                                run_tests=False, out_path=Path(node.out_path))
+    elif node.kind == 'test':
+        const.EVAL_POLICIES_TO_RUN = node.policies
+        return experiment.rl_experiment_wrapper(simulation_args, train_workloads=[], test_workloads=workloads,
+                                                out_path=Path(node.out_path))
+    raise Exception(f'Unknown sweep node kind {node.kind}')
+
+
+class SweepState:
+    """
+    Completion of the nodes of a sweep, saved after every finished node. A node only counts as done if it ran with
+    the same configuration as in the current spec.
+    """
+
+    def __init__(self, state_file: Path) -> None:
+        self.state_file = state_file
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(state_file):
+            with open(state_file, 'r') as file:
+                self.nodes = json.load(file)['nodes']
+
+    def is_done(self, node: SweepNode) -> bool:
+        entry = self.nodes.get(node.node_id)
+        return entry is not None and entry['status'] == 'done' and entry['node'] == asdict(node)
+
+    def mark(self, node: SweepNode, status: str, result: Any = None, error: str | None = None) -> None:
+        self.nodes[node.node_id] = {'status': status, 'node': asdict(node), 'result': result, 'error': error}
+        self.save()
+
+    def save(self) -> None:
+        os.makedirs(self.state_file.parent, exist_ok=True)
+        tmp_file = self.state_file.parent / f'{self.state_file.name}.tmp'
+        with open(tmp_file, 'w') as file:
+            json.dump({'nodes': self.nodes}, file, indent=4, default=str)
+        os.replace(tmp_file, self.state_file)
+
+
+def run_sweep(spec: Dict[str, Any], workers: int = 1,
+              run_node: Callable[[SweepNode, int | None], Any] = run_sweep_node) -> SweepState:
+    nodes = build_sweep_nodes(spec)
+    state = SweepState(sweep_folder(spec) / SWEEP_STATE_FILE_NAME)
+
+    done = set()
+    for node in nodes:
+        # Nodes after a dependency that runs again have to run again as well
+        if state.is_done(node) and all(dependency in done for dependency in node.dependencies):
+            done.add(node.node_id)
+    # Failed nodes and nodes whose dependencies failed
+    blocked = set()
+    remaining = [node for node in nodes if node.node_id not in done]
+    print(f'Sweep {spec["name"]}: {len(done)} of {len(nodes)} nodes already done')
+
+    def finish(node: SweepNode, result: Any = None, error: str | None = None) -> None:
+        if error is None:
+            done.add(node.node_id)
+            state.mark(node, status='done', result=result)
+            print(f'Finished {node.node_id}: {result}')
+        else:
+            blocked.add(node.node_id)
+            state.mark(node, status='failed', error=error)
+            print(f'Failed {node.node_id}:\n{error}')
+
+    def next_ready() -> List[SweepNode]:
+        ready = []
+        for node in list(remaining):
+            if any(dependency in blocked for dependency in node.dependencies):
+                print(f'Skipping {node.node_id}, a dependency failed')
+                blocked.add(node.node_id)
+                remaining.remove(node)
+            elif all(dependency in done for dependency in node.dependencies):
+                ready.append(node)
+                remaining.remove(node)
+        return ready
+
+    if workers <= 1:
+        ready = next_ready()
+        while len(ready) > 0:
+            for node in ready:
+                print(f'Running {node.node_id}')
+                try:
+                    finish(node, result=run_node(node, None))
+                except Exception:
+                    finish(node, error=traceback.format_exc())
+            ready = next_ready()
+        return state
+
+    n_threads = max(1, (os.cpu_count() or 1) // workers)
+    # Fresh process per node, nodes change module level constants and torch state
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                                max_tasks_per_child=1) as executor:
+        running = {}
+
+        def submit_ready() -> None:
+            for node in next_ready():
+                print(f'Running {node.node_id}')
+                running[executor.submit(run_node, node, n_threads)] = node
+
+        submit_ready()
+        while len(running) > 0:
+            finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                node = running.pop(future)
+                try:
+                    finish(node, result=future.result())
+                except Exception:
+                    finish(node, error=traceback.format_exc())
+            submit_ready()
+    return state
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a sweep of experiments from a YAML or JSON spec')
+    parser.add_argument('spec_file', type=Path, help='Sweep spec, e.g. ../configs/sweeps/offline_adaption.yaml')
+    parser.add_argument('--workers', nargs='?', type=int, default=1, help='Number of nodes run in parallel')
+    parser.add_argument('--dry_run', action='store_true', default=False,
+                        help='Only print the nodes of the sweep and their dependencies')
+    args = parser.parse_args()
+
+    spec = load_sweep_spec(args.spec_file)
+    if args.dry_run:
+        state = SweepState(sweep_folder(spec) / SWEEP_STATE_FILE_NAME)
+        for node in build_sweep_nodes(spec):
+            status = 'done' if state.is_done(node) else 'pending'
+            print(f'{node.node_id} ({status}) after {node.dependencies}: {" ".join(args_to_input_args(node.args))}')
+    else:
+        run_sweep(spec, workers=args.workers)
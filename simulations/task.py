@@ -6,7 +6,7 @@ class Task:
     """A simple Task. Applications may subclass this
        for holding specific attributes if need be"""
 
-    def __init__(self, id_: str, simulation, utilization: float, long_tasks_fraction: float, is_long_task: bool = False, start: int | None = None, is_duplicate=False, original_id: str | None = None) -> None:
+    def __init__(self, id_: str, simulation, utilization: float, long_tasks_fraction: float, is_long_task: bool = False, start: int | None = None, is_duplicate=False, original_id: str | None = None, service_time_scale: float = 1.0, request_index: int = -1) -> None:
         self.id: str = id_
         self.original_id = id_ if original_id is None else original_id
         self.simulation = simulation
@@ -21,6 +21,22 @@ class Task:
         self.long_tasks_fraction = long_tasks_fraction
         self.is_faster_response = True
         self.duplicate_task = None
+        # Recorded request size relative to the mean for trace workloads, multiplies the service time
+        self.service_time_scale = service_time_scale
+        # Position of the request in its workload run, duplicates share it with their original
+        self.request_index = request_index
+
+        # Standard exponential (service time) and standard normal (request and response network delay) draws of the
+        # task, only used with common random numbers. Duplicates are created depending on the policy and use their
+        # own stream.
+        self.service_draw: float | None = None
+        self.network_draw: float | None = None
+        self.response_network_draw: float | None = None
+        if self.simulation.common_random_numbers:
+            task_random = self.simulation.duplicate_task_random if is_duplicate else self.simulation.task_random
+            self.service_draw = float(task_random.standard_exponential())
+            self.network_draw = float(task_random.standard_normal())
+            self.response_network_draw = float(task_random.standard_normal())
 
     def set_q_values(self, q_values):
         self.q_values = q_values
@@ -28,7 +44,8 @@ class Task:
     def create_duplicate_task(self):
         duplicate_id = f'duplicate_{self.id}'
         duplicate_task = Task(id_=duplicate_id, simulation=self.simulation, utilization=self.utilization, long_tasks_fraction=self.long_tasks_fraction,
-                              is_long_task=self._is_long_task, start=self.start, is_duplicate=True, original_id=self.id)
+                              is_long_task=self._is_long_task, start=self.start, is_duplicate=True, original_id=self.id,
+                              service_time_scale=self.service_time_scale, request_index=self.request_index)
         if self.state_at_arrival_time is not None:
             duplicate_task.set_state(self.state_at_arrival_time.deep_copy())
         self.has_duplicate = True
@@ -0,0 +1,39 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from simulations.workload.access_pattern import AliasAccessPattern, create_access_pattern, load_key_popularity, \
+    zipf_weights
+
+
+class AccessPatternTest(unittest.TestCase):
+
+    def assertSamplesFollow(self, access_pattern, probabilities: np.ndarray) -> None:
+        samples = access_pattern.sample(np.random.default_rng(0), size=200000)
+        frequencies = np.bincount(samples, minlength=len(probabilities)) / len(samples)
+        np.testing.assert_allclose(frequencies, probabilities, atol=0.005)
+
+    def testAliasSampler(self):
+        weights = np.array([5.0, 0.0, 1.0, 2.0, 0.5, 1.5])
+        access_pattern = AliasAccessPattern(weights)
+        self.assertSamplesFollow(access_pattern, weights / weights.sum())
+        # Positions without weight are never drawn
+        assert not np.any(access_pattern.sample(np.random.default_rng(1), size=10000) == 1)
+
+    def testBoundedZipf(self):
+        weights = zipf_weights(num_servers=50, exponent=1.5)
+        # Rank 1 (ring position 1) is the most popular, rank 50 wraps around to position 0
+        assert np.argmax(weights) == 1
+        assert np.isclose(weights[0], 50 ** -1.5)
+        self.assertSamplesFollow(create_access_pattern('zipfian', num_servers=50), weights / weights.sum())
+
+    def testKeyPopularityFile(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'keys.csv'
+            path.write_text('10\n0\n5\n1\n4\n')
+            # Keys 3 and 4 share the groups of keys 0 and 1 on three servers
+            np.testing.assert_array_equal(load_key_popularity(path, num_servers=3), [11, 4, 5])
+            access_pattern = create_access_pattern('key_popularity', num_servers=3, key_popularity_file=str(path))
+            self.assertSamplesFollow(access_pattern, np.array([11, 4, 5]) / 20)
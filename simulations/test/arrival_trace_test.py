@@ -0,0 +1,91 @@
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+from simulations.experiment_runner import ExperimentRunner
+from simulations.simulation_args import BaseArgs
+from simulations.state import StateParser
+from simulations.workload.access_pattern import create_access_pattern
+from simulations.workload.arrival_trace import ArrivalTrace, ClientSelector, generate_arrival_trace
+from simulations.workload.workload import BaseWorkload, VariableLongTaskFractionWorkload
+
+
+def assert_traces_equal(trace: ArrivalTrace, other: ArrivalTrace) -> None:
+    np.testing.assert_array_equal(trace.inter_arrival_times, other.inter_arrival_times)
+    np.testing.assert_array_equal(trace.is_long, other.is_long)
+    np.testing.assert_array_equal(trace.client_indices, other.client_indices)
+    np.testing.assert_array_equal(trace.first_replica_indices, other.first_replica_indices)
+    np.testing.assert_array_equal(trace.service_time_scales, other.service_time_scales)
+
+
+class ArrivalTraceTest(unittest.TestCase):
+
+    def generate(self, seed: int, **kwargs) -> ArrivalTrace:
+        trace_args = dict(num_requests=10000, arrival_model='poisson', client_delay_mean=5.0,
+                          long_tasks_fraction=0.2, client_selector=ClientSelector([1.0, 0.0, 3.0]),
+                          access_pattern=create_access_pattern('uniform', num_servers=5))
+        trace_args.update(kwargs)
+        return generate_arrival_trace(np_random=np.random.default_rng(seed), **trace_args)
+
+    def testSameSeedGivesSameTrace(self):
+        assert_traces_equal(self.generate(seed=1), self.generate(seed=1))
+        assert not np.array_equal(self.generate(seed=1).inter_arrival_times,
+                                  self.generate(seed=2).inter_arrival_times)
+
+    def testDrawsFollowWorkloadParameters(self):
+        trace = self.generate(seed=1)
+        # Clients without demand weight never get requests
+        assert set(np.unique(trace.client_indices)) == {0, 2}
+        assert abs(np.mean(trace.client_indices == 2) - 0.75) < 0.02
+        assert abs(np.mean(trace.is_long) - 0.2) < 0.02
+        assert abs(np.mean(trace.inter_arrival_times) - 5.0) < 0.1
+        assert trace.first_replica_indices.min() >= 0 and trace.first_replica_indices.max() < 5
+
+        zipfian = self.generate(seed=1, access_pattern=create_access_pattern('zipfian', num_servers=5))
+        assert zipfian.first_replica_indices.max() < 5
+
+    def testClientSelectionWithManyClients(self):
+        # 10% of 500 clients send 90% of the requests, like demand_skew=0.9 and high_demand_fraction=0.1
+        weights = np.array([0.9 / 0.1] * 50 + [0.1 / 0.9] * 450)
+        trace = self.generate(seed=1, num_requests=100000, client_selector=ClientSelector(weights))
+        frequencies = np.bincount(trace.client_indices, minlength=500) / len(trace)
+        assert abs(frequencies[:50].sum() - 0.9) < 0.01
+        np.testing.assert_allclose(frequencies, weights / weights.sum(), atol=0.002)
+
+    def testSaveAndLoad(self):
+        trace = self.generate(seed=1, num_requests=100)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'trace.npz'
+            trace.save(path)
+            assert_traces_equal(trace, ArrivalTrace.load(path))
+
+    def run_workload(self, workload: BaseWorkload, policy: str):
+        args = BaseArgs(input_args=['--selection_strategy', policy, '--seed', '4']).args
+        runner = ExperimentRunner(state_parser=StateParser(num_servers=5, num_request_rates=3, poly_feat_degree=2),
+                                  trainer=SimpleNamespace(eval_mode=True))
+        return runner.run_experiment(args, workload=workload, service_time_model='random.expovariate',
+                                     training_data_collector=None).get_columns()
+
+    def testPoliciesCanRunOnTheSameTrace(self):
+        workload = VariableLongTaskFractionWorkload(id_=1, trigger_threshold=70, updated_long_tasks_fractions=[0.5],
+                                                    arrival_model='poisson', utilization=0.45, num_requests=300,
+                                                    long_tasks_fraction=0.2)
+        ars_columns = self.run_workload(workload, policy='ARS')
+        trace = workload.arrival_trace
+        assert len(trace) == 300
+        # The long task fraction changes after every 70 requests
+        assert abs(np.mean(trace.is_long[70:]) - 0.5) < 0.15
+
+        # Same seed, same trace
+        self.run_workload(workload, policy='ARS')
+        assert_traces_equal(trace, workload.arrival_trace)
+
+        workload.fixed_arrival_trace = trace
+        random_columns = self.run_workload(workload, policy='random')
+        assert_traces_equal(trace, workload.arrival_trace)
+        # Both policies see the same requests arrive at the same times
+        for column in ['is_long_request', 'task_time_sent']:
+            np.testing.assert_array_equal(np.sort(ars_columns[column]), np.sort(random_columns[column]))
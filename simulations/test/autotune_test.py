@@ -0,0 +1,52 @@
+import unittest
+from unittest import mock
+
+import optuna
+
+import simulations.autotune as autotune
+
+JSON_OBJ = [
+    {"key": "exp_name", "value": "test", "key_type": "const"},
+    {"key": "lr", "value": [1e-6, 1e-2], "key_type": "tune", "value_type": "log"},
+]
+
+
+def fake_trial(input_args, setting, epoch_callback):
+    # Trials with a high lr have a bad p99 in every epoch
+    lr = float(input_args[input_args.index('--lr') + 1])
+    value = -1000.0 if lr > 1e-4 else -100.0
+    for epoch in range(20):
+        epoch_callback(epoch, value)
+    return value
+
+
+class AutotuneTest(unittest.TestCase):
+
+    def testBadTrialsArePruned(self):
+        study = optuna.create_study(direction='maximize', pruner=autotune.create_pruner('median', warmup_epochs=2),
+                                    sampler=optuna.samplers.RandomSampler(seed=0))
+        for lr in [1e-6, 1e-6, 1e-6, 1e-6, 1e-6, 1e-3]:
+            study.enqueue_trial({'lr': lr})
+        with mock.patch.object(autotune, 'run_autotune_trial', side_effect=fake_trial) as run_trial:
+            study.optimize(lambda trial: autotune.objective(trial, JSON_OBJ, 'base'), n_trials=6)
+
+        assert run_trial.call_args_list[0].kwargs['input_args'][:2] == ['--exp_name', 'test_trial_0']
+        states = [trial.state for trial in study.trials]
+        assert states[:5] == [optuna.trial.TrialState.COMPLETE] * 5
+        assert states[5] == optuna.trial.TrialState.PRUNED
+        # Pruned after the warmup epochs instead of running all 20
+        assert max(study.trials[5].intermediate_values) == 2
+
+    def testNoPruner(self):
+        assert isinstance(autotune.create_pruner('none', warmup_epochs=0), optuna.pruners.NopPruner)
+        assert isinstance(autotune.create_pruner('hyperband', warmup_epochs=0), optuna.pruners.HyperbandPruner)
+
+    def testTrialKeepsTrainPolicies(self):
+        import constants as const
+        import experiment
+
+        train_policies = const.TRAIN_POLICIES_TO_RUN
+        with mock.patch.object(experiment, 'rl_experiment_wrapper', side_effect=Exception('Simulation failed')):
+            with self.assertRaises(Exception):
+                experiment.run_autotune_trial(input_args=['--epochs', '1'], setting='base')
+        assert const.TRAIN_POLICIES_TO_RUN is train_policies
@@ -0,0 +1,74 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import torch
+
+import constants as const
+from simulations.experiment import create_simulation_args, rl_experiment_wrapper
+from simulations.training.checkpoint import CHECKPOINT_FOLDER, CheckpointWriter, load_checkpoint, \
+    load_episode_columns
+from simulations.workload.workload import BaseWorkload
+
+
+class Interrupted(Exception):
+    pass
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.train_policies = const.TRAIN_POLICIES_TO_RUN
+        const.TRAIN_POLICIES_TO_RUN = ['ARS', 'DQN']
+
+    def tearDown(self):
+        const.TRAIN_POLICIES_TO_RUN = self.train_policies
+        self.tmp_dir.cleanup()
+
+    def train(self, input_args, out_path=None, epoch_callback=None):
+        simulation_args = create_simulation_args(input_args=['--epochs', '3', '--batch_size', '16', '--skip_plots']
+                                                 + input_args, setting='base')
+        workloads = [BaseWorkload(id_=1, utilization=0.45, arrival_model='poisson', num_requests=200,
+                                  long_tasks_fraction=0.2)]
+        rl_experiment_wrapper(simulation_args, train_workloads=workloads, test_workloads=[], run_tests=False,
+                              out_path=out_path, epoch_callback=epoch_callback)
+
+    def testWriterReplacesCheckpoint(self):
+        writer = CheckpointWriter(checkpoint_folder=self.tmp_path)
+        file_name = writer.write_episode('ARS', 0, {'Latency': np.arange(3.0)})
+        writer.write_checkpoint({'next': (0, 1)})
+        writer.write_checkpoint({'next': (0, 2)})
+        writer.close()
+
+        assert load_checkpoint(self.tmp_path)['next'] == (0, 2)
+        np.testing.assert_array_equal(load_episode_columns(self.tmp_path, file_name)['Latency'], np.arange(3.0))
+        assert sorted(path.name for path in self.tmp_path.rglob('*.tmp*')) == []
+
+    def testResumedTrainingMatchesUninterruptedTraining(self):
+        full_path = self.tmp_path / 'full'
+        self.train(input_args=[], out_path=full_path)
+
+        def interrupt(epoch: int, value: float) -> None:
+            if epoch == 1:
+                raise Interrupted()
+
+        resumed_path = self.tmp_path / 'resumed'
+        with self.assertRaises(Interrupted):
+            self.train(input_args=['--checkpoint_interval', '1'], out_path=resumed_path, epoch_callback=interrupt)
+        checkpoint = load_checkpoint(resumed_path / 'train' / CHECKPOINT_FOLDER)
+        assert tuple(checkpoint['next']) == (1, 1)
+
+        self.train(input_args=['--checkpoint_interval', '1', '--resume', str(resumed_path)])
+
+        full_data = full_path / 'train' / 'data'
+        resumed_data = resumed_path / 'train' / 'data'
+        pd.testing.assert_frame_equal(pd.read_csv(full_data / 'data.csv'), pd.read_csv(resumed_data / 'data.csv'))
+        for file_name in ['policy_model_weights.pth', 'target_model_weights.pth']:
+            full_weights = torch.load(full_data / file_name)
+            resumed_weights = torch.load(resumed_data / file_name)
+            for key in full_weights:
+                assert torch.equal(full_weights[key], resumed_weights[key])
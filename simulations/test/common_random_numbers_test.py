@@ -0,0 +1,70 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from simulations import experiment_runner
+from simulations.experiment_runner import ExperimentRunner
+from simulations.simulation_args import BaseArgs
+from simulations.state import StateParser
+from simulations.workload.workload import BaseWorkload
+
+
+class CommonRandomNumbersTest(unittest.TestCase):
+
+    def run_experiment(self, policy: str, input_args=None, nw_latency_sigma: float | None = None):
+        args = BaseArgs(input_args=['--selection_strategy', policy, '--seed', '5'] + (input_args or [])).args
+        runner = ExperimentRunner(state_parser=StateParser(num_servers=5, num_request_rates=3, poly_feat_degree=2),
+                                  trainer=SimpleNamespace(eval_mode=True))
+        workload = BaseWorkload(id_=1, utilization=0.7, arrival_model='poisson', num_requests=500,
+                                long_tasks_fraction=0.2)
+        runner.start_experiment(args, workload=workload, service_time_model='random.expovariate',
+                                training_data_collector=None)
+        if nw_latency_sigma is not None:
+            # Servers are created with the default network delay, which does not vary
+            for server in runner.servers:
+                server.NW_LATENCY_SIGMA = nw_latency_sigma
+        columns = runner.finish_experiment(args, workload=workload).get_columns()
+        return runner, columns
+
+    def run_policy(self, policy: str, input_args=None):
+        runner, _ = self.run_experiment(policy, input_args)
+        # Service times of all tasks, whichever server ran them
+        return np.sort([service_time for server in runner.servers
+                        for service_time, _ in server.act_monitor.get_data()])
+
+    def testPoliciesSeeTheSameServiceTimes(self):
+        crn = ['--common_random_numbers']
+        ars = self.run_policy('ARS', crn)
+        np.testing.assert_array_equal(ars, self.run_policy('random', crn))
+        np.testing.assert_array_equal(ars, self.run_policy('round_robin', crn))
+
+        # The shared stream gives every policy different service times
+        assert not np.array_equal(self.run_policy('ARS'), self.run_policy('random'))
+
+    def testCommonRandomNumbersKeepTheServiceTimeDistribution(self):
+        service_times = self.run_policy('random', ['--common_random_numbers'])
+        # 20% long tasks with 35 added to the mean service time of 4
+        assert abs(np.mean(service_times) - (4 + 0.2 * 35)) < 2
+
+    def testLatenciesDoNotDependOnTheSharedStream(self):
+        # The client module the runner creates its clients from
+        client_class = experiment_runner.client.Client
+        maybe_send_shadow_reads = client_class.maybe_send_shadow_reads
+
+        def draw_from_shared_stream(client, *args, **kwargs):
+            # A policy with the same routing that also draws from the shared stream
+            client.simulation.random.random()
+            return maybe_send_shadow_reads(client, *args, **kwargs)
+
+        for crn, same in [(['--common_random_numbers'], True), ([], False)]:
+            _, columns = self.run_experiment('round_robin', crn, nw_latency_sigma=0.01)
+            with mock.patch.object(client_class, 'maybe_send_shadow_reads', draw_from_shared_stream):
+                _, other_columns = self.run_experiment('round_robin', crn, nw_latency_sigma=0.01)
+            # Same requests on the same replicas, compared in the order they were sent
+            order = np.lexsort((columns['replica_id'], columns['task_time_sent']))
+            other_order = np.lexsort((other_columns['replica_id'], other_columns['task_time_sent']))
+            np.testing.assert_array_equal(columns['task_time_sent'][order], other_columns['task_time_sent'][other_order])
+            np.testing.assert_array_equal(columns['replica_id'][order], other_columns['replica_id'][other_order])
+            assert np.array_equal(columns['latency'][order], other_columns['latency'][other_order]) == same
@@ -0,0 +1,37 @@
+import unittest
+
+import numpy as np
+
+from simulations.episode_stopping import EpisodeStopping, confidence_interval
+
+
+class EpisodeStoppingTest(unittest.TestCase):
+
+    def run_episodes(self, stopping: EpisodeStopping, episode_noise: float) -> int:
+        rng = np.random.default_rng(0)
+        latencies = rng.exponential(10, size=5000)
+        for _ in stopping.episodes():
+            # Episodes differ by a random factor
+            stopping.add(latencies * (1 + episode_noise * rng.normal()))
+        return stopping.num_episodes
+
+    def testFixedEpisodeCount(self):
+        assert self.run_episodes(EpisodeStopping(min_episodes=3), episode_noise=0.1) == 3
+        assert self.run_episodes(EpisodeStopping(min_episodes=1, max_episodes=1), episode_noise=0.1) == 1
+
+    def testStopsOnceIntervalsAreNarrow(self):
+        # Stable episodes stop at the minimum, noisy episodes run until the budget is spent
+        assert self.run_episodes(EpisodeStopping(min_episodes=3, max_episodes=20, target_width=0.1),
+                                 episode_noise=0.001) == 3
+        assert self.run_episodes(EpisodeStopping(min_episodes=3, max_episodes=20, target_width=0.1),
+                                 episode_noise=0.5) == 20
+        assert 20 < self.run_episodes(EpisodeStopping(min_episodes=3, max_episodes=200, target_width=0.1),
+                                     episode_noise=0.2) < 200
+
+    def testConfidenceInterval(self):
+        rng = np.random.default_rng(1)
+        covered = 0
+        for _ in range(1000):
+            low, high = confidence_interval(list(rng.normal(10, 2, size=5)), confidence=0.9)
+            covered += low <= 10 <= high
+        assert abs(covered / 1000 - 0.9) < 0.03
@@ -0,0 +1,108 @@
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from simulations.client import DataPoint
+from simulations.monitor import DataPointMonitor, Monitor
+from simulations.plotting import ExperimentPlot, downsample_scatter
+
+
+def fill_monitor(monitor: Monitor, n: int, offset: float) -> Monitor:
+    for i in range(n):
+        monitor.observe(DataPoint(state=SimpleNamespace(is_long_request=i % 3 == 0), task_time_sent=float(i),
+                                  q_values=None, latency=offset + i, replica_id=i % 2, is_duplicate=False,
+                                  is_faster_response=i % 4 != 0, utilization=0.45, long_tasks_fraction=0.2),
+                        t=float(i) + 0.5)
+    return monitor
+
+
+class ExperimentPlotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.simulation = SimpleNamespace(now=0.0)
+        self.plotter = ExperimentPlot(plot_folder=Path(self.tmp_dir.name) / 'plots',
+                                      data_folder=Path(self.tmp_dir.name) / 'data')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def testEpisodesAreConcatenatedLazily(self):
+        for epoch in range(3):
+            for offset, policy in enumerate(['random', 'ARS']):
+                monitor = fill_monitor(DataPointMonitor(simulation=self.simulation), n=10, offset=offset * 100)
+                self.plotter.add_data(monitor, policy=policy, epoch_num=epoch)
+        assert len(self.plotter.episode_columns) == 6
+
+        df = self.plotter.df
+        assert len(self.plotter.episode_columns) == 0
+        assert len(df) == 60 and list(df.index) == list(range(60))
+        assert str(df['Policy'].dtype) == 'category'
+        # Categories follow the policy order of the plots
+        assert list(df['Policy'].cat.categories) == ['random', 'ARS']
+        assert df['Epoch'].tolist() == list(np.repeat(range(3), 20))
+        assert df.groupby('Policy', observed=True)['Latency'].min().to_dict() == {'ARS': 100.0, 'random': 0.0}
+
+    def testGenericMonitorGivesSameFrame(self):
+        self.plotter.add_data(fill_monitor(DataPointMonitor(simulation=self.simulation), n=12, offset=0),
+                              policy='ARS', epoch_num=0)
+        other = ExperimentPlot(plot_folder=Path(self.tmp_dir.name) / 'plots',
+                               data_folder=Path(self.tmp_dir.name) / 'data')
+        other.add_data(fill_monitor(Monitor(simulation=self.simulation), n=12, offset=0), policy='ARS', epoch_num=0)
+        assert self.plotter.df.equals(other.df)
+
+    def testDataPointMonitorOnlyKeepsColumns(self):
+        monitor = fill_monitor(DataPointMonitor(simulation=self.simulation), n=12, offset=0)
+        assert 'data' not in vars(monitor) and len(monitor) == 12
+        data_point, time = monitor.get_data()[3]
+        assert data_point.latency == 3.0 and data_point.replica_id == 1 and time == 3.5
+        assert monitor.drop_sent_before(5.0) == 5
+        assert [data_point.latency for data_point, _ in monitor] == monitor.get_primary_data() == list(range(5, 12))
+        np.testing.assert_array_equal(monitor.get_faster_response_latencies(), [5, 6, 7, 9, 10, 11])
+
+    def testDataAddedAfterAccessIsAppended(self):
+        self.plotter.add_data(fill_monitor(DataPointMonitor(simulation=self.simulation), n=5, offset=0),
+                              policy='DQN', epoch_num=0)
+        assert len(self.plotter.df) == 5
+        self.plotter.add_data(fill_monitor(DataPointMonitor(simulation=self.simulation), n=5, offset=0),
+                              policy='some_new_policy', epoch_num=1)
+        df = self.plotter.df
+        assert len(df) == 10
+        assert df['Policy'].tolist() == ['DQN'] * 5 + ['some_new_policy'] * 5
+        assert self.plotter.filter_df(policies=['DQN'], is_long_request=True)['Policy'].cat.categories.tolist() == ['DQN']
+
+    def testPlotJobsIncludeEpisodes(self):
+        self.plotter.add_data(fill_monitor(DataPointMonitor(simulation=self.simulation), n=5, offset=0),
+                              policy='ARS', epoch_num=0)
+        jobs = self.plotter.plot_jobs(epoch_to_plot=0, policies_to_plot=['ARS'])
+        assert all(hasattr(self.plotter, job.method) for job in jobs)
+        assert jobs[-2:] == [('plot_episode', {'epoch': 0}), ('plot_policy_episode', {'epoch': 0, 'policy': 'ARS'})]
+        assert all(job.method not in ['plot_episode', 'plot_policy_episode'] for job in self.plotter.plot_jobs())
+
+    def testDownsampleScatterKeepsTail(self):
+        df = pd.DataFrame({'Time': np.arange(10000, dtype=float), 'Latency': np.arange(10000, dtype=float)})
+        sampled = downsample_scatter(df, max_points=500)
+        assert len(sampled) == 500
+        # All requests slower than the 99th percentile are kept, in time order
+        assert set(range(9900, 10000)) <= set(sampled['Latency'].astype(int))
+        assert sampled['Time'].is_monotonic_increasing
+        assert len(downsample_scatter(df.iloc[:100], max_points=500)) == 100
+
+    def testEpochAutotunerObjective(self):
+        for epoch in range(2):
+            self.plotter.add_data(fill_monitor(DataPointMonitor(simulation=self.simulation), n=100, offset=epoch * 100),
+                                  policy='DQN', epoch_num=epoch)
+        # Only the faster responses count, like in the final statistics
+        faster = np.arange(100.0)[np.arange(100) % 4 != 0]
+        # Pending episodes are evaluated without building the frame
+        assert np.isclose(self.plotter.get_autotuner_objective(epoch=1), -np.quantile(faster + 100.0, 0.99))
+        assert len(self.plotter.episode_columns) == 2
+        overall = self.plotter.get_autotuner_objective()
+        assert np.isclose(self.plotter.get_autotuner_objective(epoch=1), -np.quantile(faster + 100.0, 0.99))
+        assert np.isclose(overall, -np.quantile(np.concatenate((faster, faster + 100.0)), 0.99))
+        self.plotter.keep_faster_responses()
+        assert self.plotter.get_autotuner_objective() == overall
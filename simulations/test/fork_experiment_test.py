@@ -0,0 +1,69 @@
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from simulations.experiment_runner import ExperimentRunner
+from simulations.plotting import ExperimentPlot
+from simulations.simulation_args import BaseArgs
+from simulations.state import StateParser
+from simulations.workload.workload import BaseWorkload
+
+
+class ForkExperimentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.args = BaseArgs(input_args=['--selection_strategy', 'ARS', '--seed', '3']).args
+        self.runner = ExperimentRunner(state_parser=StateParser(num_servers=5, num_request_rates=3, poly_feat_degree=2),
+                                       trainer=SimpleNamespace(eval_mode=True))
+
+    def workload(self) -> BaseWorkload:
+        return BaseWorkload(id_=1, utilization=0.7, arrival_model='poisson', num_requests=500, long_tasks_fraction=0.2)
+
+    def testBranchesContinueFromTheSharedPrefix(self):
+        branches = {
+            'ARS': lambda runner: None,
+            'random': lambda runner: runner.set_selection_strategy('random'),
+            'round_robin': lambda runner: runner.set_selection_strategy('round_robin'),
+        }
+        workload = self.workload()
+        results = self.runner.fork_experiment(self.args, workload=workload, service_time_model='random.expovariate',
+                                              branches=branches, fork_time=300, training_data_collector=None)
+        assert list(results) == list(branches)
+        # Branches only report the requests sent after the fork
+        for columns in results.values():
+            assert columns['task_time_sent'].min() >= 300
+        assert not np.array_equal(results['ARS']['latency'], results['random']['latency'])
+
+        # The parent stays at the fork, the unchanged branch matches an uninterrupted run of the same workload
+        assert self.runner.simulation.now == 300
+        columns = self.runner.run_experiment(self.args, workload=workload, service_time_model='random.expovariate',
+                                             training_data_collector=None).get_columns()
+        after_fork = columns['task_time_sent'] >= 300
+        np.testing.assert_array_equal(results['ARS']['latency'], columns['latency'][after_fork])
+
+    def testFailingBranchRaises(self):
+        def fail(runner):
+            raise ValueError('Branch error')
+
+        with self.assertRaises(Exception) as context:
+            self.runner.fork_experiment(self.args, workload=self.workload(), service_time_model='random.expovariate',
+                                        branches={'fail': fail}, fork_time=100, training_data_collector=None)
+        assert 'Branch error' in str(context.exception)
+
+    def testForkedTestsRecordEveryPolicy(self):
+        import experiment
+
+        simulation_args = experiment.create_simulation_args(['--fork_time', '300'])
+        with tempfile.TemporaryDirectory() as tmp_dir, mock.patch.object(experiment.const, 'NUM_TEST_EPSIODES', 2):
+            plotter = ExperimentPlot(plot_folder=Path(tmp_dir) / 'plots', data_folder=Path(tmp_dir) / 'data')
+            experiment.run_forked_tests(simulation_args, workload=self.workload(), policies=['ARS', 'random'],
+                                        experiment_runner=self.runner, training_data_collector=None,
+                                        test_plotter=plotter)
+            df = plotter.df
+        assert sorted(df['Policy'].unique()) == ['ARS', 'random']
+        assert sorted(df['Epoch'].unique()) == [0, 1]
+        assert df['Task_time_sent'].min() >= 300
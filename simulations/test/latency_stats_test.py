@@ -0,0 +1,58 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from simulations.latency_stats import LatencyStats, SortedGroups, select_policies
+
+
+class LatencyStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 5000
+        self.df = pd.DataFrame({
+            'Policy': pd.Categorical(rng.choice(['ARS', 'DQN', 'random'], n), categories=['DQN', 'random', 'ARS']),
+            'Epoch': rng.integers(0, 4, n),
+            'Latency': rng.exponential(5, n),
+            'Is_long_request': rng.random(n) < 0.2,
+        })
+        self.stats = LatencyStats(self.df)
+
+    def testSortedGroupsQuantileMatchesNumpy(self):
+        values = np.array([5.0, 1.0, 3.0, 2.0, 4.0, 10.0])
+        groups = SortedGroups(group_ids=np.array([0, 0, 0, 2, 2, 2]), values=values, n_groups=3)
+        for q in [0.0, 0.3, 0.5, 0.99, 1.0]:
+            result = groups.quantile(q)
+            assert np.isclose(result[0], np.quantile([5.0, 1.0, 3.0], q))
+            assert np.isnan(result[1])
+            assert np.isclose(result[2], np.quantile([2.0, 4.0, 10.0], q))
+        assert np.allclose(groups.mean()[[0, 2]], [3.0, 16 / 3])
+
+    def testQuantilesMatchPandas(self):
+        for request_class, df in [('all', self.df), ('long', self.df[self.df['Is_long_request']]),
+                                  ('short', self.df[~self.df['Is_long_request']])]:
+            for q in [0.5, 0.9, 0.999]:
+                expected = df.groupby(['Policy', 'Epoch'], observed=True)['Latency'].quantile(q).reset_index()
+                result = self.stats.quantile(q, request_class=request_class)
+                assert result['Policy'].tolist() == expected['Policy'].tolist()
+                assert result['Epoch'].tolist() == expected['Epoch'].tolist()
+                assert np.allclose(result['Latency'], expected['Latency'])
+
+            expected = df.groupby('Policy', observed=True)['Latency'].mean()
+            assert np.allclose(self.stats.mean(request_class=request_class).set_index('Policy')['Latency'], expected)
+
+    def testTailCdfMatchesFilter(self):
+        filtered = self.df[self.df.groupby(['Policy', 'Epoch'], observed=True)['Latency'].transform(
+            lambda x: x > x.quantile(0.9))]
+        cdf = self.stats.tail_cdf(0.9)
+        for policy in ['DQN', 'random', 'ARS']:
+            expected = np.sort(filtered[filtered['Policy'] == policy]['Latency'].to_numpy())
+            policy_cdf = cdf[cdf['Policy'] == policy]
+            assert np.array_equal(policy_cdf['Latency'].to_numpy(), expected)
+            assert policy_cdf['CDF'].iloc[-1] == 1.0
+
+    def testSelectPolicies(self):
+        selected = select_policies(self.stats.mean(), policies=['ARS'])
+        assert selected['Policy'].tolist() == ['ARS']
+        assert selected['Policy'].cat.categories.tolist() == ['ARS']
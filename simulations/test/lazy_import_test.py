@@ -0,0 +1,12 @@
+import unittest
+
+from simulations.scripts.import_time_benchmark import CORE_MODULES, loaded_heavy_modules
+
+
+class LazyImportTest(unittest.TestCase):
+
+    def testCoreDoesNotImportHeavyDependencies(self):
+        assert loaded_heavy_modules(CORE_MODULES) == []
+
+    def testTrainerStillLoadsTorch(self):
+        assert 'torch' in loaded_heavy_modules(['simulations.training.model_trainer'])
@@ -0,0 +1,61 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import torch
+
+from simulations.data.memmap_dataset import MemmapDataset, batch_loader, convert_csv_to_memmap
+
+
+class MemmapDatasetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_path = Path(self.tmp_dir.name) / 'data.csv'
+        # Every feature of a row equals its label, so gathered rows can be checked against their labels
+        labels = np.arange(103) % 5
+        df = pd.DataFrame({f'f{i}': labels.astype(float) for i in range(4)})
+        df['Replica'] = labels
+        df.to_csv(self.data_path, index=False)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def testConversionIsReused(self):
+        features_path, labels_path = convert_csv_to_memmap(data_path=self.data_path, target_col='Replica')
+        features = np.load(features_path)
+        assert features.shape == (103, 4) and features.dtype == np.float32
+        assert np.load(labels_path).dtype == np.int64
+        assert convert_csv_to_memmap(data_path=self.data_path, target_col='Replica') == (features_path, labels_path)
+
+    def testSplitIsDisjoint(self):
+        trainset = MemmapDataset(mode='train', data_path=self.data_path, target_col='Replica', seed=1)
+        testset = MemmapDataset(mode='test', data_path=self.data_path, target_col='Replica', seed=1)
+        assert len(trainset) == 82 and len(testset) == 21
+        assert len(np.intersect1d(trainset.indices, testset.indices)) == 0
+
+    def testBatchGatherKeepsRowsAligned(self):
+        dataset = MemmapDataset(mode='train', data_path=self.data_path, target_col='Replica', seed=1)
+        features, labels = dataset[[7, 3, 50]]
+        assert features.shape == (3, 4)
+        assert np.array_equal(features[:, 0], labels.astype(np.float32))
+
+    def testLoaderYieldsMinibatches(self):
+        dataset = MemmapDataset(mode='train', data_path=self.data_path, target_col='Replica', seed=1,
+                                transform=torch.from_numpy)
+        for num_workers in [0, 2]:
+            batches = list(batch_loader(dataset, batch_size=32, num_workers=num_workers))
+            assert [len(labels) for _, labels in batches] == [32, 32, 18]
+            features = torch.cat([features for features, _ in batches])
+            labels = torch.cat([labels for _, labels in batches])
+            assert labels.dtype == torch.int64
+            assert torch.equal(features[:, 0], labels.float())
+
+    def testRowsWithQuotedNewlines(self):
+        # A quoted newline in a column name and no newline after the last row
+        self.data_path.write_text('f0,"f\n1",Replica\n1.0,1.5,1\n2.0,2.5,2\n3.0,3.5,3')
+        features_path, labels_path = convert_csv_to_memmap(data_path=self.data_path, target_col='Replica')
+        assert np.array_equal(np.load(labels_path), [1, 2, 3])
+        assert np.array_equal(np.load(features_path), [[1.0, 1.5], [2.0, 2.5], [3.0, 3.5]])
@@ -0,0 +1,57 @@
+import unittest
+
+import torch
+
+from simulations.state import StateParser
+from simulations.training.norm_stats import compute_norm_stats
+from simulations.training.offline_model_trainer import OfflineTrainer, iterate_minibatches
+from simulations.training.replay_memory import Transition
+
+
+class OfflineTrainingTest(unittest.TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+        self.state_parser = StateParser(num_servers=5, num_request_rates=3, poly_feat_degree=2)
+        num_features = self.state_parser.get_state_size()
+        self.transitions = Transition(state=torch.randn(10, num_features), action=torch.randint(0, 5, (10, 1)),
+                                      next_state=torch.randn(10, num_features), reward=torch.randn(10, 1))
+
+    def create_trainer(self) -> OfflineTrainer:
+        return OfflineTrainer(state_parser=self.state_parser, model_structure='linear', n_actions=5,
+                              replay_always_use_newest=False, replay_memory_size=100, batch_size=4, lr=1e-2)
+
+    def assertNetsEqual(self, net, other) -> None:
+        for key, value in net.state_dict().items():
+            assert torch.equal(value, other.state_dict()[key])
+
+    def testMinibatchesCoverEveryTransitionOnce(self):
+        batches = list(iterate_minibatches(self.transitions, batch_size=4))
+        assert [batch.state.size(0) for batch in batches] == [4, 4, 2]
+        states = torch.cat([batch.state for batch in batches])
+        order = [int(torch.nonzero((self.transitions.state == state).all(dim=1))) for state in states]
+        assert sorted(order) == list(range(10))
+
+        ordered = list(iterate_minibatches(self.transitions, batch_size=4, shuffle=False))
+        assert torch.equal(torch.cat([batch.reward for batch in ordered]), self.transitions.reward)
+
+    def testTargetNetworkUpdates(self):
+        norm_stats = compute_norm_stats(self.transitions)
+
+        # Three optimization steps per epoch, the sync after the last one leaves both networks equal
+        trainer = self.create_trainer()
+        initial = [parameter.clone() for parameter in trainer.policy_net.parameters()]
+        trainer.run_offline_training(self.transitions, norm_stats=norm_stats, epochs=2, target_update_interval=3)
+        assert not torch.equal(initial[0], next(trainer.policy_net.parameters()))
+        self.assertNetsEqual(trainer.target_net, trainer.policy_net)
+
+        # The last step after the sync at step 2 only changed the policy network
+        trainer = self.create_trainer()
+        trainer.run_offline_training(self.transitions, norm_stats=norm_stats, epochs=1, target_update_interval=2)
+        assert not torch.equal(next(trainer.target_net.parameters()), next(trainer.policy_net.parameters()))
+
+        # By default the target network is soft updated after every step
+        trainer = self.create_trainer()
+        initial = [parameter.clone() for parameter in trainer.target_net.parameters()]
+        trainer.run_offline_training(self.transitions, norm_stats=norm_stats, epochs=1, target_update_interval=0)
+        assert not torch.equal(initial[0], next(trainer.target_net.parameters()))
@@ -0,0 +1,68 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+import simulations.profiling as profiling
+from simulations.experiment_runner import ExperimentRunner
+from simulations.simulation_args import BaseArgs
+from simulations.simulator import Simulation
+from simulations.state import StateParser
+from simulations.workload.workload import BaseWorkload
+
+
+class ProfilingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.args = BaseArgs(input_args=['--selection_strategy', 'ARS', '--seed', '3']).args
+        self.runner = ExperimentRunner(state_parser=StateParser(num_servers=5, num_request_rates=3, poly_feat_degree=2),
+                                       trainer=SimpleNamespace(eval_mode=True))
+
+    def tearDown(self):
+        profiling.stop()
+        self.tmp_dir.cleanup()
+
+    def run_experiment(self):
+        workload = BaseWorkload(id_=1, utilization=0.45, arrival_model='poisson', num_requests=300,
+                                long_tasks_fraction=0.2)
+        monitor = self.runner.run_experiment(self.args, workload=workload, service_time_model='random.expovariate',
+                                             training_data_collector=None)
+        return monitor.get_columns()
+
+    def testProfiledRunMatchesUnprofiledRun(self):
+        columns = self.run_experiment()
+
+        trace_file = Path(self.tmp_dir.name) / 'trace.json'
+        profiling.start(trace_file=trace_file)
+        profiling.set_csv_file(Path(self.tmp_dir.name) / 'profile.csv')
+        profiled_columns = self.run_experiment()
+        profiler = profiling.stop()
+
+        for name in columns:
+            np.testing.assert_array_equal(columns[name], profiled_columns[name])
+
+        assert len(profiler.episodes) == 1
+        label, _, stats = profiler.episodes[0]
+        assert label == 'ARS seed 3'
+        assert stats['Client.schedule'][0] == 300
+        assert stats['ResponseHandler.run'][0] > 0
+        assert stats['Simulation.step'][0] > 0
+        # Self time never exceeds total time
+        assert all(self_time <= total + 1e-9 for _, total, self_time in stats.values())
+
+        with open(trace_file) as file:
+            events = json.load(file)['traceEvents']
+        assert {'Client.schedule', 'Simulation.step', 'ARS seed 3'} <= {event['name'] for event in events}
+        assert (Path(self.tmp_dir.name) / 'profile.csv').exists()
+
+    def testStopRemovesInstrumentation(self):
+        step = Simulation.step
+        profiling.start()
+        assert Simulation.step is not step
+        profiling.stop()
+        assert Simulation.step is step
+        assert 'step' not in Simulation.__dict__
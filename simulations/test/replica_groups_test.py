@@ -0,0 +1,45 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from simulations.client import RequestRateMonitor
+from simulations.experiment_runner import ExperimentRunner
+from simulations.simulation_args import BaseArgs
+from simulations.state import StateParser
+from simulations.workload.workload import BaseWorkload
+
+
+class ReplicaGroupsTest(unittest.TestCase):
+
+    def testReplicaGroupsSmallerThanCluster(self):
+        for policy in ['random', 'round_robin', 'ARS']:
+            args = BaseArgs(input_args=['--selection_strategy', policy, '--num_servers', '50',
+                                        '--replication_factor', '3', '--seed', '1']).args
+            runner = ExperimentRunner(state_parser=StateParser(num_servers=3, num_request_rates=3, poly_feat_degree=2),
+                                      trainer=SimpleNamespace(eval_mode=True))
+            workload = BaseWorkload(id_=1, utilization=0.45, arrival_model='poisson', num_requests=2000,
+                                    long_tasks_fraction=0.2)
+            columns = runner.run_experiment(args, workload=workload, service_time_model='random.expovariate',
+                                            training_data_collector=None, duplication_rate=0.2).get_columns()
+            assert len(np.unique(columns['replica_id'])) > 40
+
+            group = runner.clients[0].replica_groups[49]
+            # Groups wrap around the ring and are sorted by id
+            assert [server.id for server in group] == [0, 1, 49]
+
+    def testDqnNeedsAllServers(self):
+        with self.assertRaises(AssertionError):
+            BaseArgs(input_args=['--selection_strategy', 'DQN', '--num_servers', '50', '--replication_factor', '3'])
+
+    def testRequestRates(self):
+        simulation = SimpleNamespace(now=0)
+        monitor = RequestRateMonitor(simulation, rate_intervals=[100, 50, 10])
+        rng = np.random.default_rng(0)
+        times = np.cumsum(rng.poisson(3, size=3000)).astype(float)
+        for i, time in enumerate(times):
+            simulation.now = time
+            monitor.add_request(time)
+            expected = [np.sum(times[:i + 1] >= time - interval) for interval in [100, 50, 10]]
+            assert monitor.get_rates() == expected
+        assert len(monitor.request_times) < 200
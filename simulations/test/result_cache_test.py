@@ -0,0 +1,66 @@
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+from simulations.experiment_runner import ExperimentRunner
+from simulations.result_cache import ResultCache
+from simulations.simulation_args import HeterogeneousRequestsArgs
+from simulations.state import StateParser
+from simulations.workload.workload import BaseWorkload
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(cache_folder=Path(self.tmp_dir.name))
+        self.args = HeterogeneousRequestsArgs(input_args=['--selection_strategy', 'ARS']).args
+        self.workload = BaseWorkload(id_=1, utilization=0.45, arrival_model='poisson', num_requests=300,
+                                     long_tasks_fraction=0.2)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def key(self, **kwargs) -> str:
+        key_args = {'policy': 'ARS', 'seed': 1, 'service_time_model': 'random.expovariate', 'duplication_rate': 0.0}
+        key_args.update(kwargs)
+        return self.cache.key(self.args, workload=self.workload, **key_args)
+
+    def testKeyDependsOnSimulationInputsOnly(self):
+        key = self.key()
+        assert key == self.key()
+        assert key != self.key(seed=2)
+        assert key != self.key(policy='random')
+
+        # Model hyperparameters and folders do not change results of ARS
+        self.args.lr = 0.1
+        self.args.exp_name = 'other'
+        assert key == self.key()
+
+        self.args.num_servers = 7
+        assert key != self.key()
+        self.args.num_servers = 5
+        self.workload.utilization = 0.7
+        assert key != self.key()
+
+    def testCachedColumnsMatchSimulation(self):
+        self.args.seed = 1
+        # ARS never asks the (evaluating) trainer for decisions
+        runner = ExperimentRunner(state_parser=StateParser(num_servers=5, num_request_rates=3, poly_feat_degree=2),
+                                  trainer=SimpleNamespace(eval_mode=True))
+        monitor = runner.run_experiment(self.args, workload=self.workload, service_time_model='random.expovariate',
+                                        training_data_collector=None)
+        key = self.key()
+        assert self.cache.get(key) is None
+        self.cache.put(key, monitor.get_columns())
+
+        cached = self.cache.get(key)
+        columns = monitor.get_columns()
+        assert cached.keys() == columns.keys()
+        for column, values in columns.items():
+            assert cached[column].dtype == values.dtype
+            assert np.array_equal(cached[column], values)
+        assert (self.cache.hits, self.cache.misses) == (1, 1)
@@ -0,0 +1,95 @@
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from simulations.sweep import args_to_input_args, build_sweep_nodes, check_flag_values, expand_grid, run_sweep
+
+
+class SweepTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.spec = {
+            'name': 'test_sweep',
+            'setting': 'heterogenous_requests_scenario',
+            'args': {'output_folder': self.tmp_dir.name, 'epochs': 2},
+            'train': {'workloads': {'kind': 'train_base'}, 'policies': ['DQN'],
+                      'grid': {'replay_memory_size': [100, 1000], 'replay_always_use_newest': [True, False]}},
+            'test': {'workloads': {'kind': 'test_base'}, 'policies': ['ARS', 'DQN'],
+                     'grid': {'dqn_explr_lr': [1e-5, 1e-6]}},
+        }
+        self.calls = []
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_node(self, node, n_threads):
+        self.calls.append(node.node_id)
+        if node.node_id in self.failing:
+            raise Exception('Simulation failed')
+        return len(self.calls)
+
+    def testExpandGrid(self):
+        assert expand_grid(None) == [{}]
+        assert expand_grid({'a': [1, 2], 'b': ['x', 'y']}) == [
+            {'a': 1, 'b': 'x'}, {'a': 1, 'b': 'y'}, {'a': 2, 'b': 'x'}, {'a': 2, 'b': 'y'}]
+
+    def testTestNodesDependOnTheirTrainNode(self):
+        nodes = build_sweep_nodes(self.spec)
+        assert [node.node_id for node in nodes] == ['train_0', 'test_0_0', 'test_0_1', 'train_1', 'test_1_0',
+                                                    'test_1_1', 'train_2', 'test_2_0', 'test_2_1', 'train_3',
+                                                    'test_3_0', 'test_3_1']
+        test_node = nodes[5]
+        assert test_node.dependencies == ['train_1']
+        assert test_node.args['model_folder'] == f'{nodes[3].out_path}/train/data'
+        assert test_node.args['replay_memory_size'] == 100 and test_node.args['replay_always_use_newest'] is False
+        assert test_node.args['dqn_explr_lr'] == 1e-6
+
+        assert args_to_input_args(nodes[0].args) == ['--output_folder', self.tmp_dir.name, '--epochs', '2',
+                                                     '--replay_memory_size', '100', '--replay_always_use_newest']
+
+        # False values can only keep flags unset
+        check_flag_values({'skip_plots': False, 'epochs': 2}, SimpleNamespace(skip_plots=False, epochs=2))
+        with self.assertRaises(Exception):
+            check_flag_values({'skip_plots': False}, SimpleNamespace(skip_plots=True))
+
+        del self.spec['train']
+        nodes = build_sweep_nodes(self.spec)
+        assert [node.node_id for node in nodes] == ['test_0', 'test_1']
+        assert all(node.dependencies == [] and 'model_folder' not in node.args for node in nodes)
+
+    def testInterruptedSweepResumes(self):
+        self.failing = {'train_1', 'test_2_0'}
+        state = run_sweep(self.spec, run_node=self.run_node)
+        # Tests of the failed train node are skipped
+        assert 'test_1_0' not in self.calls and len(self.calls) == 10
+        assert state.nodes['train_1']['status'] == 'failed'
+
+        self.calls = []
+        self.failing = set()
+        run_sweep(self.spec, run_node=self.run_node)
+        assert sorted(self.calls) == ['test_1_0', 'test_1_1', 'test_2_0', 'train_1']
+        assert self.calls.index('train_1') < self.calls.index('test_1_0')
+
+        # Changing the train grid reruns the changed train node and its tests
+        self.calls = []
+        self.spec['train']['grid']['replay_memory_size'] = [100, 2000]
+        run_sweep(self.spec, run_node=self.run_node)
+        assert sorted(self.calls) == ['test_2_0', 'test_2_1', 'test_3_0', 'test_3_1', 'train_2', 'train_3']
+
+    def testMainPassesSimulationArguments(self):
+        import experiment
+
+        with mock.patch.object(experiment, 'rl_experiment_wrapper') as wrapper:
+            experiment.main(['--setting', 'heterogenous_requests_scenario', '--epochs', '3', '--warmup_requests',
+                             '10'])
+        simulation_args = wrapper.call_args.args[0]
+        assert simulation_args.args.exp_scenario == 'heterogenous_requests_scenario'
+        assert simulation_args.args.epochs == 3 and simulation_args.args.warmup_requests == 10
+
+        # Sweeps take their arguments from the spec, unknown arguments fail
+        with self.assertRaises(SystemExit):
+            experiment.main(['--sweep_spec', 'spec.yaml', '--epochs', '3'])
+        with self.assertRaises(SystemExit):
+            experiment.main(['--epochs', '3', '--no_such_argument', '1'])
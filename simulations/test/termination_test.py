@@ -0,0 +1,37 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from simulations.experiment_runner import ExperimentRunner
+from simulations.simulation_args import BaseArgs
+from simulations.state import StateParser
+from simulations.workload.workload import BaseWorkload
+
+
+class TerminationTest(unittest.TestCase):
+
+    def run_experiment(self, input_args, duplication_rate: float = 0.0):
+        args = BaseArgs(input_args=input_args + ['--seed', '2']).args
+        runner = ExperimentRunner(state_parser=StateParser(num_servers=5, num_request_rates=3, poly_feat_degree=2),
+                                  trainer=SimpleNamespace(eval_mode=True))
+        workload = BaseWorkload(id_=1, utilization=0.7, arrival_model='poisson', num_requests=300,
+                                long_tasks_fraction=0.2)
+        return runner.run_experiment(args, workload=workload, service_time_model='random.expovariate',
+                                     training_data_collector=None, duplication_rate=duplication_rate)
+
+    def testSimulationEndsWithLastResponse(self):
+        for input_args, duplication_rate in [(['--selection_strategy', 'ds'], 0.0),
+                                             (['--exp_scenario', 'time_varying_service_time_servers'], 0.0),
+                                             (['--selection_strategy', 'random'], 0.5)]:
+            monitor = self.run_experiment(input_args, duplication_rate=duplication_rate)
+            # Duplicates are recorded as well
+            assert len(monitor) >= 300
+            # Periodic processes do not keep the simulation running
+            assert monitor.simulation.now == np.max(monitor.get_columns()['time'])
+            assert monitor.simulation.outstanding_requests == 0
+
+    def testSimulationDurationBoundsTheRun(self):
+        monitor = self.run_experiment(['--simulation_duration', '100'])
+        assert monitor.simulation.now == 100
+        assert len(monitor) < 300
@@ -0,0 +1,34 @@
+import unittest
+
+from simulations.benchmarks.throughput import GRIDS, case_key, compare_results, expand_cases, run_case
+
+
+class ThroughputBenchmarkTest(unittest.TestCase):
+
+    def testAxesAreVariedAroundTheBaseCase(self):
+        grid = {'base': {'num_servers': 5, 'utilization': 0.45}, 'axes': {'num_servers': [5, 20, 100],
+                                                                           'utilization': [0.7]}}
+        cases = expand_cases(grid, policies=['ARS', 'DQN'])
+        assert len(cases) == 2 * 4
+        assert {'policy': 'DQN', 'num_servers': 100, 'utilization': 0.45} in cases
+        assert len({case_key(case) for case in cases}) == len(cases)
+        assert len(expand_cases(GRIDS['quick'], policies=['ARS'])) == 2
+        # Grids can be restricted to some policies
+        assert {case['policy'] for case in expand_cases(GRIDS['cluster_size'], policies=['ARS', 'DQN'])} == {'ARS'}
+
+    def testCompareFindsRegressions(self):
+        def results(commit, rps):
+            return {'commit': commit, 'results': [
+                {'case': {'policy': policy}, 'requests_per_second': value, 'peak_rss_mb': 100.0}
+                for policy, value in rps.items()]}
+
+        base = results('a', {'ARS': 1000.0, 'DQN': 100.0})
+        new = results('b', {'ARS': 950.0, 'DQN': 50.0, 'random': 10.0})
+        assert compare_results(base, new, threshold=0.1) == [case_key({'policy': 'DQN'})]
+
+    def testRunCase(self):
+        case = {'policy': 'DQN_TRAIN', 'num_servers': 5, 'num_clients': 1, 'utilization': 0.45, 'num_requests': 200,
+                'poly_feat_degree': 1}
+        result = run_case(case, torch_threads=1)
+        assert result['requests_per_second'] > 0
+        assert result['peak_rss_mb'] > 0
@@ -0,0 +1,76 @@
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+from simulations.experiment_runner import ExperimentRunner
+from simulations.simulation_args import BaseArgs
+from simulations.state import StateParser
+from simulations.workload.access_pattern import create_access_pattern
+from simulations.workload.arrival_trace import ArrivalTrace, ClientSelector
+from simulations.workload.trace_workload import TraceWorkload
+
+
+class TraceWorkloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.trace_file = Path(self.tmp_dir.name) / 'trace.csv'
+        rng = np.random.default_rng(0)
+        self.timestamps = np.cumsum(rng.exponential(2.0, size=1000))
+        self.keys = rng.integers(0, 1000, size=1000)
+        self.sizes = rng.choice([1.0, 3.0], size=1000)
+        lines = ['timestamp,key,size,ignored'] + [f'{time!r},{key},{size},x' for time, key, size in
+                                                   zip(self.timestamps, self.keys, self.sizes)]
+        self.trace_file.write_text('\n'.join(lines) + '\n')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def arrival_trace(self, workload: TraceWorkload) -> ArrivalTrace:
+        blocks = workload.arrival_blocks(client_selector=ClientSelector([1.0, 1.0]),
+                                         access_pattern=create_access_pattern('uniform', num_servers=5))
+        return ArrivalTrace.concatenate(list(blocks))
+
+    def testChunksGiveTheWholeTrace(self):
+        workload = TraceWorkload(id_=1, trace_file=str(self.trace_file), time_scale=0.5, chunk_size=64)
+        assert workload.num_requests == 1000
+        assert workload.reference_size == self.sizes.mean()
+
+        trace = self.arrival_trace(workload)
+        # Inter arrival times across chunk boundaries follow the trace, the last request has nothing to wait for
+        np.testing.assert_allclose(trace.inter_arrival_times[:-1], np.diff(self.timestamps) * 0.5)
+        assert trace.inter_arrival_times[-1] == 0
+        np.testing.assert_array_equal(trace.first_replica_indices, self.keys % 5)
+        np.testing.assert_allclose(trace.service_time_scales, self.sizes / self.sizes.mean())
+        # The chunk size does not change the replay
+        unchunked = self.arrival_trace(TraceWorkload(id_=1, trace_file=str(self.trace_file), time_scale=0.5))
+        np.testing.assert_array_equal(trace.inter_arrival_times, unchunked.inter_arrival_times)
+
+    def testUnsortedTraceFails(self):
+        self.trace_file.write_text('timestamp\n1.0\n3.0\n2.0\n')
+        with self.assertRaises(AssertionError):
+            self.arrival_trace(TraceWorkload(id_=1, trace_file=str(self.trace_file)))
+
+    def testReplay(self):
+        args = BaseArgs(input_args=['--selection_strategy', 'random', '--replication_factor', '2',
+                                    '--seed', '1']).args
+        runner = ExperimentRunner(state_parser=StateParser(num_servers=5, num_request_rates=3, poly_feat_degree=2),
+                                  trainer=SimpleNamespace(eval_mode=True))
+        workload = TraceWorkload(id_=1, trace_file=str(self.trace_file), num_requests=800, chunk_size=100,
+                                 reference_size=1.0)
+        columns = runner.run_experiment(args, workload=workload, service_time_model='random.expovariate',
+                                        training_data_collector=None).get_columns()
+        assert len(columns['latency']) == 800
+        np.testing.assert_allclose(np.sort(columns['task_time_sent']), self.timestamps[:800] - self.timestamps[0])
+        # Timestamps are distinct, sorting by send time gives the order of the trace
+        order = np.argsort(columns['task_time_sent'])
+        # Requests go to a replica of the group of their key, the two servers from key % 5 on
+        assert np.all((columns['replica_id'][order] - self.keys[:800] % 5) % 5 < 2)
+        # Large requests take longer
+        latencies = columns['latency'][order]
+        sizes = self.sizes[:800]
+        assert latencies[sizes == 3.0].mean() > 2 * latencies[sizes == 1.0].mean()
+        assert workload.arrival_trace is None
@@ -0,0 +1,84 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from simulations.training.training_data_storage import TrainingDataWriter, chunk_file_name, \
+    iterate_training_data_chunks, list_chunk_files, read_training_data_columns, read_training_data_tensors
+
+
+class TrainingDataStorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_folder = Path(self.tmp_dir.name)
+
+        # Consecutive states, the next state of each transition is the state of the following one
+        self.states = [torch.full((1, 3), float(i)) for i in range(5)]
+        self.next_states = [torch.full((1, 3), float(i + 1)) for i in range(5)]
+        self.policies = ['ARS', 'random', 'ARS', 'DQN', 'ARS']
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write(self, chunk_size: int, append: bool = False, first_state_id: int = 0) -> TrainingDataWriter:
+        writer = TrainingDataWriter(data_folder=self.data_folder, chunk_size=chunk_size, append=append)
+        for i in range(len(self.states)):
+            writer.add(state=self.states[i], state_id=first_state_id + i, action=i % 3,
+                       next_state=self.next_states[i], next_state_id=first_state_id + i + 1, reward=-float(i),
+                       policy=self.policies[i], train_batch=i // 2)
+        writer.flush()
+        return writer
+
+    def testNextStatesAreDeduplicated(self):
+        self.write(chunk_size=10)
+        with np.load(self.data_folder / chunk_file_name(0)) as chunk:
+            # Only the last next state is not stored as a state of another transition
+            assert chunk['extra_next_state_ids'].tolist() == [5]
+            assert chunk['extra_next_states'].shape == (1, 3)
+
+    def testChunksAreFlushedWhenFull(self):
+        writer = TrainingDataWriter(data_folder=self.data_folder, chunk_size=2)
+        for i in range(3):
+            writer.add(state=self.states[i], state_id=i, action=0, next_state=self.next_states[i],
+                       next_state_id=i + 1, reward=0.0, policy='ARS', train_batch=0)
+        assert len(list_chunk_files(self.data_folder)) == 1
+        assert len(writer) == 1
+        writer.flush()
+        assert len(list_chunk_files(self.data_folder)) == 2
+        assert writer.written_transitions == 3
+
+    def testColumnsRoundTrip(self):
+        self.write(chunk_size=2)
+        columns = read_training_data_columns(self.data_folder)
+        assert columns.policies.tolist() == self.policies
+        assert columns.train_batches.tolist() == [0, 0, 1, 1, 2]
+        assert columns.actions.tolist() == [0, 1, 2, 0, 1]
+
+    def testTensorsRoundTrip(self):
+        self.write(chunk_size=2)
+        transitions = read_training_data_tensors(self.data_folder, device=torch.device('cpu'))
+        assert torch.equal(transitions.state, torch.cat(self.states))
+        # Next states crossing chunk boundaries are resolved as well
+        assert torch.equal(transitions.next_state, torch.cat(self.next_states))
+        assert transitions.action.shape == (5, 1) and transitions.action.dtype == torch.int64
+        assert transitions.reward.squeeze(1).tolist() == [0.0, -1.0, -2.0, -3.0, -4.0]
+
+    def testIterateChunksLazily(self):
+        self.write(chunk_size=2)
+        chunks = list(iterate_training_data_chunks(self.data_folder, device=torch.device('cpu')))
+        assert [len(chunk.state) for chunk in chunks] == [2, 2, 1]
+        assert torch.equal(chunks[1].next_state, torch.cat(self.next_states[2:4]))
+
+    def testAppendContinuesChunks(self):
+        self.write(chunk_size=2)
+        self.write(chunk_size=2, append=True, first_state_id=len(self.states))
+        assert len(list_chunk_files(self.data_folder)) == 6
+        assert len(read_training_data_columns(self.data_folder).states) == 10
+
+    def testWithoutAppendChunksAreReplaced(self):
+        self.write(chunk_size=2)
+        self.write(chunk_size=10)
+        assert list_chunk_files(self.data_folder) == [self.data_folder / chunk_file_name(0)]
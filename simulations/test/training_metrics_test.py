@@ -0,0 +1,44 @@
+import unittest
+
+import torch
+
+from simulations.training.training_metrics import MetricSeries, TrainingMetrics, grad_norm
+
+
+class MetricSeriesTest(unittest.TestCase):
+
+    def testSeriesIsBounded(self):
+        series = MetricSeries(max_size=8)
+        for i in range(1000):
+            series.append(float(i))
+        assert len(series) < 8
+        assert series.count == 1000
+        # Downsampling keeps the overall shape of the series
+        assert series.values == sorted(series.values)
+
+    def testSeriesStepsFollowStride(self):
+        series = MetricSeries(max_size=4)
+        for i in range(4):
+            series.append(1.0)
+        assert series.stride == 2
+        assert series.steps() == [0, 2]
+
+
+class TrainingMetricsTest(unittest.TestCase):
+
+    def testFlushAveragesWindow(self):
+        metrics = TrainingMetrics(device=torch.device('cpu'), flush_interval=2)
+        for value in [1.0, 3.0, 5.0]:
+            value = torch.tensor(value)
+            metrics.record(loss=value, norm=value, reward=value, mean_value=value)
+        assert metrics.get('loss') == [2.0, 5.0]
+
+    def testGradNormMatchesConcatenatedNorm(self):
+        model = torch.nn.Linear(4, 3)
+        model(torch.ones(2, 4)).sum().backward()
+        expected = torch.cat([param.grad.flatten() for param in model.parameters()]).norm()
+        assert torch.isclose(grad_norm(model.parameters()), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
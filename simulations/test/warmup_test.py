@@ -0,0 +1,83 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from simulations.client import DataPoint
+from simulations.experiment_runner import ExperimentRunner
+from simulations.monitor import DataPointMonitor
+from simulations.simulation_args import BaseArgs
+from simulations.state import StateParser
+from simulations.warmup import mser_truncation, warmup_end_time
+from simulations.workload.workload import BaseWorkload
+
+
+class WarmupTest(unittest.TestCase):
+
+    def testMserTruncatesTransient(self):
+        rng = np.random.default_rng(0)
+        steady_state = rng.normal(10, 1, size=2000)
+        assert mser_truncation(steady_state) < 100
+
+        # Latencies decay from 60 to the steady state over the first 300 values
+        transient = steady_state + np.maximum(0, 50 * (1 - np.arange(2000) / 300))
+        truncation = mser_truncation(transient)
+        assert truncation % 5 == 0
+        assert 200 <= truncation <= 400
+
+    def testMserOnlyUsesFasterResponses(self):
+        monitor = DataPointMonitor(simulation=SimpleNamespace(now=0.0))
+        rng = np.random.default_rng(0)
+        for i in range(1000):
+            # The slower duplicate responses have a long transient, the faster responses do not
+            for is_faster_response, latency in [(True, rng.normal(10, 1)), (False, 10 + max(0, 500 - i))]:
+                monitor.observe(DataPoint(state=SimpleNamespace(is_long_request=False), task_time_sent=float(i),
+                                          q_values=None, latency=latency, replica_id=0, is_duplicate=True,
+                                          is_faster_response=is_faster_response, utilization=0.45,
+                                          long_tasks_fraction=0.2, request_index=i))
+        assert warmup_end_time(monitor, warmup_time=0.0, warmup_mser=True) < 100
+
+    def run_experiment(self, input_args, seed: int = 2):
+        args = BaseArgs(input_args=input_args + ['--seed', str(seed)]).args
+        runner = ExperimentRunner(state_parser=StateParser(num_servers=5, num_request_rates=3, poly_feat_degree=2),
+                                  trainer=SimpleNamespace(eval_mode=True))
+        workload = BaseWorkload(id_=1, utilization=0.7, arrival_model='poisson', num_requests=500,
+                                long_tasks_fraction=0.2)
+        return runner.run_experiment(args, workload=workload, service_time_model='random.expovariate',
+                                     training_data_collector=None).get_columns()
+
+    def testWarmupIsNotRecorded(self):
+        for seed in [2, 3, 8, 11]:
+            columns = self.run_experiment([], seed=seed)
+            assert len(columns['latency']) == 500
+            np.testing.assert_array_equal(np.sort(columns['request_index']), np.arange(500))
+
+            # Exactly the first requests are dropped, even if later ones are sent at the same time
+            warmup_columns = self.run_experiment(['--warmup_requests', '100'], seed=seed)
+            assert len(warmup_columns['latency']) == 400
+            assert warmup_columns['request_index'].min() == 100
+            # The recorded requests are the same as in the run without warmup
+            recorded = columns['request_index'] >= 100
+            np.testing.assert_array_equal(warmup_columns['latency'], columns['latency'][recorded])
+
+        columns = self.run_experiment([])
+        time_columns = self.run_experiment(['--warmup_time', '400', '--warmup_requests', '10'])
+        assert time_columns['task_time_sent'].min() >= 400
+        assert len(time_columns['latency']) == np.sum(columns['task_time_sent'] >= 400)
+
+        mser_columns = self.run_experiment(['--warmup_mser'])
+        assert 0 < len(mser_columns['latency']) <= 500
+
+        # The printed summary checks the number of recorded requests
+        print_columns = self.run_experiment(['--warmup_requests', '100', '--print'])
+        assert len(print_columns['latency']) == 400
+
+    def testWarmupLongerThanWorkloadFailsBeforeSimulating(self):
+        args = BaseArgs(input_args=['--warmup_requests', '500']).args
+        runner = ExperimentRunner(state_parser=StateParser(num_servers=5, num_request_rates=3, poly_feat_degree=2),
+                                  trainer=SimpleNamespace(eval_mode=True))
+        workload = BaseWorkload(id_=1, utilization=0.7, arrival_model='poisson', num_requests=500)
+        with self.assertRaises(AssertionError):
+            runner.start_experiment(args, workload=workload, service_time_model='random.expovariate',
+                                    training_data_collector=None)
+        assert runner.simulation is None
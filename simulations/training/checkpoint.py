@@ -0,0 +1,97 @@
+import concurrent.futures
+import os
+import random
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import torch
+
+# Training checkpoints are taken between episodes. Every episode creates a new simulation seeded from the episode
+# index, so a checkpoint holds the trainer state, the global random states, the position in the training loop and
+# the monitor columns of the finished episodes. Files are written by a background thread from snapshots, the next
+# episode does not wait for the disk.
+
+CHECKPOINT_FOLDER = 'checkpoints'
+CHECKPOINT_FILE = 'checkpoint.pt'
+EPISODES_FOLDER = 'episodes'
+
+
+def rng_states() -> Dict[str, Any]:
+    states = {
+        'random': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        states['cuda'] = torch.cuda.get_rng_state_all()
+    return states
+
+
+def set_rng_states(states: Dict[str, Any]) -> None:
+    random.setstate(states['random'])
+    np.random.set_state(states['numpy'])
+    torch.set_rng_state(states['torch'])
+    if 'cuda' in states and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(states['cuda'])
+
+
+def episode_file_name(policy: str, epoch_num: int) -> str:
+    return f'{policy}_{epoch_num}.npz'
+
+
+def atomic_save(save: Callable[[Path], None], path: Path) -> None:
+    # Interrupted writes never replace the previous file
+    tmp_path = path.parent / f'{path.stem}.tmp{path.suffix}'
+    save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+class CheckpointWriter:
+    """
+    Writes checkpoints and episode columns in a background thread, in the order they were submitted.
+    Submitted objects must not be changed afterwards (see Trainer.checkpoint_state).
+    """
+
+    def __init__(self, checkpoint_folder: Path) -> None:
+        self.checkpoint_folder = checkpoint_folder
+        os.makedirs(checkpoint_folder / EPISODES_FOLDER, exist_ok=True)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.pending: List[concurrent.futures.Future] = []
+
+    def submit(self, save: Callable[[Path], None], path: Path) -> None:
+        # Errors of earlier writes are raised here instead of getting lost
+        for future in [future for future in self.pending if future.done()]:
+            self.pending.remove(future)
+            future.result()
+        self.pending.append(self.executor.submit(atomic_save, save, path))
+
+    def write_episode(self, policy: str, epoch_num: int, columns: Dict[str, np.ndarray]) -> str:
+        file_name = episode_file_name(policy, epoch_num)
+        self.submit(lambda path: np.savez(path, **columns), self.checkpoint_folder / EPISODES_FOLDER / file_name)
+        return file_name
+
+    def write_checkpoint(self, checkpoint: Dict[str, Any]) -> None:
+        self.submit(lambda path: torch.save(checkpoint, path), self.checkpoint_folder / CHECKPOINT_FILE)
+
+    def wait(self) -> None:
+        for future in self.pending:
+            future.result()
+        self.pending = []
+
+    def close(self) -> None:
+        self.wait()
+        self.executor.shutdown()
+
+
+def load_checkpoint(checkpoint_folder: Path) -> Dict[str, Any] | None:
+    path = checkpoint_folder / CHECKPOINT_FILE
+    if not path.exists():
+        return None
+    # Checkpoints hold python objects (replay memory, random states), only load your own
+    return torch.load(path, weights_only=False)
+
+
+def load_episode_columns(checkpoint_folder: Path, file_name: str) -> Dict[str, np.ndarray]:
+    with np.load(checkpoint_folder / EPISODES_FOLDER / file_name) as data:
+        return {column: data[column] for column in data.files}
@@ -1,16 +1,17 @@
+import copy
 import json
 import os
 import math
 from collections import namedtuple
 from pathlib import Path
-from typing import Dict
+from typing import Any, Dict
 
 import torch
 import torch.nn as nn
 import torch.optim as optim
 import torch.nn.functional as F
-from matplotlib import pyplot as plt
 
+from simulations.training.training_metrics import TrainingMetrics, grad_norm
 from simulations.training.replay_memory import ReplayMemoryWithSummary, Transition
 from simulations.models.dqn import DQN, SummaryStats
 from simulations.state import State, StateParser
@@ -49,10 +50,7 @@ class Trainer:
         self.explore_actions_episode = 0
         self.exploit_actions_episode = 0
 
-        self.losses = []
-        self.grads = []
-        self.mean_value = []
-        self.reward_logs = []
+        self.training_metrics = TrainingMetrics(device=self.device)
 
         # num servers
         self.n_actions = n_actions
@@ -108,6 +106,46 @@ class Trainer:
         self.save_model_trainer_stats(model_folder)
         self.memory.save_to_file(model_folder=model_folder)
 
+    def checkpoint_state(self) -> Dict[str, Any]:
+        # Copies of everything that changes during training, the training can go on while the copy is written.
+        # Taken between episodes, the pending tasks of an episode are not part of it.
+        return {
+            'policy_net': copy.deepcopy(self.policy_net.state_dict()),
+            'target_net': copy.deepcopy(self.target_net.state_dict()),
+            'optimizer': copy.deepcopy(self.optimizer.state_dict()),
+            'scheduler': copy.deepcopy(self.scheduler.state_dict()),
+            'feature_stats': copy.deepcopy(vars(self.feature_stats)),
+            'target_feature_stats': copy.deepcopy(vars(self.target_net.summary)),
+            'reward_stats': copy.deepcopy(vars(self.reward_stats)),
+            # Stored transitions are never modified, copying the list is enough
+            'memory': {'memory': list(self.memory.memory), 'index': self.memory.index, 'size': self.memory.size,
+                       'newest': self.memory.newest},
+            'training_metrics': copy.deepcopy(self.training_metrics),
+            'steps_done': self.steps_done,
+            'actions_chosen': dict(self.actions_chosen),
+            'task_id_to_action': dict(self.task_id_to_action),
+            'task_id_to_next_state': dict(self.task_id_to_next_state),
+            'task_id_to_rewards': dict(self.task_id_to_rewards),
+        }
+
+    def load_checkpoint_state(self, state: Dict[str, Any]) -> None:
+        self.policy_net.load_state_dict(state['policy_net'])
+        self.target_net.load_state_dict(state['target_net'])
+        self.optimizer.load_state_dict(state['optimizer'])
+        self.scheduler.load_state_dict(state['scheduler'])
+        # Updated in place, the policy net and the replay memory share the feature stats
+        vars(self.feature_stats).update(state['feature_stats'])
+        vars(self.target_net.summary).update(state['target_feature_stats'])
+        vars(self.reward_stats).update(state['reward_stats'])
+        assert len(state['memory']['memory']) == self.memory.max_size, 'Checkpoint has a different replay memory size'
+        vars(self.memory).update(state['memory'])
+        self.training_metrics = state['training_metrics']
+        self.steps_done = state['steps_done']
+        self.actions_chosen = defaultdict(int, state['actions_chosen'])
+        self.task_id_to_action = state['task_id_to_action']
+        self.task_id_to_next_state = state['task_id_to_next_state']
+        self.task_id_to_rewards = state['task_id_to_rewards']
+
     def set_model_folder(self, model_folder: Path) -> None:
         self.model_folder = model_folder
 
@@ -277,9 +315,6 @@ class Trainer:
 
         expected_state_action_values = (next_state_values * self.GAMMA) + reward_batch
 
-        self.reward_logs.append(reward_batch.mean().item())
-        self.mean_value.append(next_state_values.mean().item())
-
         # Compute Huber loss
         criterion = nn.SmoothL1Loss()
 
@@ -289,15 +324,8 @@ class Trainer:
         self.optimizer.zero_grad()
         loss.backward()
 
-        grads = [
-            param.grad.detach().flatten()
-            for param in self.policy_net.parameters()
-            if param.grad is not None
-        ]
-        norm = torch.cat(grads).norm()
-
-        self.losses.append(loss.item())
-        self.grads.append(norm.item())
+        self.training_metrics.record(loss=loss, norm=grad_norm(self.policy_net.parameters()),
+                                     reward=reward_batch.mean(), mean_value=next_state_values.mean())
 
         # In-place gradient clipping
         torch.nn.utils.clip_grad_value_(self.policy_net.parameters(), 1)
@@ -312,45 +340,13 @@ class Trainer:
         self.last_task = None
 
     def reset_model_training_stats(self) -> None:
-        self.losses = []
-        self.grads = []
-        self.mean_value = []
-        self.reward_logs = []
+        self.training_metrics.reset()
 
         self.steps_done = 0
         self.actions_chosen = defaultdict(int)
 
     def plot_grads_and_losses(self, plot_path: Path, file_prefix: str):
-        PLOT_OUT_FOLDER = 'model_stats'
-
-        os.makedirs(plot_path / PLOT_OUT_FOLDER, exist_ok=True)
-        os.makedirs(plot_path / f'pdfs' / PLOT_OUT_FOLDER, exist_ok=True)
-
-        fig, ax = plt.subplots(figsize=(8, 4), dpi=200, nrows=1, ncols=1, sharex='all')
-        plt.clf()
-        plt.plot(range(len(self.losses)), self.losses)
-        plt.savefig(plot_path / f'pdfs/{PLOT_OUT_FOLDER}/{file_prefix}_losses.pdf')
-        plt.savefig(plot_path / f'{PLOT_OUT_FOLDER}/{file_prefix}_losses.jpg')
-        plt.close()
-
-        plt.clf()
-        fig, ax = plt.subplots(figsize=(8, 4), dpi=200, nrows=1, ncols=1, sharex='all')
-        plt.plot(range(len(self.grads)), self.grads)
-        plt.savefig(plot_path / f'pdfs/{PLOT_OUT_FOLDER}/{file_prefix}_grads.pdf')
-        plt.savefig(plot_path / f'{PLOT_OUT_FOLDER}/{file_prefix}_grads.jpg')
-        plt.close()
-
-        fig, ax = plt.subplots(figsize=(8, 4), dpi=200, nrows=1, ncols=1, sharex='all')
-        plt.plot(range(len(self.reward_logs)), self.reward_logs)
-        plt.savefig(plot_path / f'pdfs/{PLOT_OUT_FOLDER}/{file_prefix}_rewards.pdf')
-        plt.savefig(plot_path / f'{PLOT_OUT_FOLDER}/{file_prefix}_rewards.jpg')
-        plt.close()
-
-        fig, ax = plt.subplots(figsize=(8, 4), dpi=200, nrows=1, ncols=1, sharex='all')
-        plt.plot(range(len(self.mean_value)), self.mean_value)
-        plt.savefig(plot_path / f'pdfs/{PLOT_OUT_FOLDER}/{file_prefix}_mean_value.pdf')
-        plt.savefig(plot_path / f'{PLOT_OUT_FOLDER}/{file_prefix}_mean_value.jpg')
-        plt.close()
+        self.training_metrics.plot(plot_path=plot_path, file_prefix=file_prefix)
 
     def print_weights(self):
         self.policy_net.print_weights()
@@ -1,5 +1,15 @@
 from collections import namedtuple
 
+import torch
+
 
 NormStats = namedtuple('NormStats',
                        ('reward_mean', 'reward_std', 'feature_mean', 'feature_std'))
+
+
+def compute_norm_stats(transitions) -> NormStats:
+    # transitions is a Transition of batch tensors, std is the sample standard deviation like pandas' std()
+    return NormStats(reward_mean=transitions.reward.mean().reshape(1),
+                     reward_std=transitions.reward.std().reshape(1),
+                     feature_mean=transitions.state.mean(dim=0),
+                     feature_std=transitions.state.std(dim=0))
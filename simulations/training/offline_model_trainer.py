@@ -3,14 +3,14 @@ import os
 import math
 from collections import namedtuple
 from pathlib import Path
-from typing import List
+from typing import Iterator, List
 
 import torch
 import torch.nn as nn
 import torch.optim as optim
 import torch.nn.functional as F
-from matplotlib import pyplot as plt
 
+from simulations.training.training_metrics import TrainingMetrics, grad_norm
 from simulations.training.replay_memory import ReplayMemory, Transition
 from simulations.models.dqn import DQN
 from simulations.state import State, StateParser
@@ -22,6 +22,17 @@ from simulations.training.norm_stats import NormStats
 MODEL_TRAINER_JSON = 'model_trainer.json'
 
 
+def iterate_minibatches(transitions: Transition, batch_size: int, shuffle: bool = True) -> Iterator[Transition]:
+    # DataLoader-style iteration over a Transition of batch tensors, every minibatch is a single gather
+    num_transitions = transitions.state.size(0)
+    if shuffle:
+        indices = torch.randperm(num_transitions, device=transitions.state.device)
+    else:
+        indices = torch.arange(num_transitions, device=transitions.state.device)
+    for batch_indices in indices.split(batch_size):
+        yield Transition(*(tensor[batch_indices] for tensor in transitions))
+
+
 class OfflineTrainer:
     def __init__(self, state_parser: StateParser, model_structure: str, n_actions: int,
                  replay_always_use_newest: bool, replay_memory_size: int,
@@ -46,10 +57,7 @@ class OfflineTrainer:
         self.explore_actions_episode = 0
         self.exploit_actions_episode = 0
 
-        self.losses = []
-        self.grads = []
-        self.mean_value = []
-        self.reward_logs = []
+        self.training_metrics = TrainingMetrics(device=self.device)
 
         # num servers
         self.n_actions = n_actions
@@ -161,15 +169,44 @@ class OfflineTrainer:
         self.actions_chosen[action_chosen.item()] += 1
         return action_chosen
 
+    def set_norm_stats(self, norm_stats: NormStats) -> None:
+        self.reward_mean = norm_stats.reward_mean
+        self.feature_mean = norm_stats.feature_mean
+        self.reward_std = norm_stats.reward_std
+        self.feature_std = norm_stats.feature_std
+
     def run_offline_training_epoch(self, transitions: List[Transition], norm_stats: NormStats = None) -> None:
         if norm_stats is not None:
-            self.reward_mean = norm_stats.reward_mean
-            self.feature_mean = norm_stats.feature_mean
-            self.reward_std = norm_stats.reward_std
-            self.feature_std = norm_stats.feature_std
+            self.set_norm_stats(norm_stats=norm_stats)
         for transition in transitions:
             self.training_step(transition=transition)
 
+    def run_offline_training(self, transitions: Transition, norm_stats: NormStats, epochs: int,
+                             target_update_interval: int) -> None:
+        """
+        Trains on a whole dataset given as a Transition of batch tensors (one row per transition). The data is
+        normalized once and served in shuffled minibatches for the given number of epochs. The target network is
+        synced with the policy network every target_update_interval optimization steps, or soft updated after
+        every step if target_update_interval is 0.
+        """
+        self.set_norm_stats(norm_stats=norm_stats)
+        norm_transitions = self.normalize_transition(transition=Transition(
+            state=transitions.state.to(self.device), action=transitions.action.to(self.device),
+            next_state=transitions.next_state.to(self.device), reward=transitions.reward.to(self.device)))
+
+        optimization_steps = 0
+        for epoch in range(epochs):
+            print(f'Offline training epoch {epoch + 1}/{epochs}')
+            for batch in iterate_minibatches(transitions=norm_transitions, batch_size=self.BATCH_SIZE):
+                self.optimize_on_batch(state_batch=batch.state, action_batch=batch.action,
+                                       next_state_batch=batch.next_state, reward_batch=batch.reward)
+                optimization_steps += 1
+
+                if target_update_interval == 0:
+                    self.soft_update_target_net()
+                elif optimization_steps % target_update_interval == 0:
+                    self.target_net.load_state_dict(self.policy_net.state_dict())
+
     def normalize_state(self, state):
         epsilon = 1e-8  # A small value to avoid division by zero
         norm_state = (state - self.feature_mean) / (self.feature_std + epsilon)
@@ -190,6 +227,9 @@ class OfflineTrainer:
         # Perform one step of the optimization (on the policy network)
         self.optimize_model()
 
+        self.soft_update_target_net()
+
+    def soft_update_target_net(self) -> None:
         # Soft update of the target network's weights
         # θ′ ← τ θ + (1 −τ )θ′
         tau = self.TAU + (1 - self.TAU) * math.exp(-1. * self.steps_done / self.TAU_DECAY)
@@ -220,6 +260,12 @@ class OfflineTrainer:
 
         # reward_batch = (reward_batch - self.reward_mean) / self.reward_std
 
+        self.optimize_on_batch(state_batch=state_batch, action_batch=action_batch,
+                               next_state_batch=non_final_next_states, reward_batch=reward_batch,
+                               non_final_mask=non_final_mask)
+
+    def optimize_on_batch(self, state_batch: torch.Tensor, action_batch: torch.Tensor, next_state_batch: torch.Tensor,
+                          reward_batch: torch.Tensor, non_final_mask: torch.Tensor | None = None) -> None:
         # Compute Q(s_t, a) - the model computes Q(s_t), then we select the
         # columns of actions taken. These are the actions which would've been taken
         # for each batch state according to policy_net
@@ -230,17 +276,17 @@ class OfflineTrainer:
         # on the "older" target_net; selecting their best reward with max(1).values
         # This is merged based on the mask, such that we'll have either the expected
         # state value or 0 in case the state was final.
-        next_state_values = torch.zeros(self.BATCH_SIZE, device=self.device)
         with torch.no_grad():
-            next_state_values[non_final_mask] = self.target_net(non_final_next_states).max(1).values
+            if non_final_mask is None:
+                next_state_values = self.target_net(next_state_batch).max(1).values
+            else:
+                next_state_values = torch.zeros(state_batch.size(0), device=self.device)
+                next_state_values[non_final_mask] = self.target_net(next_state_batch).max(1).values
         # Compute the expected Q values
         next_state_values = next_state_values.unsqueeze(1)
 
         expected_state_action_values = (next_state_values * self.GAMMA) + reward_batch
 
-        self.reward_logs.append(reward_batch.mean().item())
-        self.mean_value.append(next_state_values.mean().item())
-
         # Compute Huber loss
         criterion = nn.SmoothL1Loss()
 
@@ -250,15 +296,8 @@ class OfflineTrainer:
         self.optimizer.zero_grad()
         loss.backward()
 
-        grads = [
-            param.grad.detach().flatten()
-            for param in self.policy_net.parameters()
-            if param.grad is not None
-        ]
-        norm = torch.cat(grads).norm()
-
-        self.losses.append(loss.item())
-        self.grads.append(norm.item())
+        self.training_metrics.record(loss=loss, norm=grad_norm(self.policy_net.parameters()),
+                                     reward=reward_batch.mean(), mean_value=next_state_values.mean())
 
         # In-place gradient clipping
         torch.nn.utils.clip_grad_value_(self.policy_net.parameters(), 1)
@@ -269,45 +308,13 @@ class OfflineTrainer:
         self.exploit_actions_episode = 0
 
     def reset_training_stats(self) -> None:
-        self.losses = []
-        self.grads = []
-        self.mean_value = []
-        self.reward_logs = []
+        self.training_metrics.reset()
 
         self.steps_done = 0
         self.actions_chosen = defaultdict(int)
 
     def plot_grads_and_losses(self, plot_path: Path, file_prefix: str):
-        PLOT_OUT_FOLDER = 'model_stats'
-
-        os.makedirs(plot_path / PLOT_OUT_FOLDER, exist_ok=True)
-        os.makedirs(plot_path / f'pdfs' / PLOT_OUT_FOLDER, exist_ok=True)
-
-        fig, ax = plt.subplots(figsize=(8, 4), dpi=200, nrows=1, ncols=1, sharex='all')
-        plt.clf()
-        plt.plot(range(len(self.losses)), self.losses)
-        plt.savefig(plot_path / f'pdfs/{PLOT_OUT_FOLDER}/{file_prefix}_losses.pdf')
-        plt.savefig(plot_path / f'{PLOT_OUT_FOLDER}/{file_prefix}_losses.jpg')
-        plt.close()
-
-        plt.clf()
-        fig, ax = plt.subplots(figsize=(8, 4), dpi=200, nrows=1, ncols=1, sharex='all')
-        plt.plot(range(len(self.grads)), self.grads)
-        plt.savefig(plot_path / f'pdfs/{PLOT_OUT_FOLDER}/{file_prefix}_grads.pdf')
-        plt.savefig(plot_path / f'{PLOT_OUT_FOLDER}/{file_prefix}_grads.jpg')
-        plt.close()
-
-        fig, ax = plt.subplots(figsize=(8, 4), dpi=200, nrows=1, ncols=1, sharex='all')
-        plt.plot(range(len(self.reward_logs)), self.reward_logs)
-        plt.savefig(plot_path / f'pdfs/{PLOT_OUT_FOLDER}/{file_prefix}_rewards.pdf')
-        plt.savefig(plot_path / f'{PLOT_OUT_FOLDER}/{file_prefix}_rewards.jpg')
-        plt.close()
-
-        fig, ax = plt.subplots(figsize=(8, 4), dpi=200, nrows=1, ncols=1, sharex='all')
-        plt.plot(range(len(self.mean_value)), self.mean_value)
-        plt.savefig(plot_path / f'pdfs/{PLOT_OUT_FOLDER}/{file_prefix}_mean_value.pdf')
-        plt.savefig(plot_path / f'{PLOT_OUT_FOLDER}/{file_prefix}_mean_value.jpg')
-        plt.close()
+        self.training_metrics.plot(plot_path=plot_path, file_prefix=file_prefix)
 
     def print_weights(self):
         self.policy_net.print_weights()
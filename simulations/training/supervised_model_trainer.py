@@ -7,14 +7,14 @@ from matplotlib import pyplot as plt
 
 from simulations.models.classifier import Classifier
 from simulations.models.dqn import DQN
-from simulations.data.csv_dataset import CSVDataset
+from simulations.data.memmap_dataset import MemmapDataset, batch_loader
 from simulations.state import State, StateParser
-import torch.utils.data.dataloader as dataloader
 
 
 class SupervisedModelTrainer:
     def __init__(self, n_labels, out_folder: Path, data_path: Path, state_parser: StateParser, seed: int,
-                 target_col: str = 'Replica', print_interval: int = 200, batch_size=128,  lr=1e-4) -> None:
+                 target_col: str = 'Replica', print_interval: int = 200, batch_size=128,  lr=1e-4,
+                 num_workers: int = 0) -> None:
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
         self.seed = seed
@@ -22,7 +22,7 @@ class SupervisedModelTrainer:
         self.state_parser = state_parser
         self.print_interval = print_interval
 
-        self.trainset = CSVDataset(
+        self.trainset = MemmapDataset(
             mode='train',
             data_path=data_path,
             seed=seed,
@@ -30,9 +30,9 @@ class SupervisedModelTrainer:
             transform=torch.from_numpy
         )
 
-        self.trainloader = dataloader.DataLoader(self.trainset, batch_size=batch_size, shuffle=True)
+        self.trainloader = batch_loader(self.trainset, batch_size=batch_size, shuffle=True, num_workers=num_workers)
 
-        self.testset = CSVDataset(
+        self.testset = MemmapDataset(
             mode='test',
             data_path=data_path,
             seed=seed,
@@ -40,7 +40,7 @@ class SupervisedModelTrainer:
             transform=torch.from_numpy
         )
 
-        self.testloader = dataloader.DataLoader(self.testset,  batch_size=batch_size, shuffle=True)
+        self.testloader = batch_loader(self.testset, batch_size=batch_size, shuffle=True, num_workers=num_workers)
 
         # val_data = CSVDataset(
         #     mode='val',
@@ -0,0 +1,215 @@
+import os
+from collections import namedtuple
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+import numpy as np
+import torch
+
+from simulations.training.replay_memory import Transition
+
+CHUNK_FILE_PREFIX = 'chunk_'
+CHUNK_FILE_SUFFIX = '.npz'
+DEFAULT_CHUNK_SIZE = 10000
+
+# Columns of the stored transitions, states are kept once and next states reference them by state id
+TrainingDataColumns = namedtuple('TrainingDataColumns',
+                                 ('states', 'state_ids', 'actions', 'next_state_ids', 'rewards', 'policies',
+                                  'train_batches'))
+
+
+def chunk_file_name(chunk_index: int) -> str:
+    return f'{CHUNK_FILE_PREFIX}{chunk_index:05d}{CHUNK_FILE_SUFFIX}'
+
+
+def list_chunk_files(data_folder: Path) -> List[Path]:
+    if not os.path.isdir(data_folder):
+        return []
+    return sorted(data_folder / file_name for file_name in os.listdir(data_folder)
+                  if file_name.startswith(CHUNK_FILE_PREFIX) and file_name.endswith(CHUNK_FILE_SUFFIX))
+
+
+def has_npz_training_data(data_folder: Path) -> bool:
+    return len(list_chunk_files(data_folder)) > 0
+
+
+def write_training_data_chunk(file_path: Path, states: np.ndarray, state_ids: np.ndarray, actions: np.ndarray,
+                              next_state_ids: np.ndarray, extra_next_states: np.ndarray,
+                              extra_next_state_ids: np.ndarray, rewards: np.ndarray, policies: List[str],
+                              train_batches: np.ndarray, compress: bool = False) -> None:
+    # Policies are stored as codes into a small table of names to avoid pickled object arrays
+    policy_names, policy_codes = np.unique(np.asarray(policies, dtype=str), return_inverse=True)
+
+    save = np.savez_compressed if compress else np.savez
+    # Write to a temporary file first so that an interrupted write never leaves a truncated chunk behind
+    tmp_file_path = file_path.with_name(file_path.name + '.tmp')
+    with open(tmp_file_path, 'wb') as f:
+        save(f,
+             states=np.asarray(states, dtype=np.float32),
+             state_ids=np.asarray(state_ids, dtype=np.int64),
+             actions=np.asarray(actions, dtype=np.int64),
+             next_state_ids=np.asarray(next_state_ids, dtype=np.int64),
+             extra_next_states=np.asarray(extra_next_states, dtype=np.float32),
+             extra_next_state_ids=np.asarray(extra_next_state_ids, dtype=np.int64),
+             rewards=np.asarray(rewards, dtype=np.float32),
+             policy_codes=policy_codes.astype(np.int32),
+             policy_names=policy_names,
+             train_batches=np.asarray(train_batches, dtype=np.int64))
+    os.replace(tmp_file_path, file_path)
+
+
+def stack_rows(rows: List[torch.Tensor], n_features: int) -> np.ndarray:
+    if len(rows) == 0:
+        return np.zeros((0, n_features), dtype=np.float32)
+    return torch.cat([row.reshape(1, -1) for row in rows]).cpu().numpy()
+
+
+class TrainingDataWriter:
+    """
+    Append-only sink for collected transitions. Transitions are buffered until chunk_size of them are complete
+    and then written as one self-contained chunk: next states that are the state of another transition in the
+    same chunk are only referenced by their state id, all others are stored explicitly.
+
+    With append=False the chunks already in the folder are replaced on the first write, otherwise the chunk
+    numbering continues after them.
+    """
+
+    def __init__(self, data_folder: Path, chunk_size: int = DEFAULT_CHUNK_SIZE, append: bool = False,
+                 compress: bool = False) -> None:
+        assert chunk_size > 0
+        self.data_folder = data_folder
+        self.chunk_size = chunk_size
+        self.append = append
+        self.compress = compress
+
+        self.next_chunk_index = None
+        self.written_transitions = 0
+        self.clear_buffer()
+
+    def clear_buffer(self) -> None:
+        self.states = []
+        self.state_ids = []
+        self.actions = []
+        self.next_states = []
+        self.next_state_ids = []
+        self.rewards = []
+        self.policies = []
+        self.train_batches = []
+
+    def open(self) -> None:
+        # Deferred until the first write so that runs which do not collect data leave the folder untouched
+        os.makedirs(self.data_folder, exist_ok=True)
+        chunk_files = list_chunk_files(self.data_folder)
+        if self.append:
+            self.next_chunk_index = len(chunk_files)
+        else:
+            for file_path in chunk_files:
+                os.remove(file_path)
+            self.next_chunk_index = 0
+
+    def add(self, state: torch.Tensor, state_id: int, action: int, next_state: torch.Tensor, next_state_id: int,
+            reward: float, policy: str, train_batch: int) -> None:
+        self.states.append(state)
+        self.state_ids.append(state_id)
+        self.actions.append(action)
+        self.next_states.append(next_state)
+        self.next_state_ids.append(next_state_id)
+        self.rewards.append(reward)
+        self.policies.append(policy)
+        self.train_batches.append(train_batch)
+
+        if len(self.states) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if len(self.states) == 0:
+            return
+        if self.next_chunk_index is None:
+            self.open()
+
+        known_state_ids = set(self.state_ids)
+        extra_next_states = []
+        extra_next_state_ids = []
+        for next_state, next_state_id in zip(self.next_states, self.next_state_ids):
+            if next_state_id not in known_state_ids:
+                known_state_ids.add(next_state_id)
+                extra_next_states.append(next_state)
+                extra_next_state_ids.append(next_state_id)
+
+        n_features = self.states[0].numel()
+        write_training_data_chunk(
+            file_path=self.data_folder / chunk_file_name(self.next_chunk_index),
+            states=stack_rows(self.states, n_features=n_features),
+            state_ids=self.state_ids,
+            actions=self.actions,
+            next_state_ids=self.next_state_ids,
+            extra_next_states=stack_rows(extra_next_states, n_features=n_features),
+            extra_next_state_ids=extra_next_state_ids,
+            rewards=self.rewards,
+            policies=self.policies,
+            train_batches=self.train_batches,
+            compress=self.compress)
+
+        self.next_chunk_index += 1
+        self.written_transitions += len(self.states)
+        self.clear_buffer()
+
+    def __len__(self) -> int:
+        # Number of buffered transitions that are not written yet
+        return len(self.states)
+
+
+def read_training_data_chunk(file_path: Path) -> Tuple[TrainingDataColumns, np.ndarray]:
+    # Returns the transition columns of a chunk and the resolved next state of every transition
+    with np.load(file_path) as chunk:
+        columns = TrainingDataColumns(states=chunk['states'], state_ids=chunk['state_ids'],
+                                      actions=chunk['actions'], next_state_ids=chunk['next_state_ids'],
+                                      rewards=chunk['rewards'],
+                                      policies=chunk['policy_names'][chunk['policy_codes']],
+                                      train_batches=chunk['train_batches'])
+        next_states = resolve_next_states(next_state_ids=columns.next_state_ids,
+                                          state_table=np.concatenate([columns.states, chunk['extra_next_states']]),
+                                          state_table_ids=np.concatenate([columns.state_ids,
+                                                                          chunk['extra_next_state_ids']]))
+
+    # Make sure that data is aligned properly
+    assert all(len(column) == len(columns.states) for column in columns)
+    return columns, next_states
+
+
+def resolve_next_states(next_state_ids: np.ndarray, state_table: np.ndarray, state_table_ids: np.ndarray) -> np.ndarray:
+    # Look up the rows of all next states at once
+    order = np.argsort(state_table_ids, kind='stable')
+    sorted_ids = state_table_ids[order]
+    positions = np.minimum(np.searchsorted(sorted_ids, next_state_ids), len(sorted_ids) - 1)
+    assert np.all(sorted_ids[positions] == next_state_ids), 'Training data references next states that were not stored'
+    return state_table[order[positions]]
+
+
+def columns_to_transitions(columns: TrainingDataColumns, next_states: np.ndarray, device: torch.device) -> Transition:
+    return Transition(state=torch.from_numpy(columns.states).to(device),
+                      action=torch.from_numpy(columns.actions).unsqueeze(1).to(device),
+                      next_state=torch.from_numpy(next_states).to(device),
+                      reward=torch.from_numpy(columns.rewards).unsqueeze(1).to(device))
+
+
+def iterate_training_data_chunks(data_folder: Path, device: torch.device) -> Iterator[Transition]:
+    # Lazily loads one chunk at a time as a Transition of batch tensors
+    for file_path in list_chunk_files(data_folder):
+        columns, next_states = read_training_data_chunk(file_path)
+        yield columns_to_transitions(columns=columns, next_states=next_states, device=device)
+
+
+def read_training_data_columns(data_folder: Path) -> TrainingDataColumns:
+    chunks = [read_training_data_chunk(file_path)[0] for file_path in list_chunk_files(data_folder)]
+    assert len(chunks) > 0, f'No training data chunks found in {data_folder}'
+    return TrainingDataColumns(*[np.concatenate(column) for column in zip(*chunks)])
+
+
+def read_training_data_tensors(data_folder: Path, device: torch.device) -> Transition:
+    # Loads all transitions as a Transition of contiguous batch tensors (one row per transition)
+    chunks = [read_training_data_chunk(file_path) for file_path in list_chunk_files(data_folder)]
+    assert len(chunks) > 0, f'No training data chunks found in {data_folder}'
+    columns = TrainingDataColumns(*[np.concatenate(column) for column in zip(*[chunk[0] for chunk in chunks])])
+    next_states = np.concatenate([chunk[1] for chunk in chunks])
+    return columns_to_transitions(columns=columns, next_states=next_states, device=device)
@@ -0,0 +1,127 @@
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import torch
+from matplotlib import pyplot as plt
+
+# Metric name -> file suffix used by the plots (kept identical to the previous per-list plots)
+METRIC_FILE_SUFFIXES = {
+    'loss': 'losses',
+    'grad_norm': 'grads',
+    'reward': 'rewards',
+    'mean_value': 'mean_value',
+}
+
+DEFAULT_MAX_SIZE = 10000
+DEFAULT_FLUSH_INTERVAL = 100
+
+
+def grad_norm(parameters: Iterable[torch.nn.Parameter]) -> torch.Tensor:
+    # Same computation as clip_grad_norm_, without flattening and concatenating all gradients
+    grads = [param.grad.detach() for param in parameters if param.grad is not None]
+    if len(grads) == 0:
+        return torch.zeros(())
+    return torch.linalg.vector_norm(torch.stack(torch._foreach_norm(grads)))
+
+
+class MetricSeries:
+    """
+    Series with a fixed number of stored points. Once full, neighbouring points are averaged pairwise and
+    every stored point represents twice as many appended values (stride), so long runs keep their overall
+    shape without growing in memory.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        assert max_size >= 2 and max_size % 2 == 0, 'max_size must be an even number >= 2'
+        self.max_size = max_size
+        self.values: List[float] = []
+        self.stride = 1
+        self.count = 0
+        self._pending_sum = 0.0
+        self._pending_count = 0
+
+    def append(self, value: float) -> None:
+        self.count += 1
+        self._pending_sum += value
+        self._pending_count += 1
+        if self._pending_count < self.stride:
+            return
+
+        self.values.append(self._pending_sum / self._pending_count)
+        self._pending_sum = 0.0
+        self._pending_count = 0
+
+        if len(self.values) >= self.max_size:
+            self.values = [(a + b) / 2 for a, b in zip(self.values[0::2], self.values[1::2])]
+            self.stride *= 2
+
+    def steps(self) -> List[int]:
+        # Index of the first appended value each stored point represents
+        return [i * self.stride for i in range(len(self.values))]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class TrainingMetrics:
+    """
+    Records loss, gradient norm, reward and value statistics of optimization steps. Values are accumulated
+    on the device and only copied to the host every flush_interval steps (a single sync), the mean of each
+    flush window is stored in a bounded MetricSeries.
+    """
+
+    def __init__(self, device: torch.device, max_size: int = DEFAULT_MAX_SIZE,
+                 flush_interval: int = DEFAULT_FLUSH_INTERVAL) -> None:
+        self.device = device
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.series: Dict[str, MetricSeries] = {name: MetricSeries(max_size=max_size)
+                                                for name in METRIC_FILE_SUFFIXES}
+        self._accumulator = torch.zeros(len(METRIC_FILE_SUFFIXES), device=device)
+        self._pending_steps = 0
+
+    def record(self, loss: torch.Tensor, norm: torch.Tensor, reward: torch.Tensor,
+               mean_value: torch.Tensor) -> None:
+        # Order has to match METRIC_FILE_SUFFIXES
+        step_values = torch.stack([loss.detach(), norm.to(self._accumulator.device),
+                                   reward.detach(), mean_value.detach()])
+        self._accumulator += step_values
+        self._pending_steps += 1
+
+        if self._pending_steps >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._pending_steps == 0:
+            return
+        means = (self._accumulator / self._pending_steps).tolist()
+        for name, value in zip(METRIC_FILE_SUFFIXES, means):
+            self.series[name].append(value)
+        self._accumulator.zero_()
+        self._pending_steps = 0
+
+    def reset(self) -> None:
+        for name in self.series:
+            self.series[name] = MetricSeries(max_size=self.max_size)
+        self._accumulator.zero_()
+        self._pending_steps = 0
+
+    def get(self, name: str) -> List[float]:
+        self.flush()
+        return self.series[name].values
+
+    def plot(self, plot_path: Path, file_prefix: str) -> None:
+        PLOT_OUT_FOLDER = 'model_stats'
+
+        os.makedirs(plot_path / PLOT_OUT_FOLDER, exist_ok=True)
+        os.makedirs(plot_path / f'pdfs' / PLOT_OUT_FOLDER, exist_ok=True)
+
+        self.flush()
+        for name, file_suffix in METRIC_FILE_SUFFIXES.items():
+            series = self.series[name]
+            fig, ax = plt.subplots(figsize=(8, 4), dpi=200, nrows=1, ncols=1, sharex='all')
+            plt.plot([step * self.flush_interval for step in series.steps()], series.values)
+            plt.savefig(plot_path / f'pdfs/{PLOT_OUT_FOLDER}/{file_prefix}_{file_suffix}.pdf')
+            plt.savefig(plot_path / f'{PLOT_OUT_FOLDER}/{file_prefix}_{file_suffix}.jpg')
+            plt.close()
@@ -0,0 +1,40 @@
+import numpy as np
+
+from simulations.monitor import DataPointMonitor
+
+MSER_BATCH_SIZE = 5
+
+
+def mser_truncation(values: np.ndarray, batch_size: int = MSER_BATCH_SIZE) -> int:
+    """
+    MSER-m truncation point of a series (MSER-5 for the default batch size): the number of leading values to drop
+    that minimizes the squared standard error of the mean of the remaining batch means. Only the first half of the
+    batches is considered, later minima are artifacts of the few remaining batches.
+    """
+    num_batches = len(values) // batch_size
+    if num_batches < 2:
+        return 0
+    batch_means = np.asarray(values[:num_batches * batch_size], dtype=np.float64).reshape(num_batches,
+                                                                                        batch_size).mean(axis=1)
+    # Sums over the batches d..k-1 for every truncation d
+    sums = np.cumsum(batch_means[::-1])[::-1]
+    squared_sums = np.cumsum(batch_means[::-1] ** 2)[::-1]
+    remaining = np.arange(num_batches, 0, -1)
+    mser = (squared_sums - sums ** 2 / remaining) / remaining ** 2
+    return int(np.argmin(mser[:num_batches // 2 + 1])) * batch_size
+
+
+def warmup_end_time(data_point_monitor: DataPointMonitor, warmup_time: float, warmup_mser: bool) -> float:
+    # Requests sent before the returned time are warmup, the later end of the configured warmup windows wins. The
+    # first --warmup_requests requests are dropped by their index in the workload instead, send times can be equal.
+    end_time = warmup_time
+    if warmup_mser and len(data_point_monitor) > 0:
+        columns = data_point_monitor.get_columns()
+        # Same series as the reported statistics, which only use the response that arrived first
+        faster = columns['is_faster_response']
+        task_times_sent = columns['task_time_sent'][faster]
+        order = np.argsort(task_times_sent, kind='stable')
+        truncation = mser_truncation(columns['latency'][faster][order])
+        if truncation > 0:
+            end_time = max(end_time, float(task_times_sent[order][truncation]))
+    return end_time
@@ -0,0 +1,82 @@
+from pathlib import Path
+
+import numpy as np
+
+ACCESS_PATTERNS = ['uniform', 'zipfian', 'key_popularity']
+
+
+class AccessPattern:
+    """
+    Distribution of the ring position (first replica) of requests, the replica group of a request starts there.
+    """
+
+    def __init__(self, num_servers: int) -> None:
+        self.num_servers = num_servers
+
+    def sample(self, np_random: np.random.Generator, size: int) -> np.ndarray:
+        raise NotImplementedError()
+
+
+class UniformAccessPattern(AccessPattern):
+
+    def sample(self, np_random: np.random.Generator, size: int) -> np.ndarray:
+        return np_random.integers(0, self.num_servers, size=size)
+
+
+class AliasAccessPattern(AccessPattern):
+    """
+    Arbitrary distribution over the ring positions, sampled in constant time per draw with Walker's alias method
+    (Vose's construction). Position i is drawn with probability weights[i] / sum(weights).
+    """
+
+    def __init__(self, weights: np.ndarray) -> None:
+        super().__init__(num_servers=len(weights))
+        weights = np.asarray(weights, dtype=np.float64)
+        assert np.all(weights >= 0) and weights.sum() > 0, 'Access weights need to be non-negative'
+        self.probabilities = weights / weights.sum()
+
+        n = len(weights)
+        scaled = self.probabilities * n
+        self.accept = np.ones(n)
+        self.alias = np.arange(n)
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.accept[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Leftovers are 1 up to rounding errors and always accept
+
+    def sample(self, np_random: np.random.Generator, size: int) -> np.ndarray:
+        columns = np_random.integers(0, self.num_servers, size=size)
+        return np.where(np_random.random(size) < self.accept[columns], columns, self.alias[columns])
+
+
+def zipf_weights(num_servers: int, exponent: float) -> np.ndarray:
+    # Rank k (1..num_servers) has weight k^-exponent and, like the former unbounded np.random.zipf draw modulo the
+    # number of servers, maps to ring position k % num_servers
+    ranks = np.arange(1, num_servers + 1)
+    weights = np.zeros(num_servers)
+    weights[ranks % num_servers] = ranks.astype(np.float64) ** -exponent
+    return weights
+
+
+def load_key_popularity(path: Path, num_servers: int) -> np.ndarray:
+    # One access count or weight per key and line, key i is stored in the replica group at ring position
+    # i % num_servers
+    key_weights = np.atleast_1d(np.loadtxt(path, delimiter=',', dtype=np.float64))
+    return np.bincount(np.arange(len(key_weights)) % num_servers, weights=key_weights, minlength=num_servers)
+
+
+def create_access_pattern(access_pattern: str, num_servers: int, zipf_exponent: float = 1.5,
+                          key_popularity_file: str = '') -> AccessPattern:
+    if access_pattern == 'uniform':
+        return UniformAccessPattern(num_servers=num_servers)
+    elif access_pattern == 'zipfian':
+        return AliasAccessPattern(zipf_weights(num_servers=num_servers, exponent=zipf_exponent))
+    elif access_pattern == 'key_popularity':
+        assert key_popularity_file != '', 'key_popularity needs a --key_popularity_file'
+        return AliasAccessPattern(load_key_popularity(Path(key_popularity_file), num_servers=num_servers))
+    raise Exception(f'Unknown access pattern {access_pattern}')
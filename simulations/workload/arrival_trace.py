@@ -0,0 +1,88 @@
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from simulations.constants import ALPHA
+from simulations.workload.access_pattern import AccessPattern
+
+# Arrivals are drawn in blocks of at most this many requests
+ARRIVAL_BLOCK_SIZE = 4096
+
+
+@dataclass
+class ArrivalTrace:
+    """
+    Arrival schedule of a workload run, request i is created with is_long[i], sent to client client_indices[i]
+    starting at replica first_replica_indices[i] and followed by the next request after inter_arrival_times[i]. Its
+    service time is scaled by service_time_scales[i] (1 for synthetic workloads).
+    """
+    inter_arrival_times: np.ndarray
+    is_long: np.ndarray
+    client_indices: np.ndarray
+    first_replica_indices: np.ndarray
+    service_time_scales: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.inter_arrival_times)
+
+    def __getitem__(self, item: slice) -> 'ArrivalTrace':
+        return ArrivalTrace(**{field.name: getattr(self, field.name)[item] for field in fields(self)})
+
+    @classmethod
+    def concatenate(cls, traces: List['ArrivalTrace']) -> 'ArrivalTrace':
+        return cls(**{field.name: np.concatenate([getattr(trace, field.name) for trace in traces])
+                      for field in fields(cls)})
+
+    def save(self, path: Path) -> None:
+        np.savez(path, **{field.name: getattr(self, field.name) for field in fields(self)})
+
+    @classmethod
+    def load(cls, path: Path) -> 'ArrivalTrace':
+        with np.load(path) as data:
+            arrays = {field.name: data[field.name] for field in fields(cls) if field.name in data.files}
+        # Traces saved before service times could be scaled
+        arrays.setdefault('service_time_scales', np.ones(len(arrays['inter_arrival_times'])))
+        return cls(**arrays)
+
+
+class ClientSelector:
+    """
+    Weighted choice of the client that sends a request, proportional to the client demand weights. The cumulative
+    weights are built once per run, a draw is a binary search (O(log clients)) and blocks of requests are drawn in
+    one vectorized call.
+    """
+
+    def __init__(self, client_weights: List[float]) -> None:
+        self.cumulative_weights = np.cumsum(np.asarray(client_weights, dtype=np.float64))
+        assert self.cumulative_weights[-1] > 0, 'Clients need demand weight'
+
+    def sample(self, np_random: np.random.Generator, size: int) -> np.ndarray:
+        # Same as the former per request weighted choice: first client whose cumulative weight exceeds the draw
+        return np.searchsorted(self.cumulative_weights, np_random.random(size) * self.cumulative_weights[-1],
+                               side='right')
+
+
+def generate_arrival_trace(np_random: np.random.Generator, num_requests: int, arrival_model: str,
+                           client_delay_mean: float, long_tasks_fraction: float, client_selector: ClientSelector,
+                           access_pattern: AccessPattern) -> ArrivalTrace:
+    # The draws always happen in the same order, the same generator state gives the same trace
+    is_long = np_random.random(num_requests) < long_tasks_fraction
+    client_indices = client_selector.sample(np_random, size=num_requests)
+
+    first_replica_indices = access_pattern.sample(np_random, size=num_requests)
+
+    if arrival_model == 'poisson':
+        inter_arrival_times = np_random.poisson(client_delay_mean, size=num_requests).astype(float)
+    elif arrival_model == 'constant':
+        inter_arrival_times = np.full(num_requests, client_delay_mean, dtype=float)
+    elif arrival_model == 'pareto':
+        scale = (client_delay_mean * (ALPHA - 1)) / ALPHA
+        inter_arrival_times = np_random.pareto(ALPHA, size=num_requests) * scale
+    else:
+        # Unknown models never delayed requests
+        inter_arrival_times = np.zeros(num_requests)
+
+    return ArrivalTrace(inter_arrival_times=inter_arrival_times, is_long=is_long, client_indices=client_indices,
+                        first_replica_indices=first_replica_indices, service_time_scales=np.ones(num_requests))
@@ -13,7 +13,7 @@ class MuUpdater:
         while (1):
             yield self.simulation.timeout(0)
 
-            if (self.simulation.random.uniform(0, 1.0) >= 0.5):
+            if (self.simulation.random_server.uniform(0, 1.0) >= 0.5):
                 # rate = 1 / float(self.service_time)
                 # self.server.service_time = 1 / float(rate)
                 self.server.SERVICE_TIME_FACTOR = 1
@@ -0,0 +1,197 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+
+from simulations.workload.access_pattern import AccessPattern
+from simulations.workload.arrival_trace import ArrivalTrace, ClientSelector
+from simulations.workload.workload import BaseWorkload
+
+# Columns read from trace files, all but the timestamp are optional
+TRACE_COLUMNS = ['timestamp', 'key', 'replica_group', 'client', 'is_long', 'size']
+TRACE_CHUNK_SIZE = 100000
+
+
+def is_parquet(path: Path) -> bool:
+    return path.suffix in ['.parquet', '.pq']
+
+
+def read_trace_chunks(path: Path, chunk_size: int, columns: List[str] = TRACE_COLUMNS) -> Iterator:
+    """
+    Streams the given columns of a CSV or Parquet trace as pandas data frames of at most chunk_size rows, only one
+    chunk is in memory at a time. Columns missing from the file are left out.
+    """
+    if is_parquet(path):
+        # Only needed for Parquet traces
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        available = [column for column in columns if column in parquet_file.schema_arrow.names]
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=available):
+            yield batch.to_pandas()
+    else:
+        import pandas as pd
+
+        with pd.read_csv(path, chunksize=chunk_size, usecols=lambda column: column in columns) as reader:
+            for frame in reader:
+                yield frame
+
+
+def scan_trace(path: Path, chunk_size: int) -> tuple[int, float | None]:
+    # Number of requests and mean request size (None without a size column) in one streamed pass
+    num_rows = 0
+    size_sum = 0.0
+    has_size = False
+    for frame in read_trace_chunks(path, chunk_size=chunk_size, columns=['timestamp', 'size']):
+        num_rows += len(frame)
+        if 'size' in frame:
+            has_size = True
+            size_sum += float(frame['size'].sum())
+    return num_rows, size_sum / num_rows if has_size and num_rows > 0 else None
+
+
+def keys_to_replica_groups(keys, num_servers: int) -> np.ndarray:
+    # Integer key i is stored in the replica group at ring position i % num_servers like in key popularity files,
+    # other keys are hashed deterministically (independent of the Python hash seed) first
+    import pandas as pd
+
+    keys = keys.to_numpy()
+    if not np.issubdtype(keys.dtype, np.integer):
+        keys = pd.util.hash_array(keys.astype(str).astype(object))
+    return (keys % num_servers).astype(np.int64)
+
+
+class TraceWorkload(BaseWorkload):
+    """
+    Replays the requests of a recorded trace file (CSV or Parquet with a header) instead of drawing arrivals.
+    Columns:
+    timestamp: send time of the request, multiplied by time_scale to get simulation time. The replay starts with the
+               first request, the trace needs to be sorted by time
+    key: requested key, mapped to the replica group at ring position key % num_servers (hashed for non integer keys)
+    replica_group: ring position of the first replica, used if there is no key column
+    client: index of the sending client
+    is_long: whether the request is a long task
+    size: recorded size of the request, its service time is multiplied by size / reference_size
+    Only timestamp is required, the other properties are drawn like in the synthetic workloads if they are missing.
+    The trace is streamed in chunks of chunk_size rows and the arrival trace of a run is not kept, memory does not
+    grow with the length of the trace.
+    """
+
+    def __init__(self, id_, trace_file: str, num_requests: int | None = None, time_scale: float = 1.0,
+                 chunk_size: int = TRACE_CHUNK_SIZE, reference_size: float | None = None, utilization: float = 1.0,
+                 long_tasks_fraction: float = 0) -> None:
+        self.trace_file = Path(trace_file)
+        assert self.trace_file.exists(), f'Trace file {trace_file} does not exist'
+        assert time_scale > 0
+        assert chunk_size > 0
+
+        num_rows, mean_size = (None, None)
+        if num_requests is None or reference_size is None:
+            num_rows, mean_size = scan_trace(self.trace_file, chunk_size=chunk_size)
+        if num_requests is None:
+            num_requests = num_rows
+        # Requests of the mean size of the trace keep the service time of the server
+        if reference_size is None:
+            reference_size = mean_size if mean_size is not None else 1.0
+        assert reference_size > 0, 'Reference size needs to be positive'
+
+        # Utilization only labels the results, the arrival rate is given by the trace
+        super().__init__(id_=id_, utilization=utilization, arrival_model='trace', num_requests=num_requests,
+                         long_tasks_fraction=long_tasks_fraction)
+        self.time_scale = time_scale
+        self.chunk_size = chunk_size
+        self.reference_size = reference_size
+        self.workload_type: str = 'trace'
+        self.record_arrival_trace = False
+        self._trace_hash: str | None = None
+
+    def to_file_name(self) -> str:
+        return f'{self.workload_type}_{self.trace_file.stem}_{self.time_scale:g}_time_scale'
+
+    def trace_hash(self) -> str:
+        # Content hash of the trace file for result caching, computed once
+        if self._trace_hash is None:
+            sha = hashlib.sha256()
+            with open(self.trace_file, 'rb') as file:
+                for piece in iter(lambda: file.read(1 << 20), b''):
+                    sha.update(piece)
+            self._trace_hash = sha.hexdigest()
+        return self._trace_hash
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any], id_) -> 'TraceWorkload':
+        return cls(
+            id_=id_,
+            trace_file=config['trace_file'],
+            num_requests=config.get('num_requests'),
+            time_scale=config.get('time_scale', 1.0),
+            chunk_size=config.get('chunk_size', TRACE_CHUNK_SIZE),
+            reference_size=config.get('reference_size'),
+            utilization=config.get('utilization', 1.0),
+            long_tasks_fraction=config.get('long_tasks_fraction', 0),
+        )
+
+    def to_json(self) -> str:
+        base_data = json.loads(super().to_json())
+        additional_data = {
+            'trace_file': str(self.trace_file),
+            'time_scale': self.time_scale,
+            'chunk_size': self.chunk_size,
+            'reference_size': self.reference_size,
+        }
+        base_data.update(additional_data)
+        return json.dumps(base_data, indent=4)
+
+    def arrival_blocks(self, client_selector: ClientSelector, access_pattern: AccessPattern) -> Iterator[ArrivalTrace]:
+        if self.fixed_arrival_trace is not None:
+            yield from super().arrival_blocks(client_selector=client_selector, access_pattern=access_pattern)
+            return
+
+        # A chunk is handed out once the first timestamp of the next one is known, its last request waits until then
+        previous = None
+        for frame in read_trace_chunks(self.trace_file, chunk_size=self.chunk_size):
+            times = frame['timestamp'].to_numpy(dtype=np.float64) * self.time_scale
+            if previous is not None:
+                yield self.to_arrival_block(*previous, next_time=times[0], client_selector=client_selector,
+                                            access_pattern=access_pattern)
+            previous = (frame, times)
+        if previous is not None:
+            yield self.to_arrival_block(*previous, next_time=None, client_selector=client_selector,
+                                        access_pattern=access_pattern)
+
+    def to_arrival_block(self, frame, times: np.ndarray, next_time: float | None, client_selector: ClientSelector,
+                         access_pattern: AccessPattern) -> ArrivalTrace:
+        num_requests = len(frame)
+        # The last request of the trace has nothing to wait for
+        inter_arrival_times = np.diff(times, append=times[-1] if next_time is None else next_time)
+        assert np.all(inter_arrival_times >= 0), 'Trace timestamps need to be sorted'
+
+        # Missing columns are drawn in the same order as in generate_arrival_trace
+        if 'is_long' in frame:
+            is_long = frame['is_long'].to_numpy().astype(bool)
+        else:
+            is_long = self.np_random.random(num_requests) < self.long_tasks_fraction
+
+        if 'client' in frame:
+            client_indices = frame['client'].to_numpy().astype(np.int64)
+            assert np.all((client_indices >= 0) & (client_indices < len(client_selector.cumulative_weights))), \
+                'Trace references clients that do not exist'
+        else:
+            client_indices = client_selector.sample(self.np_random, size=num_requests)
+
+        if 'key' in frame:
+            first_replica_indices = keys_to_replica_groups(frame['key'], num_servers=access_pattern.num_servers)
+        elif 'replica_group' in frame:
+            first_replica_indices = frame['replica_group'].to_numpy().astype(np.int64) % access_pattern.num_servers
+        else:
+            first_replica_indices = access_pattern.sample(self.np_random, size=num_requests)
+
+        if 'size' in frame:
+            service_time_scales = frame['size'].to_numpy(dtype=np.float64) / self.reference_size
+        else:
+            service_time_scales = np.ones(num_requests)
+
+        return ArrivalTrace(inter_arrival_times=inter_arrival_times, is_long=is_long, client_indices=client_indices,
+                            first_replica_indices=first_replica_indices, service_time_scales=service_time_scales)
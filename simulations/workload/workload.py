@@ -1,14 +1,14 @@
 import json
 from pathlib import Path
 import random
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List
 
 import numpy as np
 
 from simulations.client import Client
-from simulations.constants import ALPHA
 from simulations.server import Server
-from scipy.stats import pareto
+from simulations.workload.access_pattern import AccessPattern
+from simulations.workload.arrival_trace import ARRIVAL_BLOCK_SIZE, ArrivalTrace, ClientSelector, generate_arrival_trace
 import task
 
 WORKLOAD_CONFIG_FILE_NAME = 'workload_config.json'
@@ -37,6 +37,11 @@ class BaseWorkload:
         # self.proc = self.simulation.process(self.run(), 'Workload' + str(id_))
         self.random = random.Random()
         self.np_random = np.random.default_rng()
+        # Arrival schedule of the last run, runs use fixed_arrival_trace instead of drawing their own if it is set
+        self.arrival_trace: ArrivalTrace | None = None
+        self.fixed_arrival_trace: ArrivalTrace | None = None
+        # Workloads streaming long traces do not keep the arrival schedule of a run in memory
+        self.record_arrival_trace = True
 
     def reset_workload(self):
         self.executed_requests = 0
@@ -88,46 +93,63 @@ class BaseWorkload:
         self.random = random.Random(seed)
         self.np_random = np.random.default_rng(seed)
 
-        while self.executed_requests < self.num_requests:
-            yield simulation.timeout(0)
-            assert self.client_delay_mean > 0
+        access_patterns = {client.accessPattern for client in clients}
+        assert len(access_patterns) == 1, 'All clients need the same access pattern'
+        access_pattern = access_patterns.pop()
+        client_selector = ClientSelector([client.demandWeight for client in clients])
 
+        arrival_blocks = self.arrival_blocks(client_selector=client_selector, access_pattern=access_pattern)
+        blocks = []
+        block = None
+        position = 0
+        while self.executed_requests < self.num_requests:
             self.before_task_creation(servers=servers)
-            is_long_task = False if self.random.random() >= self.long_tasks_fraction else True
+            if block is None or position == len(block):
+                block = next(arrival_blocks, None)
+                assert block is not None, 'Arrival trace is shorter than the workload'
+                if self.record_arrival_trace:
+                    blocks.append(block)
+                position = 0
+
             task_to_schedule = task.Task("Task" + str(task_counter),
-                                         simulation=simulation, is_long_task=is_long_task, utilization=self.utilization, long_tasks_fraction=self.long_tasks_fraction)
+                                         simulation=simulation, is_long_task=bool(block.is_long[position]), utilization=self.utilization, long_tasks_fraction=self.long_tasks_fraction,
+                                         service_time_scale=float(block.service_time_scales[position]),
+                                         request_index=task_counter)
             task_counter += 1
 
             # Push out a task...
-            client_node = self.weighted_choice(simulation=simulation, clients=clients)
+            client_node = clients[block.client_indices[position]]
 
             # print(f'Scheduling Task {task_to_schedule.id}')
-            client_node.schedule(task_to_schedule)
+            client_node.schedule(task_to_schedule, first_replica_index=int(block.first_replica_indices[position]))
             # Simulate client delay
-            if self.arrival_model == "poisson":
-                yield simulation.timeout(self.np_random.poisson(self.client_delay_mean))
-
-            # If model is gaussian, add gaussian delay
-            # If model is constant, add fixed delay
-            if self.arrival_model == "constant":
-                yield simulation.timeout(self.client_delay_mean)
-
-            if self.arrival_model == "pareto":
-                scale = (self.client_delay_mean * (ALPHA - 1)) / ALPHA
-                yield simulation.timeout(self.np_random.pareto(ALPHA) * scale)
+            yield simulation.timeout(block.inter_arrival_times[position])
+            position += 1
 
             self.executed_requests += 1
+        self.arrival_trace = ArrivalTrace.concatenate(blocks) if len(blocks) > 0 else None
         self.reset_workload()
 
-    def weighted_choice(self, simulation, clients: List[Client]) -> Client:
-        total = sum(client.demandWeight for client in clients)
-        r = self.random.uniform(0, total)
-        upto = 0
-        for client in clients:
-            if upto + client.demandWeight > r:
-                return client
-            upto += client.demandWeight
-        assert False, "Shouldn't get here"
+    def arrival_blocks(self, client_selector: ClientSelector, access_pattern: AccessPattern) -> Iterator[ArrivalTrace]:
+        """Blocks of the arrival schedule, the next block is requested once all requests of the previous one ran."""
+        while True:
+            assert self.client_delay_mean > 0
+            # A block never spans a change of the workload parameters (see requests_until_change)
+            block_size = min(ARRIVAL_BLOCK_SIZE, self.num_requests - self.executed_requests,
+                             self.requests_until_change())
+            if self.fixed_arrival_trace is not None:
+                block = self.fixed_arrival_trace[self.executed_requests:self.executed_requests + block_size]
+                assert len(block) == block_size, 'Arrival trace is shorter than the workload'
+            else:
+                block = generate_arrival_trace(
+                    np_random=self.np_random, num_requests=block_size, arrival_model=self.arrival_model,
+                    client_delay_mean=self.client_delay_mean, long_tasks_fraction=self.long_tasks_fraction,
+                    client_selector=client_selector, access_pattern=access_pattern)
+            yield block
+
+    def requests_until_change(self) -> int:
+        """Number of requests after which before_task_creation may change the workload parameters."""
+        return self.num_requests - self.executed_requests
 
     def before_task_creation(self, servers: List[Server]):
         """Hook method to be called before creating a task."""
@@ -142,11 +164,17 @@ class VariableLongTaskFractionWorkload(BaseWorkload):
         self.trigger_threshold = trigger_threshold
         self.updated_long_tasks_fractions = updated_long_tasks_fractions
         self.original_long_tasks_fraction = self.long_tasks_fraction
+        self.original_utilization = self.utilization
         self.workload_type: str = 'variable_long_task_fraction'
 
     def reset_workload(self):
         super().reset_workload()
         self.long_tasks_fraction = self.original_long_tasks_fraction
+        self.utilization = self.original_utilization
+
+    def requests_until_change(self) -> int:
+        return min(super().requests_until_change(),
+                   self.trigger_threshold - self.executed_requests % self.trigger_threshold)
 
     def to_file_name(self) -> str:
         return f'{self.workload_type}_updated_long_tasks_{self.utilization * 100:.2f}_util_{self.long_tasks_fraction * 100:.2f}_long_tasks'
@@ -3,6 +3,7 @@ from typing import Any, Dict, List
 
 import yaml
 
+from simulations.workload.trace_workload import TraceWorkload
 from simulations.workload.workload import BaseWorkload, VariableLongTaskFractionWorkload
 
 
@@ -73,3 +74,35 @@ class WorkloadBuilder:
             workloads.append(workload)
 
         return workloads
+
+    def create_train_trace_workloads(self, trace_files: List[str] = [], time_scales: List[float] = [], num_requests: int | None = None) -> List[TraceWorkload]:
+        return self.create_trace_workloads(base_config=self.train_config, trace_files=trace_files, time_scales=time_scales, num_requests=num_requests)
+
+    def create_test_trace_workloads(self, trace_files: List[str] = [], time_scales: List[float] = [], num_requests: int | None = None) -> List[TraceWorkload]:
+        return self.create_trace_workloads(base_config=self.test_config, trace_files=trace_files, time_scales=time_scales, num_requests=num_requests)
+
+    def create_trace_workloads(self, base_config: Dict[str, Any], trace_files: List[str] = [], time_scales: List[float] = [], num_requests: int | None = None) -> List[TraceWorkload]:
+        workloads = []
+        base_config = base_config['workload'] | base_config['trace_workload']
+
+        if len(trace_files) == 0:
+            trace_files = [base_config['trace_file']]
+        assert all(trace_file != '' for trace_file in trace_files), 'Trace workloads need a trace_file'
+
+        if len(time_scales) == 0:
+            time_scales = [base_config['time_scale']]
+
+        # Without a number of requests the whole trace is replayed
+        if num_requests is None:
+            num_requests = base_config['num_requests']
+
+        for trace_file in trace_files:
+            for time_scale in time_scales:
+                config = base_config.copy()
+                config['trace_file'] = trace_file
+                config['time_scale'] = time_scale
+                config['num_requests'] = num_requests
+                workload = TraceWorkload.from_dict(id_=1, config=config)
+                workloads.append(workload)
+
+        return workloads